@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark tái lập được, chạy offline trên CPU, cho 4 script Python (OCR, STT, DOCX, Insight).
+
+- Dữ liệu mẫu sinh tại chỗ (fixtures.py), tất định theo --seed và được dùng lại giữa các lần chạy.
+- Gemini được thay bằng server giả lập (stub_gemini.py) với độ trễ cấu hình được.
+- Cache kết quả và cache LLM bị tắt, CUDA bị ẩn.
+
+Mỗi (script, fixture) chạy --warmup lần bỏ qua, rồi --runs lần đo, mỗi lần là một process mới:
+  total       thời gian wall của process (gồm cả khởi động)
+  llm         tổng thời gian stub xử lý các request của lần chạy đó (và số request)
+  peak RSS    ru_maxrss từ os.wait4 (process chính, hoặc process con lớn nhất nếu lớn hơn),
+              đo qua một launcher tối giản để không bị lẫn RSS của chính harness
+  throughput  đơn vị fixture / giây theo trung vị total (ảnh, đoạn, nghìn ký tự, giây âm thanh)
+  --stages    chạy script với --timings và thêm phân vị của từng giai đoạn trong script
+              (load, preprocess, engine, llm_refine, ..., serialize; cộng dồn qua các kết quả)
+
+Cách dùng:
+  python bench_pipeline.py [--scripts ocr,docx,insight,stt] [--runs 5] [--quick] [--stages]
+                           [--llm-latency-ms 300] [--llm-jitter-ms 50] [--llm-ms-per-kchar 2]
+                           [--save-baseline base.json] [--baseline base.json --tolerance 0.15]
+Bảng in ra stderr, JSON in ra stdout. So với baseline: mã thoát 1 nếu có chỉ số chậm/tốn bộ nhớ
+hơn baseline quá --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+import urllib.request
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, BASE_DIR)
+from fixtures import build_fixtures
+from stub_gemini import StubGemini
+
+FEATURES_DIR = os.path.join(BASE_DIR, '..', 'executable', 'command-ingress', 'features')
+SCRIPTS = {
+    "ocr": os.path.join(FEATURES_DIR, 'ocr', 'pythonScript', 'process_OCR.py'),
+    "stt": os.path.join(FEATURES_DIR, 'speech', 'pythonScript', 'process_STT.py'),
+    "docx": os.path.join(FEATURES_DIR, 'read_docx', 'pythonScript', 'process_docx.py'),
+    "insight": os.path.join(FEATURES_DIR, 'insight', 'pythonScript', 'process_metadata.py'),
+}
+DEFAULT_FIXTURE_DIR = os.path.join(tempfile.gettempdir(), 'nckh-bench-fixtures')
+COMPARED = [("total", "p50"), ("total", "p95"), ("peak_rss_mb", None)]
+
+# Linux giữ mức RSS đỉnh của process cha qua fork/exec, nên script không được sinh trực tiếp từ
+# harness (đã nạp numpy, PIL, server stub): một launcher tối giản chạy script rồi báo wall + rusage.
+LAUNCHER = """
+import os, sys, time
+started = time.perf_counter()
+pid = os.posix_spawn(sys.argv[2], sys.argv[2:], os.environ,
+                     file_actions=[(os.POSIX_SPAWN_OPEN, 1, sys.argv[1], os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)])
+_, status, usage = os.wait4(pid, 0)
+seconds = time.perf_counter() - started
+print(seconds, usage.ru_maxrss, os.waitstatus_to_exitcode(status))
+"""
+
+
+def build_command(script, fixture, stub, stages=False):
+    cmd = [sys.executable, SCRIPTS[script]] + (["--timings"] if stages else [])
+    if script == "ocr":
+        return cmd + [fixture["path"], "--llm_key", "bench", "--llm_endpoint", stub.endpoint()]
+    if script == "insight":
+        return cmd + [f"--file={fixture['path']}"]
+    if script == "stt":
+        return cmd + [fixture["path"], "--context=benchmark"]
+    return cmd + [fixture["path"]]
+
+
+def bench_env(stub):
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_BASE": stub.api_base,
+        "GOOGLE_API_KEY": "bench",
+        "GOOGLE_API_KEY_3": "bench",
+        "LLM_CACHE_DISABLE": "1",
+        "RESULT_CACHE_DISABLE": "1",
+        "LLM_RPM": "0",
+        "CUDA_VISIBLE_DEVICES": "",
+        "PYTHONHASHSEED": "0",
+    })
+    return env
+
+
+def stub_stats(stub):
+    with urllib.request.urlopen(stub.api_base.rsplit("/", 1)[0] + "/stats") as r:
+        return json.loads(r.read().decode("utf-8"))
+
+
+def stage_seconds(output):
+    """Cộng dồn khối "timings" của mọi kết quả trong stdout của script → {stage: giây}."""
+    try:
+        result = json.loads(output)
+    except ValueError:
+        return {}
+    totals = {}
+    for entry in result if isinstance(result, list) else [result]:
+        if not isinstance(entry, dict):
+            continue
+        for name, value in (entry.get("timings") or {}).items():
+            totals[name] = totals.get(name, 0.0) + value["wall_ms"] / 1000
+    return totals
+
+
+def run_once(cmd, env, stub):
+    """Chạy một process, trả dict {seconds, rss_mb, llm_seconds, llm_calls, stages} hoặc {error}."""
+    before = stub_stats(stub)
+    with tempfile.TemporaryFile() as err, tempfile.NamedTemporaryFile(suffix=".json") as out:
+        proc = subprocess.run([sys.executable, "-S", "-c", LAUNCHER, out.name, *cmd],
+                              stdout=subprocess.PIPE, stderr=err, env=env)
+        err.seek(0)
+        stderr = err.read().decode("utf-8", errors="replace")
+        output = out.read().decode("utf-8", errors="replace")
+    after = stub_stats(stub)
+    if proc.returncode != 0:
+        return {"error": stderr[-2000:] or "launcher lỗi"}
+    seconds, maxrss, code = proc.stdout.decode().split()
+    if int(code) != 0:
+        return {"error": stderr[-2000:] or f"mã thoát {code}"}
+    return {
+        "seconds": float(seconds),
+        # Linux trả KB, macOS trả byte
+        "rss_mb": int(maxrss) / 1024 / 1024 if sys.platform == "darwin" else int(maxrss) / 1024,
+        "llm_seconds": after["seconds"] - before["seconds"],
+        "llm_calls": after["requests"] - before["requests"],
+        "stages": stage_seconds(output),
+    }
+
+
+def percentile(values, q):
+    """Phân vị nội suy tuyến tính (q trong 0–100)."""
+    values = sorted(values)
+    if not values:
+        return None
+    position = (len(values) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (position - low)
+
+
+def summarize(samples):
+    return {
+        "p50": round(percentile(samples, 50), 4),
+        "p90": round(percentile(samples, 90), 4),
+        "p95": round(percentile(samples, 95), 4),
+        "max": round(max(samples), 4),
+    }
+
+
+def error_line(error):
+    return error.strip().splitlines()[-1] if error.strip() else "lỗi không rõ"
+
+
+def bench_fixture(script, fixture, stub, env, runs, warmup, stages=False):
+    cmd = build_command(script, fixture, stub, stages)
+    row = {"script": script, "fixture": fixture["name"]}
+    for _ in range(warmup):
+        sample = run_once(cmd, env, stub)
+        if "error" in sample:
+            return {**row, "error": error_line(sample["error"])}
+
+    samples = []
+    for _ in range(runs):
+        sample = run_once(cmd, env, stub)
+        if "error" in sample:
+            return {**row, "error": error_line(sample["error"])}
+        samples.append(sample)
+
+    totals = [s["seconds"] for s in samples]
+    summary = {"total": summarize(totals), "llm": summarize([s["llm_seconds"] for s in samples])}
+    for name in sorted({name for s in samples for name in s["stages"]}):
+        # Giai đoạn không xuất hiện ở một lần chạy (vd. trúng nhánh khác) tính là 0
+        summary[f"script.{name}"] = summarize([s["stages"].get(name, 0.0) for s in samples])
+
+    p50 = percentile(totals, 50)
+    return {
+        **row,
+        "runs": runs,
+        "stages": summary,
+        "llm_calls": round(sum(s["llm_calls"] for s in samples) / len(samples), 2),
+        "peak_rss_mb": round(max(s["rss_mb"] for s in samples), 1),
+        "throughput": round(fixture["units"] / p50, 3) if p50 else None,
+        "throughput_unit": f"{fixture['unit']}/s",
+    }
+
+
+def compare(rows, baseline, tolerance):
+    """Trả danh sách so sánh với baseline; `regression` khi chỉ số mới > baseline * (1 + tolerance)."""
+    previous = {(r["script"], r["fixture"]): r for r in baseline.get("rows", []) if "error" not in r}
+    report = []
+    for row in rows:
+        old = previous.get((row["script"], row["fixture"]))
+        if old is None or "error" in row:
+            continue
+        for metric, stat in COMPARED:
+            new_value = row["stages"][metric][stat] if stat else row[metric]
+            old_value = old["stages"][metric][stat] if stat else old[metric]
+            if not old_value:
+                continue
+            ratio = new_value / old_value
+            report.append({
+                "script": row["script"], "fixture": row["fixture"], "metric": f"{metric}.{stat}" if stat else metric,
+                "baseline": old_value, "current": new_value, "change": round(ratio - 1, 4),
+                "regression": ratio > 1 + tolerance,
+            })
+    return report
+
+
+def print_stages(rows):
+    for row in rows:
+        names = [name for name in row.get("stages", {}) if name.startswith("script.")]
+        if not names:
+            continue
+        parts = [f"{name[7:]}={row['stages'][name]['p50'] * 1000:.1f}" for name in names]
+        print(f"  {row['script']:<8} {row['fixture']:<22} p50 ms: {' '.join(parts)}", file=sys.stderr)
+
+
+def print_table(rows, skipped):
+    print(f"{'script':<8} {'fixture':<22} {'p50 s':>8} {'p95 s':>8} {'llm p50':>8} {'calls':>6} "
+          f"{'RSS MB':>8} {'throughput':>18}", file=sys.stderr)
+    for row in rows:
+        if "error" in row:
+            print(f"{row['script']:<8} {row['fixture']:<22} lỗi: {row['error'][:80]}", file=sys.stderr)
+            continue
+        total, llm = row["stages"]["total"], row["stages"]["llm"]
+        throughput = f"{row['throughput']:.2f} {row['throughput_unit']}"
+        print(f"{row['script']:<8} {row['fixture']:<22} {total['p50']:>8.3f} {total['p95']:>8.3f} {llm['p50']:>8.3f} "
+              f"{row['llm_calls']:>6.1f} {row['peak_rss_mb']:>8.1f} {throughput:>18}", file=sys.stderr)
+    for script, reason in skipped.items():
+        print(f"{script:<8} bỏ qua: {reason}", file=sys.stderr)
+
+
+def print_comparison(report, tolerance):
+    print(f"\nSo với baseline (ngưỡng +{tolerance:.0%}):", file=sys.stderr)
+    for item in report:
+        flag = "CHẬM HƠN" if item["regression"] else ""
+        print(f"{item['script']:<8} {item['fixture']:<22} {item['metric']:<12} {item['baseline']:>10} → "
+              f"{item['current']:<10} {item['change']:>+8.1%} {flag}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline cho các script Python")
+    parser.add_argument("--scripts", default="ocr,docx,insight,stt")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--quick", action="store_true", help="chỉ dùng fixture nhỏ")
+    parser.add_argument("--stages", action="store_true", help="đo từng giai đoạn trong script (--timings)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fixtures-dir", default=DEFAULT_FIXTURE_DIR)
+    parser.add_argument("--llm-latency-ms", type=float, default=300)
+    parser.add_argument("--llm-jitter-ms", type=float, default=50)
+    parser.add_argument("--llm-ms-per-kchar", type=float, default=2)
+    parser.add_argument("--save-baseline", help="ghi kết quả làm baseline")
+    parser.add_argument("--baseline", help="so sánh với baseline đã lưu")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    scripts = [s for s in args.scripts.split(",") if s]
+    unknown = [s for s in scripts if s not in SCRIPTS]
+    if unknown:
+        parser.error(f"script không hợp lệ: {', '.join(unknown)}")
+
+    fixtures, skipped = build_fixtures(os.path.join(args.fixtures_dir, f"seed{args.seed}"), scripts,
+                                       quick=args.quick, seed=args.seed)
+    stub = StubGemini(latency_ms=args.llm_latency_ms, jitter_ms=args.llm_jitter_ms,
+                      ms_per_kchar=args.llm_ms_per_kchar, seed=args.seed).start()
+    env = bench_env(stub)
+
+    rows = []
+    try:
+        for script in scripts:
+            for fixture in fixtures.get(script, []):
+                print(f"[BENCH] {script} {fixture['name']}", file=sys.stderr)
+                rows.append(bench_fixture(script, fixture, stub, env, args.runs, args.warmup, args.stages))
+    finally:
+        stub.stop()
+
+    result = {
+        "meta": {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "runs": args.runs,
+            "seed": args.seed,
+            "llm_latency_ms": args.llm_latency_ms,
+            "llm_jitter_ms": args.llm_jitter_ms,
+            "llm_ms_per_kchar": args.llm_ms_per_kchar,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "rows": rows,
+        "skipped": skipped,
+    }
+
+    print_table(rows, skipped)
+    print_stages(rows)
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report = compare(rows, json.load(f), args.tolerance)
+        print_comparison(report, args.tolerance)
+        result["comparison"] = report
+        exit_code = 1 if any(item["regression"] for item in report) else 0
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
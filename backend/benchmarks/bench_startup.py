@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Đo thời gian khởi động của các script Python (OCR, STT, DOCX, Insight).
+
+Với mỗi script đo thời gian wall của một process mới cho các trường hợp:
+  usage   gọi không tham số (lỗi cách dùng) — chỉ tốn chi phí import
+  cache   gọi với file mẫu đã có trong cache kết quả (chạy một lần để làm nóng cache trước)
+
+Cách dùng:
+  python bench_startup.py [--runs 5] [--image a.png] [--audio a.wav] [--docx a.docx]
+Bảng in ra stderr, JSON in ra stdout.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+FEATURES_DIR = os.path.join(BASE_DIR, '..', 'executable', 'command-ingress', 'features')
+SCRIPTS = {
+    "ocr": os.path.join(FEATURES_DIR, 'ocr', 'pythonScript', 'process_OCR.py'),
+    "stt": os.path.join(FEATURES_DIR, 'speech', 'pythonScript', 'process_STT.py'),
+    "docx": os.path.join(FEATURES_DIR, 'read_docx', 'pythonScript', 'process_docx.py'),
+    "insight": os.path.join(FEATURES_DIR, 'insight', 'pythonScript', 'process_metadata.py'),
+}
+
+
+def time_process(cmd, runs):
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - started)
+    return {
+        "min_ms": round(min(samples) * 1000, 1),
+        "median_ms": round(statistics.median(samples) * 1000, 1),
+        "max_ms": round(max(samples) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Đo thời gian khởi động các script Python")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--image", help="ảnh mẫu cho OCR (đo trường hợp trúng cache)")
+    parser.add_argument("--audio", help="file âm thanh mẫu cho STT")
+    parser.add_argument("--docx", help="file DOCX mẫu")
+    args = parser.parse_args()
+
+    samples = {"ocr": args.image, "stt": args.audio, "docx": args.docx}
+    rows = []
+    for name, script in SCRIPTS.items():
+        rows.append({"script": name, "case": "usage", **time_process([sys.executable, script], args.runs)})
+        sample = samples.get(name)
+        if sample:
+            cmd = [sys.executable, script, os.path.abspath(sample)]
+            # Lần đầu để nạp cache kết quả, không tính
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            rows.append({"script": name, "case": "cache", **time_process(cmd, args.runs)})
+
+    print(f"{'script':<8} {'case':<6} {'min ms':>8} {'median ms':>10} {'max ms':>8}", file=sys.stderr)
+    for row in rows:
+        print(f"{row['script']:<8} {row['case']:<6} {row['min_ms']:>8.1f} {row['median_ms']:>10.1f} {row['max_ms']:>8.1f}",
+              file=sys.stderr)
+    print(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
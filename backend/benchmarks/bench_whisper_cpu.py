@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+So sánh tốc độ / độ chính xác của Whisper trên CPU: fp32 và int8, nhiều kích thước mô hình.
+
+Cách dùng:
+  python bench_whisper_cpu.py <audio> --reference <transcript.txt> [--models small,medium]
+                              [--precisions fp32,int8] [--threads N] [--language vi]
+
+Mỗi cấu hình chạy trong một process riêng để đo bộ nhớ đỉnh (ru_maxrss) không bị lẫn.
+Kết quả: thời gian tải, thời gian chép lời, RTF (thời gian xử lý / độ dài âm thanh),
+WER so với bản chép tay và RSS đỉnh. Bảng in ra stderr, JSON in ra stdout.
+"""
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import subprocess
+import unicodedata
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+INGRESS_DIR = os.path.join(BASE_DIR, '..', 'executable', 'command-ingress')
+SPEECH_DIR = os.path.join(INGRESS_DIR, 'features', 'speech', 'pythonScript')
+DOWNLOAD_ROOT = os.getenv("WHISPER_MODEL_PATH") or os.path.join(SPEECH_DIR, '..', 'libraries', 'models_whisper')
+
+
+def normalize_words(text):
+    text = unicodedata.normalize("NFC", text or "").lower()
+    return re.findall(r"\w+", text, re.UNICODE)
+
+
+def word_error_rate(reference, hypothesis):
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    # Khoảng cách Levenshtein theo từ, chỉ giữ một hàng
+    prev = list(range(len(hyp) + 1))
+    for i, r in enumerate(ref, 1):
+        cur = [i] + [0] * len(hyp)
+        for j, h in enumerate(hyp, 1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (r != h))
+        prev = cur
+    return prev[-1] / len(ref)
+
+
+def peak_rss_mb():
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux trả KB, macOS trả byte
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+def run_one(audio, model_name, precision, threads, language):
+    """Chạy một cấu hình trong process hiện tại, trả về dict số đo."""
+    sys.path.insert(0, SPEECH_DIR)
+    sys.path.insert(0, os.path.join(INGRESS_DIR, 'shared', 'pythonScript'))
+    import whisper
+    import whisper_cpu
+
+    whisper_cpu.configure_threads(threads)
+    started = time.perf_counter()
+    model = whisper_cpu.load_cpu_model(model_name, DOWNLOAD_ROOT, int8=(precision == "int8"))
+    load_seconds = time.perf_counter() - started
+
+    duration = len(whisper.load_audio(audio)) / whisper.audio.SAMPLE_RATE
+    started = time.perf_counter()
+    result = model.transcribe(audio, fp16=False, language=language)
+    seconds = time.perf_counter() - started
+
+    return {
+        "model": model_name,
+        "precision": precision,
+        "threads": threads,
+        "load_seconds": round(load_seconds, 2),
+        "transcribe_seconds": round(seconds, 2),
+        "audio_seconds": round(duration, 2),
+        "rtf": round(seconds / duration, 3) if duration else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "text": result["text"].strip(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh Whisper fp32/int8 trên CPU")
+    parser.add_argument("audio")
+    parser.add_argument("--reference", help="file văn bản chép tay để tính WER")
+    parser.add_argument("--models", default="small,medium")
+    parser.add_argument("--precisions", default="fp32,int8")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--language", default=None)
+    parser.add_argument("--one", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.one:
+        print(json.dumps(run_one(args.audio, args.models, args.precisions, args.threads, args.language),
+                         ensure_ascii=False))
+        return
+
+    reference = None
+    if args.reference:
+        with open(args.reference, "r", encoding="utf-8") as f:
+            reference = f.read()
+
+    rows = []
+    for model_name in args.models.split(","):
+        for precision in args.precisions.split(","):
+            cmd = [sys.executable, os.path.abspath(__file__), args.audio, "--one",
+                   "--models", model_name, "--precisions", precision, "--threads", str(args.threads)]
+            if args.language:
+                cmd += ["--language", args.language]
+            proc = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+            if proc.returncode != 0:
+                print(f"[BENCH] {model_name}/{precision} lỗi:\n{proc.stderr[-2000:]}", file=sys.stderr)
+                continue
+            row = json.loads(proc.stdout.strip().splitlines()[-1])
+            if reference is not None:
+                row["wer"] = round(word_error_rate(reference, row["text"]), 4)
+            rows.append(row)
+
+    header = f"{'model':<8} {'prec':<5} {'load s':>7} {'run s':>7} {'RTF':>6} {'WER':>6} {'RSS MB':>8}"
+    print(header, file=sys.stderr)
+    for row in rows:
+        wer = f"{row['wer']:.3f}" if "wer" in row else "-"
+        print(f"{row['model']:<8} {row['precision']:<5} {row['load_seconds']:>7.2f} {row['transcribe_seconds']:>7.2f} "
+              f"{row['rtf']:>6.3f} {wer:>6} {row['peak_rss_mb']:>8.1f}", file=sys.stderr)
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+Sinh dữ liệu mẫu tổng hợp (tất định theo seed) cho benchmark, không cần mạng hay file thật:
+  - ảnh văn bản render sẵn, nhiều kích thước và mức nhiễu (OCR)
+  - DOCX tự dựng bằng zipfile, số đoạn tăng dần, có heading (read_docx)
+  - văn bản yêu cầu nghiệp vụ nhiều độ dài (insight)
+  - WAV 16 kHz giả tiếng nói: chuỗi âm hài có đường bao âm tiết, xen khoảng lặng (speech)
+
+Ảnh và âm thanh cần numpy + Pillow; thiếu thì bỏ qua nhóm tương ứng.
+"""
+import os
+import json
+import random
+import wave
+import zipfile
+import unicodedata
+from xml.sax.saxutils import escape
+
+SUBJECTS = ["Khách hàng", "Quản trị viên", "Nhân viên bán hàng", "Kế toán", "Thủ kho", "Người dùng mới"]
+ACTIONS = ["cần xem", "muốn xuất", "phải duyệt", "có thể tìm kiếm", "được phép chỉnh sửa", "cần nhận thông báo về"]
+OBJECTS = ["đơn hàng", "báo cáo doanh thu", "phiếu nhập kho", "hồ sơ khách hàng", "hóa đơn", "lịch giao hàng"]
+DETAILS = ["theo từng tháng", "trước khi thanh toán", "khi tồn kho thấp", "trên điện thoại", "ngay trong ngày",
+           "kèm lịch sử thay đổi"]
+
+FONT_CANDIDATES = [
+    "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+    "/usr/share/fonts/dejavu/DejaVuSans.ttf",
+    "/Library/Fonts/Arial Unicode.ttf",
+    "C:\\Windows\\Fonts\\arial.ttf",
+]
+
+# Bộ fixture: (tên, tham số); --quick chỉ lấy các mục đánh dấu True
+IMAGE_CASES = [
+    ("img_800x600_clean", (800, 600), 0.0, True),
+    ("img_a4_150dpi_clean", (1240, 1754), 0.0, True),
+    ("img_a4_150dpi_noisy", (1240, 1754), 0.15, True),
+    ("img_a4_300dpi_clean", (2480, 3508), 0.0, False),
+    ("img_a4_300dpi_noisy", (2480, 3508), 0.15, False),
+]
+DOCX_CASES = [("docx_50p", 50, True), ("docx_500p", 500, True), ("docx_5000p", 5000, False)]
+TEXT_CASES = [("text_2k", 2000, True), ("text_20k", 20000, True), ("text_80k", 80000, False)]
+AUDIO_CASES = [("audio_15s", 15, True), ("audio_60s", 60, True), ("audio_300s", 300, False)]
+
+
+def sentence(rng):
+    return f"{rng.choice(SUBJECTS)} {rng.choice(ACTIONS)} {rng.choice(OBJECTS)} {rng.choice(DETAILS)}."
+
+
+def paragraph(rng, sentences=4):
+    return " ".join(sentence(rng) for _ in range(sentences))
+
+
+def make_text(path, chars, seed=0):
+    rng = random.Random(seed)
+    parts, size = [], 0
+    while size < chars:
+        block = paragraph(rng, rng.randint(2, 6))
+        parts.append(block)
+        size += len(block) + 2
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(parts))
+    return {"unit": "kchar", "units": size / 1000}
+
+
+def _strip_accents(text):
+    return "".join(c for c in unicodedata.normalize("NFD", text) if not unicodedata.combining(c)).replace("đ", "d")
+
+
+def _load_font(size):
+    from PIL import ImageFont
+    for candidate in FONT_CANDIDATES:
+        if os.path.exists(candidate):
+            return ImageFont.truetype(candidate, size), True
+    try:
+        return ImageFont.load_default(size=size), False
+    except TypeError:
+        return ImageFont.load_default(), False
+
+
+def render_text_image(path, size, noise=0.0, seed=0):
+    """Trang chữ đen trên nền trắng; `noise` (0–1) thêm nhiễu Gauss, đốm và nghiêng nhẹ."""
+    import numpy as np
+    from PIL import Image, ImageDraw
+
+    width, height = size
+    rng = random.Random(seed)
+    font_size = max(12, width // 50)
+    font, unicode_font = _load_font(font_size)
+    image = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(image)
+
+    margin = width // 12
+    y = margin
+    line_height = int(font_size * 1.5)
+    lines = 0
+    while y + line_height < height - margin:
+        words = sentence(rng).split()
+        line = ""
+        for word in words + sentence(rng).split():
+            trial = f"{line} {word}".strip()
+            if draw.textlength(trial if unicode_font else _strip_accents(trial), font=font) > width - 2 * margin:
+                break
+            line = trial
+        draw.text((margin, y), line if unicode_font else _strip_accents(line), fill=0, font=font)
+        y += line_height
+        lines += 1
+        if rng.random() < 0.15:
+            y += line_height
+
+    if noise > 0:
+        np_rng = np.random.default_rng(seed)
+        image = image.rotate(noise * 10 * (np_rng.random() - 0.5), fillcolor=255, expand=False)
+        pixels = np.asarray(image, dtype=np.float32)
+        pixels += np_rng.normal(0, noise * 255, pixels.shape)
+        speckle = np_rng.random(pixels.shape) < noise / 20
+        pixels[speckle] = 0
+        image = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    image.save(path)
+    return {"unit": "image", "units": 1, "lines": lines}
+
+
+def make_docx(path, paragraphs, seed=0):
+    """DOCX tối giản hợp lệ (document.xml + styles.xml): cứ 10 đoạn có một Heading 1, 50 đoạn có một bảng."""
+    rng = random.Random(seed)
+    body = []
+    for index in range(paragraphs):
+        if index % 10 == 0:
+            body.append(f'<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr>'
+                        f'<w:r><w:t>Mục {index // 10 + 1}: {escape(rng.choice(OBJECTS))}</w:t></w:r></w:p>')
+        body.append(f'<w:p><w:r><w:t xml:space="preserve">{escape(paragraph(rng))}</w:t></w:r></w:p>')
+        if index % 50 != 49:
+            continue
+        rows = "".join(
+            f'<w:tr><w:tc><w:p><w:r><w:t>{escape(rng.choice(SUBJECTS))}</w:t></w:r></w:p></w:tc>'
+            f'<w:tc><w:p><w:r><w:t>{escape(rng.choice(OBJECTS))}</w:t></w:r></w:p></w:tc></w:tr>'
+            for _ in range(5)
+        )
+        body.append(f"<w:tbl>{rows}</w:tbl>")
+
+    ns = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    document = f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:document {ns}><w:body>{"".join(body)}</w:body></w:document>'
+    styles = (f'<?xml version="1.0" encoding="UTF-8" standalone="yes"?><w:styles {ns}>'
+              '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/>'
+              '<w:pPr><w:outlineLvl w:val="0"/></w:pPr></w:style></w:styles>')
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/word/document.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+        '<Override PartName="/word/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+        '</Types>'
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="word/document.xml"/></Relationships>'
+    )
+    doc_rels = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/></Relationships>'
+    )
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", content_types)
+        zf.writestr("_rels/.rels", rels)
+        zf.writestr("word/document.xml", document)
+        zf.writestr("word/styles.xml", styles)
+        zf.writestr("word/_rels/document.xml.rels", doc_rels)
+    return {"unit": "paragraph", "units": paragraphs}
+
+
+def make_audio(path, seconds, seed=0, sample_rate=16000):
+    """WAV mono 16 bit: các cụm 'giọng' 1–6 s (âm hài f0 100–220 Hz, đường bao ~4 âm tiết/s)
+    xen khoảng lặng 0.3–1.5 s, thêm nhiễu nền nhỏ để VAD có việc để làm."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    audio = rng.normal(0, 0.002, total).astype(np.float32)
+    position = int(0.3 * sample_rate)
+    while position < total:
+        length = min(int(rng.uniform(1, 6) * sample_rate), total - position)
+        t = np.arange(length) / sample_rate
+        f0 = rng.uniform(100, 220) * (1 + 0.1 * np.sin(2 * np.pi * 0.5 * t))
+        phase = 2 * np.pi * np.cumsum(f0) / sample_rate
+        voice = sum(np.sin(phase * k) / k for k in (1, 2, 3))
+        envelope = 0.5 * (1 - np.cos(2 * np.pi * rng.uniform(3, 5) * t)) ** 2
+        audio[position:position + length] += (0.2 * voice * envelope).astype(np.float32)
+        position += length + int(rng.uniform(0.3, 1.5) * sample_rate)
+
+    pcm = (np.clip(audio, -1, 1) * 32767).astype("<i2")
+    with wave.open(path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return {"unit": "audio_s", "units": seconds}
+
+
+def _build(root, name, ext, maker, *args):
+    """Tạo fixture nếu chưa có (tên tất định theo tham số nên dùng lại được giữa các lần chạy)."""
+    path = os.path.join(root, name + ext)
+    marker = path + ".json"
+    if os.path.exists(path) and os.path.exists(marker):
+        with open(marker, "r", encoding="utf-8") as f:
+            info = json.load(f)
+    else:
+        info = maker(path, *args)
+        with open(marker, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+    return {"name": name, "path": path, **info}
+
+
+def build_fixtures(root, scripts, quick=False, seed=0):
+    """{script: [fixture]} với fixture = {name, path, unit, units}; script thiếu thư viện → {script: lỗi}."""
+    os.makedirs(root, exist_ok=True)
+    fixtures, skipped = {}, {}
+
+    def pick(cases):
+        return [case for case in cases if case[-1] or not quick]
+
+    for script in scripts:
+        try:
+            if script == "ocr":
+                fixtures[script] = [_build(root, name, ".png", render_text_image, size, noise, seed)
+                                    for name, size, noise, _ in pick(IMAGE_CASES)]
+            elif script == "docx":
+                fixtures[script] = [_build(root, name, ".docx", make_docx, count, seed)
+                                    for name, count, _ in pick(DOCX_CASES)]
+            elif script == "insight":
+                fixtures[script] = [_build(root, name, ".txt", make_text, chars, seed)
+                                    for name, chars, _ in pick(TEXT_CASES)]
+            elif script == "stt":
+                fixtures[script] = [_build(root, name, ".wav", make_audio, seconds, seed)
+                                    for name, seconds, _ in pick(AUDIO_CASES)]
+        except ImportError as e:
+            skipped[script] = f"thiếu thư viện để sinh dữ liệu: {e.name}"
+    return fixtures, skipped
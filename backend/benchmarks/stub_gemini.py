@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Server giả lập Gemini generateContent để benchmark / chạy thử hoàn toàn offline.
+
+Trả lời theo loại prompt của các script:
+  - prompt trích xuất use case   → JSON {"use_cases": [...]} hoặc accepted/suggested_use_cases
+  - prompt hỏi điểm tin cậy      → một số
+  - còn lại (sửa OCR, cải thiện transcript) → trả lại khối văn bản dài nhất trong prompt
+
+Độ trễ mỗi request = latency_ms ± jitter_ms + ms_per_kchar * (số ký tự prompt / 1000).
+GET /stats trả {"requests": N, "seconds": tổng thời gian xử lý, "failures": số lỗi giả lập,
+"max_in_flight": số request xử lý đồng thời nhiều nhất}, POST /reset đặt lại bộ đếm.
+Test lỗi: stub.fail_next(429, times=2, retry_after=1) trả lỗi cho các request kế tiếp (kèm Retry-After).
+
+Cách dùng độc lập:
+  python stub_gemini.py [--port 8765] [--latency-ms 300] [--jitter-ms 50] [--ms-per-kchar 5]
+  GEMINI_API_BASE=http://127.0.0.1:8765/v1beta python process_metadata.py ...
+"""
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+ROLES = ["Khách hàng", "Quản trị viên", "Nhân viên kho", "Kế toán", "Người dùng"]
+NUMBER_HINTS = ("Chỉ trả về số", "Chỉ trả về một số", "Only return a number")
+
+
+def _words(text, seed, count):
+    words = re.findall(r"\w+", text, re.UNICODE)
+    if not words:
+        return "xử lý yêu cầu"
+    rng = random.Random(seed)
+    start = rng.randrange(max(1, len(words) - count))
+    return " ".join(words[start:start + count])
+
+
+def fake_use_case(text, seed, nested_goal=False):
+    rng = random.Random(seed)
+    goal = _words(text, seed, 8)
+    return {
+        "role": rng.choice(ROLES),
+        "goal": {"main": goal, "sub": [_words(text, seed + 1, 5)]} if nested_goal else goal,
+        "tasks": [_words(text, seed + 2, 6), _words(text, seed + 3, 6)],
+        "inputs": [_words(text, seed + 4, 3)],
+        "outputs": [_words(text, seed + 5, 3)],
+        "context": _words(text, seed + 6, 10),
+        "priority": rng.choice(["cao", "trung bình", "thấp"]),
+        "feedback": [],
+        "rules": [_words(text, seed + 7, 6)],
+        "triggers": [_words(text, seed + 8, 4)],
+    }
+
+
+def answer(prompt):
+    seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+    if "accepted_use_cases" in prompt:
+        return json.dumps({
+            "accepted_use_cases": [fake_use_case(prompt, seed + i * 10, True) for i in range(2)],
+            "suggested_use_cases": [fake_use_case(prompt, seed + 100, True)],
+        }, ensure_ascii=False)
+    if "use_case" in prompt:
+        return json.dumps({"use_cases": [fake_use_case(prompt, seed + i * 10) for i in range(3)]}, ensure_ascii=False)
+    if any(hint in prompt for hint in NUMBER_HINTS):
+        return str(70 + seed % 30)
+    blocks = [b.strip() for b in re.split(r"\n\s*\n|\n---[^\n]*---\n", prompt) if b.strip()]
+    return max(blocks, key=len) if blocks else prompt
+
+
+class StubGemini:
+    def __init__(self, host="127.0.0.1", port=0, latency_ms=300, jitter_ms=50, ms_per_kchar=0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ms_per_kchar = ms_per_kchar
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.seconds = 0.0
+        self.failures = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._faults = deque()    # (status, retry_after) cho từng request kế tiếp
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def api_base(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1beta"
+
+    def endpoint(self, model="gemini-2.0-flash"):
+        return f"{self.api_base}/models/{model}:generateContent"
+
+    def delay(self, prompt):
+        with self.lock:
+            jitter = self.rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0.0
+        return max(0.0, self.latency_ms + jitter + self.ms_per_kchar * len(prompt) / 1000) / 1000
+
+    def fail_next(self, status, times=1, retry_after=None):
+        """`times` request generateContent kế tiếp nhận HTTP `status` (kèm header Retry-After nếu có)."""
+        with self.lock:
+            self._faults.extend([(status, retry_after)] * times)
+
+    def _take_fault(self):
+        with self.lock:
+            return self._faults.popleft() if self._faults else None
+
+    def stats(self):
+        with self.lock:
+            return {"requests": self.requests, "seconds": round(self.seconds, 4),
+                    "failures": self.failures, "max_in_flight": self.max_in_flight}
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.seconds = 0.0
+            self.failures = 0
+            self.max_in_flight = 0
+            self._faults.clear()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status, body, headers=None):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.startswith("/stats"):
+                    self._send(200, stub.stats())
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                started = time.perf_counter()
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                if self.path.startswith("/reset"):
+                    stub.reset()
+                    self._send(200, {"ok": True})
+                    return
+                if ":generateContent" not in self.path:
+                    self._send(404, {"error": "not found"})
+                    return
+                try:
+                    payload = json.loads(body.decode("utf-8"))
+                    prompt = "".join(p.get("text", "") for c in payload["contents"] for p in c["parts"])
+                except (ValueError, KeyError, TypeError):
+                    self._send(400, {"error": {"message": "invalid payload"}})
+                    return
+                fault = stub._take_fault()
+                if fault is not None:
+                    status, retry_after = fault
+                    with stub.lock:
+                        stub.failures += 1
+                    headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+                    self._send(status, {"error": {"code": status, "message": "injected failure"}}, headers)
+                    return
+                with stub.lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                time.sleep(stub.delay(prompt))
+                # Cập nhật bộ đếm trước khi trả lời: client nhận phản hồi là thấy số liệu mới
+                with stub.lock:
+                    stub.in_flight -= 1
+                    stub.requests += 1
+                    stub.seconds += time.perf_counter() - started
+                self._send(200, {"candidates": [{"content": {"parts": [{"text": answer(prompt)}], "role": "model"}}]})
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Server giả lập Gemini generateContent")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=50)
+    parser.add_argument("--ms-per-kchar", type=float, default=0)
+    args = parser.parse_args()
+
+    stub = StubGemini(args.host, args.port, args.latency_ms, args.jitter_ms, args.ms_per_kchar)
+    print(f"[STUB] GEMINI_API_BASE={stub.api_base}", file=sys.stderr)
+    try:
+        stub.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
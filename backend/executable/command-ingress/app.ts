@@ -7,6 +7,7 @@ import fileUpload from 'express-fileupload';
 
 import cors from 'cors';
 import { recoverMiddleware } from './middlewares/recover';
+import requireAuthorizedUser from './middlewares/auth';
 import { createServer } from 'http';
 
 import initAuthRoute from './features/auth/adapter/route';
@@ -33,6 +34,7 @@ import { InsightController } from './features/insight/adapter/controller';
 import initAllInOneRoute from './features/allinone/adapter/route';
 
 import initDocgenRoute from './features/docgen/adapter/route';
+import { getScheduler } from './shared/scheduler';
 
 
 const app = express();
@@ -73,6 +75,10 @@ const createHttpServer = (redisClient: any) => {
   app.use('/insight', initInsightRoute(new InsightController(new InsightService()))); //Trích xuất use_case từ văn bản
   app.use('/allinone', initAllInOneRoute()); //Tổng hợp OCR, Speech, Insight
   app.use('/generate-doc', initDocgenRoute()); //Sinh tài liệu UCSD và USSD
+  if (env.SCHED_METRICS) {
+    //Hàng đợi, thời gian chờ của job Python: chỉ bật khi cần theo dõi nội bộ, yêu cầu đăng nhập
+    app.get('/metrics/scheduler', requireAuthorizedUser, (_req, res) => { res.json(getScheduler().stats()); });
+  }
 
 
   app.use(recoverMiddleware);
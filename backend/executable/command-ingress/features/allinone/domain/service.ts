@@ -1,10 +1,14 @@
 import { UploadedFile } from 'express-fileupload';
 import path from 'path';
 import fs from 'fs';
-import { InsightService } from '../../insight/domain/service';
+import { InsightService, UseCaseGroup } from '../../insight/domain/service';
 import { OcrService } from '../../ocr/domain/service';
 import { SpeechToTextService } from '../../speech/domain/service';
 import { ReadDocxService } from '../../read_docx/domain/service';
+import { JobPriority } from '../../../shared/scheduler';
+
+// Cả lô file của AllInOne chạy ở mức bulk, nhường chỗ cho các endpoint OCR / STT / DOCX đơn lẻ
+const PRIORITY: JobPriority = 'bulk';
 
 export class AllInOneService {
     private insightService = new InsightService();
@@ -35,7 +39,7 @@ export class AllInOneService {
                 continue;
             }
             const ext = path.extname(file.name).toLowerCase();
-            if ([".png", ".jpg", ".jpeg", ".bmp", ".webp"].includes(ext)) {
+            if ([".png", ".jpg", ".jpeg", ".bmp", ".webp", ".pdf", ".tif", ".tiff"].includes(ext)) {
                 ocrFiles.push(file);
             } else if ([".mp3", ".wav", ".m4a", ".flac", ".ogg", ".aac", ".webm"].includes(ext)) {
                 speechFiles.push(file);
@@ -45,90 +49,74 @@ export class AllInOneService {
         }
 
         const results: any = {};
-        const accepted: any[] = [];
-        const suggested: any[] = [];
-
-        if (ocrFiles.length > 0) {
-            const ocrResult = await this.ocrService.handleImages(ocrFiles);
+        // Use case theo từng nguồn, để bước gộp ghi lại nguồn gốc. Mỗi file giữ ô theo thứ tự bắt đầu
+        // trích xuất (không theo thứ tự insight xong) để cùng đầu vào luôn cho cùng thứ tự use case
+        const groups: (UseCaseGroup | undefined)[] = [];
+        // Insight của mỗi file bắt đầu ngay khi file đó trích xuất xong, chạy chồng lên các file còn lại
+        const insightTasks: Promise<void>[] = [];
 
-            await Promise.all(
-                ocrResult.map(async (item) => {
-                    if (item?.text && item.text.length > 10) {
-                        try {
-                            const insight = await this.insightService.extractWithSuggestion(item.text);
-                            item.accepted_use_cases = insight.accepted_use_cases ?? [];
-                            item.suggested_use_cases = insight.suggested_use_cases ?? [];
-                            accepted.push(...item.accepted_use_cases);
-                            suggested.push(...item.suggested_use_cases);
-                        } catch (e) {
-                            item.accepted_use_cases = [];
-                            item.suggested_use_cases = [];
-                            console.warn('⚠️ Lỗi insight OCR:', e);
-                        }
-                    } else {
-                        item.accepted_use_cases = [];
-                        item.suggested_use_cases = [];
-                    }
-                })
-            );
+        const extractInsight = (type: 'ocr' | 'speech' | 'docx', item: any, fileName?: string) => {
+            const slot = insightTasks.length;
+            insightTasks.push((async () => {
+                item.accepted_use_cases = [];
+                item.suggested_use_cases = [];
+                // Section chỉ dùng để trích xuất, không trả về client
+                const sections = item?.sections;
+                if (item) delete item.sections;
+                if (!(item?.text && item.text.length > 10)) return;
+                try {
+                    const insight = sections?.length
+                        ? await this.insightService.extractSections(sections, PRIORITY)
+                        : await this.insightService.extractWithSuggestion(item.text, PRIORITY);
+                    item.accepted_use_cases = insight.accepted_use_cases ?? [];
+                    item.suggested_use_cases = insight.suggested_use_cases ?? [];
+                    groups[slot] = {
+                        source: { type, file: item.file ?? fileName },
+                        accepted_use_cases: item.accepted_use_cases,
+                        suggested_use_cases: item.suggested_use_cases,
+                    };
+                } catch (e) {
+                    console.warn(`⚠️ Lỗi insight ${type.toUpperCase()}:`, e);
+                }
+            })());
+        };
 
-            results.ocr = ocrResult;
+        if (ocrFiles.length > 0) {
+            const frames = ocrFiles.map((file) => ({ name: file.name, data: file.data }));
+            results.ocr = await this.ocrService.streamOCR(frames, (item, index) =>
+                extractInsight('ocr', item, ocrFiles[index]?.name), undefined, undefined, PRIORITY);
         }
 
         if (speechFiles.length > 0) {
-            const sttResult = await this.speechService.handleAudio(speechFiles, context);
-
-            await Promise.all(
-                sttResult.map(async (item) => {
-                    if (item?.text && item.text.length > 10) {
-                        try {
-                            const insight = await this.insightService.extractWithSuggestion(item.text);
-                            item.accepted_use_cases = insight.accepted_use_cases ?? [];
-                            item.suggested_use_cases = insight.suggested_use_cases ?? [];
-                            accepted.push(...item.accepted_use_cases);
-                            suggested.push(...item.suggested_use_cases);
-                        } catch (e) {
-                            item.accepted_use_cases = [];
-                            item.suggested_use_cases = [];
-                            console.warn('⚠️ Lỗi insight STT:', e);
-                        }
-                    } else {
-                        item.accepted_use_cases = [];
-                        item.suggested_use_cases = [];
-                    }
-                })
-            );
-
-            results.speech = sttResult;
+            results.speech = await this.speechService.streamAudio(speechFiles, context, (item, index) =>
+                extractInsight('speech', item, speechFiles[index]?.name), PRIORITY);
         }
 
         if (docxFiles.length > 0) {
-            const docxResult = await this.readDocxService.handleDocxFiles(docxFiles);
-            await Promise.all(
-                docxResult.map(async (item) => {
-                    if (item?.text && item.text.length > 10) {
-                        try {
-                            const insight = await this.insightService.extractWithSuggestion(item.text);
-                            item.accepted_use_cases = insight.accepted_use_cases ?? [];
-                            item.suggested_use_cases = insight.suggested_use_cases ?? [];
-                            accepted.push(...item.accepted_use_cases);
-                            suggested.push(...item.suggested_use_cases);
-                        } catch (e) {
-                            item.accepted_use_cases = [];
-                            item.suggested_use_cases = [];
-                            console.warn('⚠️ Lỗi insight DOCX:', e);
-                        }
-                    } else {
-                        item.accepted_use_cases = [];
-                        item.suggested_use_cases = [];
-                    }
-                })
-            );
+            // Tài liệu sửa đổi tải lên lại: chỉ các section thay đổi phải trích xuất lại
+            const docxResult = await this.readDocxService.handleDocxFiles(docxFiles, PRIORITY, true);
+            docxResult.forEach((item, index) => extractInsight('docx', item, docxFiles[index]?.name));
             results.docx = docxResult;
         }
 
-        results.accepted_use_cases = accepted;
-        results.suggested_use_cases = suggested;
+        await Promise.all(insightTasks);
+        const sources = groups.filter((group): group is UseCaseGroup => !!group);
+
+        // Gộp use case gần trùng giữa các nguồn trước khi sinh tài liệu
+        try {
+            const merged = await this.insightService.mergeUseCases(sources, PRIORITY);
+            results.accepted_use_cases = merged.accepted_use_cases;
+            results.suggested_use_cases = merged.suggested_use_cases;
+            results.merge_stats = merged.stats;
+        } catch (e) {
+            console.warn('⚠️ Lỗi gộp use case, giữ danh sách gốc:', e);
+            results.accepted_use_cases = [];
+            results.suggested_use_cases = [];
+            sources.forEach((group) => {
+                results.accepted_use_cases.push(...group.accepted_use_cases);
+                results.suggested_use_cases.push(...group.suggested_use_cases);
+            });
+        }
 
         return results;
     }
@@ -1,6 +1,16 @@
 // features/insight/domain/service.ts
 import path from 'path';
 import { spawn } from 'child_process';
+import { getPythonWorkerPool, isPythonWorkerMode } from '../../../shared/python-worker';
+import { getScheduler, JobPriority } from '../../../shared/scheduler';
+import { insightCost } from '../../../shared/job-cost';
+import { DocxSection } from '../../read_docx/domain/service';
+
+export interface UseCaseGroup {
+  source: { type: string; file?: string };
+  accepted_use_cases: any[];
+  suggested_use_cases: any[];
+}
 
 export class InsightService {
   /**
@@ -13,17 +23,75 @@ export class InsightService {
   /**
    * Phân tích metadata nâng cao + gợi ý use case
    */
-  async extractWithSuggestion(text: string): Promise<any> {
-    return this.runPython(text, 'all');
+  async extractWithSuggestion(text: string, priority: JobPriority = 'interactive'): Promise<any> {
+    return this.runPython(text, 'all', priority);
+  }
+
+  /**
+   * Như extractWithSuggestion nhưng theo từng section của tài liệu: section không đổi so với lần tải lên
+   * trước lấy lại kết quả đã lưu, chỉ section mới / đã sửa phải gọi LLM
+   */
+  async extractSections(sections: DocxSection[], priority: JobPriority = 'interactive'): Promise<any> {
+    const payload = JSON.stringify(sections);
+    return getScheduler().run('insight', insightCost(payload.length), priority,
+      () => this.execPython(payload, 'all', ['--sections']));
+  }
+
+  /**
+   * Gộp use case gần trùng từ nhiều nguồn, mỗi use case gộp có `sources` ghi lại nguồn gốc
+   */
+  async mergeUseCases(groups: UseCaseGroup[], priority: JobPriority = 'interactive'): Promise<any> {
+    const scriptPath = path.join(__dirname, '../pythonScript/merge_use_cases.py');
+    const payload = JSON.stringify({ groups });
+
+    const result = await getScheduler().run('merge', insightCost(payload.length), priority, () => isPythonWorkerMode()
+      ? getPythonWorkerPool(scriptPath).run([payload])
+      : new Promise<any>((resolve, reject) => {
+          const python = spawn('python', [scriptPath, '--stdin']);
+          let stdout = '';
+          let stderr = '';
+
+          python.stdout.on('data', (data) => (stdout += data.toString()));
+          python.stderr.on('data', (data) => (stderr += data.toString()));
+
+          python.on('close', () => {
+            try {
+              resolve(JSON.parse(stdout));
+            } catch (err) {
+              reject(`Lỗi parse JSON từ merge_use_cases: ${stderr || stdout}`);
+            }
+          });
+          python.on('error', (err) => reject(`Không thể khởi động Python script: ${err.message}`));
+          python.stdin.on('error', () => {
+            // Process đã thoát sớm, lỗi được báo qua 'close'
+          });
+          python.stdin.end(payload, 'utf-8');
+        }));
+
+    if (result?.error) throw new Error(result.error);
+    return result;
   }
 
   /**
    * Hàm dùng chung để gọi Python script với chế độ linh hoạt
    */
-  private runPython(text: string, mode: 'default' | 'all'): Promise<any> {
+  private runPython(text: string, mode: 'default' | 'all', priority: JobPriority = 'interactive'): Promise<any> {
+    return getScheduler().run('insight', insightCost(text.length), priority, () => this.execPython(text, mode));
+  }
+
+  private async execPython(text: string, mode: 'default' | 'all', extraArgs: string[] = []): Promise<any> {
+    const scriptPath = path.join(__dirname, '../pythonScript/process_metadata.py');
+
+    if (isPythonWorkerMode()) {
+      // Worker nhận job qua JSON line nên không bị giới hạn độ dài argv;
+      // "--" để văn bản bắt đầu bằng "-" không bị hiểu là tham số
+      const output = await getPythonWorkerPool(scriptPath).run([`--mode=${mode}`, ...extraArgs, '--', text]);
+      return this.parseOutput(output);
+    }
+
     return new Promise((resolve, reject) => {
-      const scriptPath = path.join(__dirname, '../pythonScript/process_metadata.py');
-      const args = [scriptPath, `--mode=${mode}`, text];
+      // Văn bản đi qua stdin: transcript / tài liệu dài vượt giới hạn độ dài argv của hệ điều hành
+      const args = [scriptPath, `--mode=${mode}`, ...extraArgs, '--stdin'];
       const python = spawn('python', args);
 
       let stdout = '';
@@ -39,13 +107,7 @@ export class InsightService {
 
       python.on('close', () => {
         try {
-          const cleaned = stdout
-            .replace(/```json|```/g, '')
-            .replace(/^\uFEFF/, '')
-            .trim();
-
-          const parsed = JSON.parse(cleaned);
-          resolve(parsed);
+          resolve(this.parseOutput(stdout));
         } catch (err) {
           console.error('[Python STDOUT]', stdout);
           console.error('[Python STDERR]', stderr);
@@ -56,6 +118,23 @@ export class InsightService {
       python.on('error', (err) => {
         reject(`Không thể khởi động Python script: ${err.message}`);
       });
+
+      python.stdin.on('error', () => {
+        // Process đã thoát sớm, lỗi được báo qua 'close'
+      });
+      python.stdin.end(text, 'utf-8');
     });
   }
+
+  /**
+   * Bỏ markdown fence / BOM mà LLM hay trả kèm rồi parse JSON
+   */
+  private parseOutput(output: string): any {
+    const cleaned = output
+      .replace(/```json|```/g, '')
+      .replace(/^\uFEFF/, '')
+      .trim();
+
+    return JSON.parse(cleaned);
+  }
 }
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Gộp các use case gần trùng nhau từ nhiều nguồn (OCR, STT, DOCX) trước khi sinh tài liệu.
+
+  1. role, goal, tasks của mỗi use case → các vector TF-IDF (từ đơn + cặp từ) băm vào số chiều cố định
+  2. độ tương đồng cosine tính theo khối bằng phép nhân ma trận NumPy, không so từng cặp trong Python
+  3. các cặp vượt ngưỡng được gom cụm bằng union-find
+  4. mỗi cụm gộp thành một use case chuẩn, ghi lại nguồn gốc trong `sources`
+
+Đầu vào (JSON, qua --stdin hoặc tham số):
+  {"groups": [{"source": {...}, "accepted_use_cases": [...], "suggested_use_cases": [...]}, ...]}
+Đầu ra:
+  {"accepted_use_cases": [...], "suggested_use_cases": [...], "stats": {...}}
+
+Biến môi trường:
+  USE_CASE_DEDUP_THRESHOLD  ngưỡng điểm goal/tasks để coi là trùng (mặc định 0.8)
+"""
+import os
+import re
+import sys
+import json
+import zlib
+import unicodedata
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', '..', '..', 'shared', 'pythonScript'))
+from worker import serve, env_int, check_stdin
+from lazy_import import lazy_import
+
+# process_metadata chỉ dùng các hàm gộp trường, không cần numpy
+np = lazy_import("numpy")
+
+ROLE_DIM = 1 << 8
+TEXT_DIM = 1 << 11
+BLOCK_SIZE = 1024
+THRESHOLD = float(os.getenv("USE_CASE_DEDUP_THRESHOLD", "0.8"))
+ROLE_THRESHOLD = 0.7
+GOAL_WEIGHT = 0.6
+LIST_KEYS = ("accepted_use_cases", "suggested_use_cases")
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+# === CHUẨN HÓA & GỘP TRƯỜNG ===
+def norm_text(value):
+    if isinstance(value, dict):
+        value = value.get("main") or json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return " ".join(str(value or "").lower().split())
+
+
+def use_case_key(use_case):
+    return (norm_text(use_case.get("role")), norm_text(use_case.get("goal")))
+
+
+def merge_values(old, new):
+    """Gộp một trường của hai use case trùng nhau: danh sách → hợp (giữ thứ tự), object → gộp đệ quy."""
+    if old in (None, "", [], {}):
+        return new
+    if isinstance(old, list) and isinstance(new, list):
+        merged = list(old)
+        seen = {json.dumps(v, ensure_ascii=False, sort_keys=True) for v in old}
+        for v in new:
+            key = json.dumps(v, ensure_ascii=False, sort_keys=True)
+            if key not in seen:
+                seen.add(key)
+                merged.append(v)
+        return merged
+    if isinstance(old, dict) and isinstance(new, dict):
+        merged = dict(old)
+        for k, v in new.items():
+            merged[k] = merge_values(merged.get(k), v)
+        return merged
+    return old
+
+
+# === VECTOR HÓA ===
+def _goal_text(use_case):
+    goal = use_case.get("goal")
+    if isinstance(goal, dict):
+        goal = " ".join([str(goal.get("main") or "")] + [str(s) for s in goal.get("sub") or []])
+    return str(goal or "")
+
+
+def _tasks_text(use_case):
+    tasks = use_case.get("tasks")
+    if isinstance(tasks, list):
+        tasks = " ".join(str(t) for t in tasks)
+    return str(tasks or "")
+
+
+def fingerprint(use_case):
+    """(role, goal, tasks) đã chuẩn hóa — ba trường dùng để so khớp."""
+    return tuple(
+        unicodedata.normalize("NFC", text).lower().strip()
+        for text in (str(use_case.get("role") or ""), _goal_text(use_case), _tasks_text(use_case))
+    )
+
+
+def _features(text):
+    tokens = TOKEN_RE.findall(text)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def tfidf_matrix(texts, dim):
+    """Ma trận TF-IDF (băm đặc trưng, float32, chuẩn hóa L2) kích thước len(texts) x dim.
+    Văn bản rỗng → vector 0 (tương đồng 0 với mọi thứ)."""
+    n = len(texts)
+    rows, cols = [], []
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            rows.append(row)
+            cols.append(zlib.crc32(feature.encode("utf-8")) & (dim - 1))
+    flat = np.asarray(rows, dtype=np.int64) * dim + np.asarray(cols, dtype=np.int64)
+    counts = np.bincount(flat, minlength=n * dim).astype(np.float32).reshape(n, dim)
+    df = np.count_nonzero(counts, axis=0).astype(np.float32)
+    idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+    np.log1p(counts, out=counts)          # TF dạng sublinear
+    counts *= idf
+    norms = np.linalg.norm(counts, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    counts /= norms
+    return counts
+
+
+class UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        root = i
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[i] != root:
+            self.parent[i], i = root, self.parent[i]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # Giữ phần tử xuất hiện trước làm gốc để thứ tự ổn định
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+
+def cluster(fingerprints, threshold=THRESHOLD):
+    """Gán nhãn cụm cho từng fingerprint (đã bỏ trùng tuyệt đối).
+
+    Hai use case trùng khi role gần giống (>= ROLE_THRESHOLD) và điểm
+    GOAL_WEIGHT * cos(goal) + (1 - GOAL_WEIGHT) * cos(tasks) >= threshold.
+    Độ tương đồng tính theo khối BLOCK_SIZE dòng bằng nhân ma trận; Python chỉ duyệt các cặp vượt ngưỡng.
+    """
+    n = len(fingerprints)
+    roles = tfidf_matrix([f[0] or "<none>" for f in fingerprints], ROLE_DIM)
+    goals = tfidf_matrix([f[1] for f in fingerprints], TEXT_DIM)
+    tasks = tfidf_matrix([f[2] for f in fingerprints], TEXT_DIM)
+    # Thiếu tasks ở một phía → chỉ so goal
+    has_tasks = np.array([bool(f[2]) for f in fingerprints])
+
+    uf = UnionFind(n)
+    for start in range(0, n, BLOCK_SIZE):
+        stop = min(n, start + BLOCK_SIZE)
+        # Chỉ cần nửa trên của ma trận: so khối [start, stop) với [start, n)
+        role_sim = roles[start:stop] @ roles[start:].T
+        score = goals[start:stop] @ goals[start:].T
+        both_tasks = has_tasks[start:stop, None] & has_tasks[None, start:]
+        task_sim = tasks[start:stop] @ tasks[start:].T
+        score = np.where(both_tasks, GOAL_WEIGHT * score + (1 - GOAL_WEIGHT) * task_sim, score)
+        rows, cols = np.nonzero((score >= threshold) & (role_sim >= ROLE_THRESHOLD))
+        rows += start
+        cols += start
+        upper = cols > rows
+        for a, b in zip(rows[upper].tolist(), cols[upper].tolist()):
+            uf.union(a, b)
+    return [uf.find(i) for i in range(n)]
+
+
+# === GỘP ===
+def _completeness(use_case):
+    return sum(1 for v in use_case.values() if v not in (None, "", [], {}))
+
+
+def merge_use_cases(groups, threshold=THRESHOLD):
+    items = []
+    for group in groups:
+        source = group.get("source") or {}
+        for list_key in LIST_KEYS:
+            for use_case in group.get(list_key) or []:
+                if isinstance(use_case, dict):
+                    items.append((list_key, source, use_case))
+
+    if not items:
+        return {key: [] for key in LIST_KEYS} | {"stats": {"input": 0, "output": 0}}
+
+    # Trùng tuyệt đối được gom trước, ma trận chỉ dựng trên các fingerprint khác nhau
+    unique = {}
+    item_fp = [unique.setdefault(fingerprint(uc), len(unique)) for _, _, uc in items]
+    labels = cluster(list(unique), threshold)
+    clusters = {}
+    for index, fp in enumerate(item_fp):
+        clusters.setdefault(labels[fp], []).append(index)
+
+    result = {key: [] for key in LIST_KEYS}
+    # Cụm theo thứ tự xuất hiện của use case đầu tiên: cùng đầu vào luôn cho cùng thứ tự đầu ra
+    for members in sorted(clusters.values(), key=lambda members: members[0]):
+        # Use case đầy đủ nhất làm gốc, các use case còn lại bổ sung trường còn thiếu
+        ordered = sorted(members, key=lambda i: (-_completeness(items[i][2]), i))
+        canonical = {k: v for k, v in items[ordered[0]][2].items() if k not in ("sources", "merged_count")}
+        for i in ordered[1:]:
+            for k, v in items[i][2].items():
+                if k not in ("sources", "merged_count"):
+                    canonical[k] = merge_values(canonical.get(k), v)
+        canonical["sources"] = [
+            {**items[i][1], "list": items[i][0]} for i in members
+        ]
+        canonical["merged_count"] = len(members)
+        # Đã được chấp nhận ở bất kỳ nguồn nào → accepted
+        target = "accepted_use_cases" if any(items[i][0] == "accepted_use_cases" for i in members) \
+            else "suggested_use_cases"
+        result[target].append(canonical)
+
+    result["stats"] = {"input": len(items), "output": len(clusters)}
+    return result
+
+
+def run(argv):
+    try:
+        if "--stdin" in argv:
+            check_stdin("--stdin")
+            payload = json.loads(sys.stdin.buffer.read().decode("utf-8"))
+        elif argv and os.path.isfile(argv[0]):
+            with open(argv[0], "r", encoding="utf-8") as f:
+                payload = json.load(f)
+        elif argv:
+            payload = json.loads(argv[0])
+        else:
+            return {"error": "No input provided"}
+        result = merge_use_cases(payload.get("groups") or [])
+        print(f"[MERGE] {result['stats']['input']} → {result['stats']['output']} use case", file=sys.stderr)
+        return result
+    except Exception as e:
+        return {"error": str(e)}
+
+
+if __name__ == "__main__":
+    if "--serve" in sys.argv[1:]:
+        serve(run, max_concurrency=env_int("MERGE_WORKER_CONCURRENCY", 2))
+        sys.exit(0)
+    sys.stdout.reconfigure(encoding="utf-8")
+    print(json.dumps(run(sys.argv[1:]), ensure_ascii=False))
@@ -93,7 +93,7 @@
 
 # if __name__ == "__main__":
 #     if len(sys.argv) < 2:
-#         print("Usage: python process_metadata.py <text>", file=sys.stderr)
+#         print("Usage: python process_metadata.py [--mode=all] [--lang=en] (<text> | --stdin | --file=<path>)", file=sys.stderr)
 #         sys.exit(1)
 
 #     mode = "default"
@@ -121,19 +121,29 @@
 import sys
 import json
 import os
-import google.generativeai as genai
+import re
 from dotenv import load_dotenv
-import io
 
-# Đảm bảo in Unicode UTF-8
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', '..', '..', 'shared', 'pythonScript'))
+from worker import serve, env_int, check_stdin
+from llm_cache import get_llm_cache
+from llm_client import GeminiClient
+from result_cache import ResultCache
+from frames import hash_bytes
+from merge_use_cases import use_case_key, merge_values
+from timing import Timings, use, stage, pop_flags, profile, record_serialize
+
+# Đảm bảo in Unicode UTF-8 (đổi encoding tại chỗ: bọc lại sys.stdout.buffer sẽ đóng luồng cũ khi bị thu hồi)
+sys.stdout.reconfigure(encoding='utf-8')
 
 # Load môi trường và khởi tạo LLM
 load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY_3"))
-llm = genai.GenerativeModel(model_name="gemini-2.0-flash")
+LLM_MODEL_NAME = "gemini-2.0-flash"
+llm = GeminiClient(api_key=os.getenv("GOOGLE_API_KEY_3"), model=LLM_MODEL_NAME)
+llm_cache = get_llm_cache()
 
-def extract_metadata(text, language='vn'):
+def metadata_prompt(text, language='vn'):
     if language == 'en':
         prompt = f"""
 You are a software business analyst. Your task is to extract business requirements from the user's conversation or text.
@@ -188,13 +198,9 @@ Bạn là một chuyên gia phân tích nghiệp vụ phần mềm (Business Ana
 
 ❗ Không markdown, không tiêu đề, chỉ JSON hợp lệ.
 """
-    try:
-        response = llm.generate_content(prompt)
-        return response.text.strip()
-    except Exception as e:
-        return json.dumps({"error": str(e)})
+    return prompt
 
-def extract_with_suggestion(text, language='vn'):
+def suggestion_prompt(text, language='vn'):
     if language == 'en':
         prompt = f"""
 You are a software business analyst.
@@ -266,35 +272,313 @@ Bạn là một chuyên gia phân tích nghiệp vụ phần mềm (Business Ana
 - Không được để goal là chuỗi đơn lẻ.
 - Không thêm markdown, không giải thích, không chú thích.
 """
+    return prompt
+
+def extract_metadata(text, language='vn'):
     try:
-        response = llm.generate_content(prompt)
-        return response.text.strip()
+        with stage("llm_extract"):
+            return llm.generate(metadata_prompt(text, language), site="insight.extract_metadata").strip()
     except Exception as e:
         return json.dumps({"error": str(e)})
 
+def extract_with_suggestion(text, language='vn'):
+    try:
+        with stage("llm_extract"):
+            return llm.generate(suggestion_prompt(text, language), site="insight.extract_with_suggestion").strip()
+    except Exception as e:
+        return json.dumps({"error": str(e)})
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python process_metadata.py <text>", file=sys.stderr)
-        sys.exit(1)
 
+# === MAP-REDUCE CHO VĂN BẢN DÀI ===
+# Văn bản dài hơn CHUNK_CHARS được chia thành các đoạn chồng lấn theo ranh giới đoạn văn / câu,
+# mỗi đoạn trích xuất song song rồi gộp lại, nên độ trễ phụ thuộc kích thước đoạn chứ không phải cả tài liệu.
+CHUNK_CHARS = env_int("INSIGHT_CHUNK_CHARS", 6000)
+CHUNK_OVERLAP = env_int("INSIGHT_CHUNK_OVERLAP", 500)
+LIST_KEYS = {"default": ["use_cases"], "all": ["accepted_use_cases", "suggested_use_cases"]}
+
+
+def _split_long_paragraph(paragraph, max_chars):
+    """Đoạn văn quá dài (transcript không xuống dòng) → cắt theo câu, cuối cùng mới cắt cứng."""
+    pieces, current = [], ""
+    for sentence in re.split(r"(?<=[.!?…])\s+", paragraph):
+        while len(sentence) > max_chars:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def chunk_text(text, max_chars=CHUNK_CHARS, overlap=CHUNK_OVERLAP):
+    """Chia văn bản thành các đoạn <= max_chars theo ranh giới đoạn văn (dòng / segment).
+    Mỗi đoạn mới lặp lại phần cuối (~overlap ký tự) của đoạn trước để không mất ngữ cảnh ở chỗ cắt."""
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n|\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) > max_chars:
+            paragraphs.extend(_split_long_paragraph(paragraph, max_chars))
+        else:
+            paragraphs.append(paragraph)
+
+    chunks, current, size = [], [], 0
+    for paragraph in paragraphs:
+        if current and size + len(paragraph) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            # Giữ lại các đoạn cuối làm phần chồng lấn
+            tail, tail_size = [], 0
+            for prev in reversed(current):
+                if tail_size >= overlap or tail_size + len(prev) > max_chars // 2:
+                    break
+                tail.insert(0, prev)
+                tail_size += len(prev) + 1
+            current, size = tail, tail_size
+        current.append(paragraph)
+        size += len(paragraph) + 1
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def parse_llm_json(output):
+    cleaned = re.sub(r"```(?:json)?", "", output or "").replace("\ufeff", "").strip()
+    return json.loads(cleaned)
+
+
+def reduce_use_cases(partials, list_keys):
+    """Gộp kết quả từng đoạn thành một: use case cùng (role, goal) được hợp nhất,
+    use case đã có trong danh sách trước (accepted) không lặp lại ở danh sách sau (suggested)."""
+    merged = {key: {} for key in list_keys}
+    for partial in partials:
+        for list_key in list_keys:
+            for use_case in partial.get(list_key) or []:
+                if not isinstance(use_case, dict):
+                    continue
+                key = use_case_key(use_case)
+                owner = next((k for k in list_keys if key in merged[k]), list_key)
+                bucket = merged[owner]
+                if key in bucket:
+                    bucket[key] = merge_values(bucket[key], use_case)
+                else:
+                    bucket[key] = use_case
+    return {list_key: list(merged[list_key].values()) for list_key in list_keys}
+
+
+def extract_long(text, mode, language='vn'):
+    with stage("chunk"):
+        chunks = chunk_text(text)
+    if mode == "all":
+        prompts = [suggestion_prompt(chunk, language) for chunk in chunks]
+        site = "insight.extract_with_suggestion"
+    else:
+        prompts = [metadata_prompt(chunk, language) for chunk in chunks]
+        site = "insight.extract_metadata"
+    print(f"[INSIGHT] {len(text)} ký tự → {len(chunks)} đoạn", file=sys.stderr)
+
+    with stage("llm_extract"):
+        outputs = llm.generate_many(prompts, site=site)
+
+    partials, errors = [], []
+    for index, output in enumerate(outputs):
+        try:
+            if isinstance(output, Exception):
+                raise output
+            partials.append(parse_llm_json(output))
+        except Exception as e:
+            errors.append({"chunk": index, "error": str(e)})
+    return finish(partials, errors, mode, chunks=len(chunks))
+
+
+def finish(partials, errors, mode, **extra):
+    """Gộp kết quả từng phần thành chuỗi JSON kết quả; `errors` ghi vào chunk_errors."""
+    if not partials:
+        return json.dumps({"error": errors[0]["error"] if errors else "Không có nội dung", "chunk_errors": errors},
+                          ensure_ascii=False)
+    with stage("reduce"):
+        result = reduce_use_cases(partials, LIST_KEYS["all" if mode == "all" else "default"])
+    result.update(extra)
+    if errors:
+        result["chunk_errors"] = errors
+    return json.dumps(result, ensure_ascii=False)
+
+
+# === TRÍCH XUẤT TĂNG DẦN THEO SECTION ===
+# Tài liệu yêu cầu được tải lên lại qua nhiều phiên bản: kết quả use case lưu theo hash nội dung từng
+# section (process_docx.py --sections), lần sau chỉ các section mới / đã sửa phải gọi LLM, phần còn lại
+# lấy từ kho rồi gộp lại. Tăng SECTION_PROMPT_VERSION khi đổi prompt để bỏ kết quả cũ.
+SECTION_PROMPT_VERSION = 1
+SECTION_MIN_CHARS = env_int("INSIGHT_SECTION_MIN_CHARS", 300)
+section_store = ResultCache("insight_sections", {"model": LLM_MODEL_NAME, "prompt": SECTION_PROMPT_VERSION})
+
+
+def section_units(sections, max_chars=CHUNK_CHARS, min_chars=SECTION_MIN_CHARS):
+    """Section → các đơn vị trích xuất. Section ngắn hơn min_chars (vd. chỉ có tiêu đề) được ghép vào
+    section kế tiếp, section dài hơn max_chars chia bằng chunk_text; cả hai chỉ phụ thuộc nội dung
+    chính section đó nên sửa một section không làm đổi các đơn vị ở xa."""
+    units, pending = [], []
+    for section in sections:
+        text = (section.get("text") or "").strip()
+        if not text:
+            continue
+        pending.append(text)
+        if len(text) < min_chars:
+            continue
+        units.extend(chunk_text("\n".join(pending), max_chars))
+        pending = []
+    if pending:
+        units.extend(chunk_text("\n".join(pending), max_chars))
+    return units
+
+
+def parse_sections(payload):
+    """JSON [{"title", "text"}, ...] của process_docx.py --sections; sai định dạng → ValueError."""
+    try:
+        sections = json.loads(payload)
+    except ValueError as e:
+        raise ValueError(f"Section JSON không hợp lệ: {e}") from e
+    if not isinstance(sections, list) or not all(
+        isinstance(section, dict) and isinstance(section.get("text"), str)
+        and isinstance(section.get("title", ""), str)
+        for section in sections
+    ):
+        raise ValueError('Section phải là danh sách [{"title": ..., "text": ...}]')
+    return sections
+
+
+def extract_sections(sections, mode, language='vn'):
+    with stage("chunk"):
+        units = section_units(sections)
+    prompt = suggestion_prompt if mode == "all" else metadata_prompt
+    site = "insight.extract_with_suggestion" if mode == "all" else "insight.extract_metadata"
+    variant = {"mode": mode, "language": language}
+    hashes = [hash_bytes(unit.encode("utf-8")) for unit in units]
+
+    with stage("section_store"):
+        partials = [section_store.get(None, h, variant=variant) for h in hashes]
+    missing = [i for i, partial in enumerate(partials) if partial is None]
+    print(f"[INSIGHT] {len(sections)} section → {len(units)} đơn vị, {len(units) - len(missing)} dùng lại",
+          file=sys.stderr)
+
+    errors = []
+    if missing:
+        with stage("llm_extract"):
+            outputs = llm.generate_many([prompt(units[i], language) for i in missing], site=site)
+        for index, output in zip(missing, outputs):
+            try:
+                if isinstance(output, Exception):
+                    raise output
+                partials[index] = parse_llm_json(output)
+                if not isinstance(partials[index], dict):
+                    raise ValueError("Kết quả LLM không phải object JSON")
+                section_store.put(None, partials[index], hashes[index], variant=variant)
+            except Exception as e:
+                partials[index] = None
+                errors.append({"section": index, "error": str(e)})
+
+    return finish([p for p in partials if p is not None], errors, mode,
+                  sections=len(units), sections_reused=len(units) - len(missing))
+
+
+def read_input_text(text_arg, from_stdin=False, file_path=None):
+    if from_stdin:
+        return sys.stdin.buffer.read().decode("utf-8", errors="replace")
+    if file_path:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return f.read()
+    return " ".join(text_arg)
+
+
+def attach_timings(result, timings):
+    """Kết quả là chuỗi JSON: thêm khối timings nếu là object, nếu không thì chỉ ghi ra stderr."""
+    try:
+        parsed = parse_llm_json(result)
+    except ValueError:
+        parsed = None
+    if not isinstance(parsed, dict):
+        print(f"[TIMINGS] insight {json.dumps(timings.as_dict())}", file=sys.stderr)
+        return result
+    parsed["timings"] = timings.as_dict()
+    return json.dumps(record_serialize(parsed, ensure_ascii=False), ensure_ascii=False)
+
+
+def run(argv):
+    argv, timings, profile_kind = pop_flags(argv)
+    t = Timings() if timings else None
+    with use(t), profile(profile_kind, "insight"):
+        result = _run(argv)
+    if t is not None:
+        result = attach_timings(result, t)
+    return result
+
+
+def _run(argv):
     mode = "default"
     language = "vn"
     text_arg = []
-
-    for arg in sys.argv[1:]:
+    from_stdin = False
+    file_path = None
+    sections = False
+
+    for index, arg in enumerate(argv):
+        if arg == "--":
+            # Sau "--" chỉ còn văn bản, kể cả khi bắt đầu bằng "-"
+            text_arg.extend(argv[index + 1:])
+            break
         if arg.startswith("--mode="):
             mode = arg.split("=", 1)[1].strip()
         elif arg.startswith("--lang="):
             language = arg.split("=", 1)[1].strip()
+        elif arg == "--stdin":
+            from_stdin = True
+        elif arg == "--sections":
+            sections = True
+        elif arg.startswith("--file="):
+            file_path = arg.split("=", 1)[1]
         else:
             text_arg.append(arg)
 
-    full_text = " ".join(text_arg).strip()
-
-    if mode == "all":
+    if from_stdin:
+        try:
+            check_stdin("--stdin")
+        except ValueError as e:
+            return json.dumps({"error": str(e)}, ensure_ascii=False)
+
+    with stage("load"):
+        full_text = read_input_text(text_arg, from_stdin, file_path).strip()
+
+    if sections:
+        # Đầu vào là JSON [{"title", "text"}, ...] của process_docx.py --sections
+        try:
+            parsed = parse_sections(full_text)
+        except ValueError as e:
+            return json.dumps({"error": str(e)}, ensure_ascii=False)
+        result = extract_sections(parsed, mode, language)
+    elif len(full_text) > CHUNK_CHARS:
+        result = extract_long(full_text, mode, language)
+    elif mode == "all":
         result = extract_with_suggestion(full_text, language)
     else:
         result = extract_metadata(full_text, language)
+    llm_cache.log_stats()
+    return result
+
+
+if __name__ == "__main__":
+    if "--serve" in sys.argv[1:]:
+        serve(run, max_concurrency=env_int("INSIGHT_WORKER_CONCURRENCY", 4))
+        sys.exit(0)
+
+    if len(sys.argv) < 2:
+        print("Usage: python process_metadata.py [--mode=all] [--lang=en] [--sections] ([--] <text> | --stdin | --file=<path>)", file=sys.stderr)
+        sys.exit(1)
 
-    print(result)
+    print(run(sys.argv[1:]))
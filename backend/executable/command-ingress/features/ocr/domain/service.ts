@@ -1,29 +1,26 @@
 // features/ocr/domain/service.ts
 import { UploadedFile } from 'express-fileupload';
 import path from 'path';
-import fs from 'fs/promises';
-import fsExtra from 'fs-extra';
 import { spawn } from 'child_process';
 
 import { InsightService } from '../../insight/domain/service';
+import { getPythonWorkerPool, isPythonWorkerMode } from '../../../shared/python-worker';
+import { FrameFile, writeFrames } from '../../../shared/frames';
+import { streamPython } from '../../../shared/python-stream';
+import { getScheduler, JobPriority } from '../../../shared/scheduler';
+import { ocrCost } from '../../../shared/job-cost';
+
+const scriptPath = path.join(__dirname, '../pythonScript/process_OCR.py');
 
 
 export class OcrService {
     private insightService = new InsightService();
 
     async handleImages(images: UploadedFile[], llmKey?: string, llmEndpoint?: string): Promise<any> {
-        const uploadDir = path.join(__dirname, '../../../uploads_ocr');
-        await fs.mkdir(uploadDir, { recursive: true });
-
-        const savedPaths: string[] = [];
-
-        for (const img of images) {
-            const savePath = path.join(uploadDir, img.name);
-            await img.mv(savePath);
-            savedPaths.push(savePath);
-        }
+        // Ảnh được gửi thẳng từ bộ nhớ sang Python, không ghi ra thư mục tạm dùng chung
+        const files: FrameFile[] = images.map((img) => ({ name: img.name, data: img.data }));
 
-        const result = await this.runOCR(savedPaths, llmKey, llmEndpoint);
+        const result = await this.runOCR(files, llmKey, llmEndpoint);
 
         // 🧠 Nếu có text OCR thành công → gọi Insight để trích use_cases
         if (result && result.text && typeof result.text === 'string' && result.text.length > 5) {
@@ -36,25 +33,42 @@ export class OcrService {
             }
         }
 
-        // 🧹 Dọn thư mục tạm
-        try {
-            await fsExtra.emptyDir(uploadDir);
-        } catch (e) {
-            console.warn('⚠️ Không thể dọn thư mục uploads_ocr:', e);
-        }
-
         return result;
     }
 
-    async runOCR(imagePaths: string[], llmKey?: string, llmEndpoint?: string): Promise<any> {
-        const scriptPath = path.join(__dirname, '../pythonScript/process_OCR.py');
-        const args = [scriptPath, ...imagePaths];
-        if (llmKey && llmEndpoint) {
-            args.push('--llm_key', llmKey, '--llm_endpoint', llmEndpoint);
+    /**
+     * Như runOCR nhưng `onFile` được gọi ngay khi từng ảnh OCR xong (theo thứ tự xong),
+     * kết quả cuối vẫn theo thứ tự ảnh đầu vào.
+     */
+    streamOCR(
+        files: FrameFile[],
+        onFile: (entry: any, index: number) => void,
+        llmKey?: string,
+        llmEndpoint?: string,
+        priority: JobPriority = 'interactive',
+    ): Promise<any[]> {
+        return getScheduler().run('ocr', ocrCost(files), priority, () =>
+            streamPython(scriptPath, this.llmArgs(llmKey, llmEndpoint), files, { onFile }));
+    }
+
+    private llmArgs(llmKey?: string, llmEndpoint?: string): string[] {
+        return llmKey && llmEndpoint ? ['--llm_key', llmKey, '--llm_endpoint', llmEndpoint] : [];
+    }
+
+    async runOCR(files: FrameFile[], llmKey?: string, llmEndpoint?: string, priority: JobPriority = 'interactive'): Promise<any> {
+        return getScheduler().run('ocr', ocrCost(files), priority, () => this.execOCR(files, llmKey, llmEndpoint));
+    }
+
+    private execOCR(files: FrameFile[], llmKey?: string, llmEndpoint?: string): Promise<any> {
+        const args = this.llmArgs(llmKey, llmEndpoint);
+
+        if (isPythonWorkerMode()) {
+            return getPythonWorkerPool(scriptPath).run(args, files);
         }
 
         return new Promise((resolve, reject) => {
-            const python = spawn('python', args);
+            const python = spawn('python', [scriptPath, '--stdin-frames', ...args]);
+            writeFrames(python, files);
 
             let result = '';
             let error = '';
@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+"""
+Hậu xử lý OCR tại chỗ bằng từ điển tần suất (kiểu SymSpell, symmetric delete), dùng cho các dòng
+Tesseract đọc đủ chắc để không phải gửi LLM. Với mỗi từ không có trong từ điển, lần lượt thử:
+  1. lỗi nhầm ký tự hay gặp của OCR (rn ↔ m, cl → d, 0 → o, 1 → l ...), kèm khôi phục dấu như bước 2
+  2. khôi phục dấu: từ không dấu ("nguoi") → từ có dấu phổ biến nhất cùng khung không dấu,
+     chỉ khi từ đó áp đảo các từ còn lại (tránh đoán bừa "ban" → bạn / bán / bàn)
+  3. từ gần nhất trong khoảng cách chỉnh sửa ≤ OCR_DICT_MAX_DISTANCE, tra qua chỉ mục các biến thể
+     "xóa bớt ký tự" của tiền tố mỗi từ nên chỉ tốn vài phép tra dict cho một từ
+Chữ hoa / thường và dấu câu hai đầu từ được giữ nguyên.
+
+Từ điển: file văn bản mỗi dòng "từ tần_suất" (định dạng từ điển SymSpell; thiếu tần suất = 1),
+ví dụ danh sách âm tiết tiếng Việt và frequency_dictionary_en_82_765.txt. Chỉ mục dựng lần đầu
+rồi lưu vào <command-ingress>/.cache/ocr_dict, khóa theo nội dung từ điển.
+
+Biến môi trường:
+  OCR_DICT_PATHS          các file từ điển, cách nhau dấu phẩy (mặc định mọi *.txt trong ./dictionaries)
+  OCR_DICT_MAX_DISTANCE   khoảng cách chỉnh sửa tối đa (mặc định 1; 2 chính xác hơn nhưng chỉ mục lớn gấp vài lần)
+"""
+import os
+import re
+import glob
+import pickle
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import defaultdict
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+DICT_DIR = os.path.join(BASE_DIR, "dictionaries")
+INDEX_DIR = os.path.abspath(os.path.join(BASE_DIR, '..', '..', '..', '.cache', 'ocr_dict'))
+INDEX_VERSION = 1
+
+MAX_DISTANCE = int(os.getenv("OCR_DICT_MAX_DISTANCE", "1"))
+PREFIX_LENGTH = 7
+# Từ ngắn hơn thì không sửa theo khoảng cách chỉnh sửa (quá nhiều từ hợp lệ ở gần nhau)
+MIN_FUZZY_LENGTH = 4
+# Khôi phục dấu khi từ phổ biến nhất gặp nhiều gấp ít nhất chừng này lần từ đứng sau
+DIACRITIC_DOMINANCE = 3.0
+# (chuỗi Tesseract hay đọc nhầm, chuỗi đúng)
+CONFUSIONS = [("rn", "m"), ("m", "rn"), ("cl", "d"), ("vv", "w"), ("ri", "n"),
+              ("0", "o"), ("1", "l"), ("1", "i"), ("5", "s"), ("8", "B"), ("|", "l")]
+
+TOKEN_RE = re.compile(r"^(\W*)(.*?)(\W*)$", re.DOTALL)
+
+
+def dictionary_paths():
+    paths = [p.strip() for p in os.getenv("OCR_DICT_PATHS", "").split(",") if p.strip()]
+    return paths or sorted(glob.glob(os.path.join(DICT_DIR, "*.txt")))
+
+
+def strip_diacritics(word):
+    decomposed = unicodedata.normalize("NFD", word.replace("đ", "d").replace("Đ", "D"))
+    return "".join(ch for ch in decomposed if unicodedata.category(ch) != "Mn")
+
+
+def deletes(word, distance):
+    """Mọi chuỗi thu được khi xóa tối đa `distance` ký tự của `word` (kể cả chính nó)."""
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier if len(w) > 1 for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def edit_distance(a, b, limit):
+    """Khoảng cách Damerau-Levenshtein (optimal string alignment), > limit thì trả limit + 1."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous2 = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def match_case(template, word):
+    if len(template) > 1 and template.isupper():
+        return word.upper()
+    if template[:1].isupper():
+        return word[:1].upper() + word[1:]
+    return word
+
+
+class Corrector:
+    def __init__(self, paths=None, max_distance=MAX_DISTANCE):
+        self.paths = [p for p in (paths if paths is not None else dictionary_paths()) if os.path.isfile(p)]
+        self.max_distance = max_distance
+        self.words = None        # từ (chữ thường, NFC) → tần suất
+        self.skeletons = None    # khung không dấu → [(từ, tần suất)] giảm dần
+        self.index = None        # biến thể xóa ký tự của tiền tố → [từ]
+        self._signature = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return bool(self.paths)
+
+    def signature(self):
+        """Dấu vân tay nội dung từ điển + tham số, dùng làm khóa cache (của chỉ mục và kết quả OCR)."""
+        if self._signature is None:
+            h = hashlib.sha256(f"{INDEX_VERSION}:{self.max_distance}:{PREFIX_LENGTH}".encode())
+            for path in self.paths:
+                with open(path, "rb") as f:
+                    h.update(f.read())
+            self._signature = h.hexdigest()
+        return self._signature
+
+    def params(self):
+        return {"dictionary": self.signature() if self.available else None, "distance": self.max_distance}
+
+    def _read_words(self):
+        words = defaultdict(int)
+        for path in self.paths:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                for line in f:
+                    fields = line.split()
+                    if not fields:
+                        continue
+                    word = unicodedata.normalize("NFC", fields[0]).lower()
+                    count = int(fields[1]) if len(fields) > 1 and fields[1].isdigit() else 1
+                    words[word] += count
+        return dict(words)
+
+    def _build(self):
+        words = self._read_words()
+        skeletons = defaultdict(list)
+        index = defaultdict(list)
+        for word, count in words.items():
+            skeletons[strip_diacritics(word)].append((word, count))
+            for variant in deletes(word[:PREFIX_LENGTH], self.max_distance):
+                index[variant].append(word)
+        for candidates in skeletons.values():
+            candidates.sort(key=lambda item: -item[1])
+        return words, dict(skeletons), dict(index)
+
+    def load(self):
+        """Nạp chỉ mục (dựng và lưu lại nếu chưa có); an toàn khi nhiều luồng gọi cùng lúc."""
+        if self.words is not None:
+            return
+        with self._lock:
+            if self.words is not None:
+                return
+            path = os.path.join(INDEX_DIR, self.signature() + ".pickle")
+            try:
+                with open(path, "rb") as f:
+                    words, skeletons, index = pickle.load(f)
+            except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+                words, skeletons, index = self._build()
+                try:
+                    os.makedirs(INDEX_DIR, exist_ok=True)
+                    tmp = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp, "wb") as f:
+                        pickle.dump((words, skeletons, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+                    os.replace(tmp, path)
+                except OSError as e:
+                    logging.warning(f"Không lưu được chỉ mục từ điển OCR: {e}")
+                logging.info(f"Đã dựng chỉ mục từ điển OCR: {len(words)} từ, {len(index)} biến thể")
+            self.skeletons, self.index = skeletons, index
+            self.words = words
+
+    def lookup(self, word):
+        """Từ trong từ điển gần `word` nhất (khoảng cách nhỏ nhất, rồi tần suất cao nhất), None nếu không có."""
+        best, best_key = None, None
+        checked = set()
+        for variant in deletes(word[:PREFIX_LENGTH], self.max_distance):
+            for candidate in self.index.get(variant, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                distance = edit_distance(word, candidate, self.max_distance)
+                if distance > self.max_distance:
+                    continue
+                key = (distance, -self.words[candidate])
+                if best_key is None or key < best_key:
+                    best, best_key = candidate, key
+        return best
+
+    def _confusion_fix(self, word):
+        best = None
+        for wrong, right in CONFUSIONS:
+            start = word.find(wrong)
+            while start >= 0:
+                candidate = word[:start] + right.lower() + word[start + len(wrong):]
+                if candidate not in self.words:
+                    candidate = self._restore_diacritics(candidate)
+                if candidate is not None and (best is None or self.words[candidate] > self.words[best]):
+                    best = candidate
+                start = word.find(wrong, start + 1)
+        return best
+
+    def _restore_diacritics(self, word):
+        if strip_diacritics(word) != word:
+            return None
+        candidates = self.skeletons.get(word)
+        if not candidates:
+            return None
+        if len(candidates) > 1 and candidates[0][1] < DIACRITIC_DOMINANCE * candidates[1][1]:
+            return None
+        return candidates[0][0]
+
+    def correct_word(self, token):
+        """Sửa một từ (có thể kèm dấu câu) theo từ điển; từ đã đúng hoặc không chắc thì giữ nguyên."""
+        self.load()
+        lead, core, trail = TOKEN_RE.match(unicodedata.normalize("NFC", token)).groups()
+        word = core.lower()
+        if len(word) < 2 or word in self.words or word.isdigit():
+            return token
+        fixed = self._confusion_fix(word) or self._restore_diacritics(word)
+        if fixed is None and len(word) >= MIN_FUZZY_LENGTH and not any(ch.isdigit() for ch in word):
+            fixed = self.lookup(word)
+        if fixed is None:
+            return token
+        return lead + match_case(core, fixed) + trail
+
+    def correct_line(self, words):
+        return " ".join(self.correct_word(word) for word in words)
+
+
+_corrector = None
+_corrector_lock = threading.Lock()
+
+
+def get_corrector():
+    """Corrector dùng chung trong process; None khi chưa cấu hình từ điển."""
+    global _corrector
+    with _corrector_lock:
+        if _corrector is None:
+            _corrector = Corrector()
+            if not _corrector.available:
+                logging.info("Chưa có từ điển OCR (OCR_DICT_PATHS / dictionaries/*.txt): dòng đủ chắc giữ nguyên, "
+                             "LLM chỉ sửa các dòng kém")
+    return _corrector if _corrector.available else None
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Tiền xử lý ảnh cho OCR theo vùng:
+  1. đọc ảnh xám, ước lượng góc nghiêng và chiều cao ký tự trên bản thu nhỏ
+  2. xoay thẳng (deskew)
+  3. tìm các vùng có chữ, bỏ qua phần nền trống (bảng trắng, lề giấy), sắp theo thứ tự đọc (XY-cut:
+     tách cột trước, trong cột đọc từ trên xuống)
+  4. vùng quá lớn được chia tile theo cả hai chiều ngay trên tọa độ ảnh gốc (ranh giới chọn ở chỗ ít mực),
+     rồi từng tile mới được phóng/thu theo chiều cao ký tự và nhị phân hóa
+Ảnh scale / nhị phân hóa chỉ tồn tại ở cỡ một tile nên bộ nhớ đỉnh mỗi lần gọi Tesseract bị chặn theo
+TILE_MAX_SIDE, kể cả khi cả trang gộp thành một vùng.
+"""
+import cv2
+import numpy as np
+
+ANALYSIS_MAX_SIDE = 1500     # cạnh lớn nhất của ảnh dùng để phân tích
+TARGET_GLYPH_HEIGHT = 32     # chiều cao ký tự (px) mà Tesseract đọc tốt nhất
+MIN_SCALE, MAX_SCALE = 0.5, 3.0
+TILE_MAX_SIDE = 2500         # cạnh tối đa của một tile sau khi scale
+REGION_PADDING = 8
+MAX_REGIONS = 16             # quá nhiều vùng nhỏ → gộp thành một vùng bao (rồi chia tile) để tránh gọi Tesseract quá nhiều lần
+
+
+def _downscale(gray):
+    h, w = gray.shape
+    factor = min(1.0, ANALYSIS_MAX_SIDE / max(h, w))
+    if factor < 1.0:
+        gray = cv2.resize(gray, None, fx=factor, fy=factor, interpolation=cv2.INTER_AREA)
+    return gray, factor
+
+
+def _foreground(gray):
+    """Nhị phân hóa Otsu, chữ = 255. Tự đảo nếu nền tối (bảng đen)."""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    if np.count_nonzero(binary) < binary.size / 2:
+        return binary
+    return cv2.bitwise_not(binary)
+
+
+def estimate_glyph_height(binary):
+    """Trung vị chiều cao các thành phần liên thông trông giống ký tự, None nếu không có."""
+    n, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    if n <= 1:
+        return None
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    mask = (heights >= 4) & (heights <= binary.shape[0] / 4) & (areas >= 8) & (widths <= heights * 5)
+    if np.count_nonzero(mask) < 5:
+        return None
+    return float(np.median(heights[mask]))
+
+
+def estimate_skew(binary):
+    """Góc nghiêng (độ) của khối chữ theo minAreaRect, giới hạn trong ±15°."""
+    coords = cv2.findNonZero(binary)
+    if coords is None or len(coords) < 100:
+        return 0.0
+    angle = cv2.minAreaRect(coords)[-1]
+    # OpenCV >= 4.5 trả góc trong (0, 90]
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    return float(angle) if abs(angle) <= 15 else 0.0
+
+
+def deskew(gray, angle):
+    if abs(angle) < 0.3:
+        return gray
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+
+def choose_scale(glyph_height, shape):
+    if not glyph_height:
+        # Không ước lượng được → giữ hành vi cũ: ảnh nhỏ phóng 2 lần
+        return 2.0 if min(shape) < 1000 else 1.0
+    return float(np.clip(TARGET_GLYPH_HEIGHT / glyph_height, MIN_SCALE, MAX_SCALE))
+
+
+def find_text_regions(binary, glyph_height):
+    """Gộp ký tự thành khối chữ bằng phép đóng hình thái học, trả về bbox theo thứ tự đọc."""
+    g = max(2, int(glyph_height or 10))
+    # Kernel cao ~1.5 lần ký tự để các dòng cùng đoạn dính lại thành một khối
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (g * 3, max(1, int(g * 1.5))))
+    merged = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
+    merged = cv2.dilate(merged, cv2.getStructuringElement(cv2.MORPH_RECT, (g, g)))
+    contours, _ = cv2.findContours(merged, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    boxes = []
+    for c in contours:
+        x, y, w, h = cv2.boundingRect(c)
+        if h < g * 0.6 or w < g:
+            continue
+        boxes.append((x, y, w, h))
+
+    if len(boxes) > MAX_REGIONS:
+        x0 = min(b[0] for b in boxes)
+        y0 = min(b[1] for b in boxes)
+        x1 = max(b[0] + b[2] for b in boxes)
+        y1 = max(b[1] + b[3] for b in boxes)
+        return [(x0, y0, x1 - x0, y1 - y0)]
+
+    return reading_order(boxes, g)
+
+
+def _split_by_gap(boxes, axis, min_gap):
+    """Chia bbox thành các nhóm cách nhau một khoảng trống ≥ min_gap theo trục (0 = x, 1 = y)."""
+    groups = []
+    end = None
+    for box in sorted(boxes, key=lambda b: b[axis]):
+        start = box[axis]
+        if groups and start - end >= min_gap:
+            groups.append([box])
+        elif groups:
+            groups[-1].append(box)
+        else:
+            groups.append([box])
+        stop = box[axis] + box[axis + 2]
+        end = stop if end is None else max(end, stop)
+    return groups
+
+
+def reading_order(boxes, g):
+    """XY-cut: tách cột (khe dọc ≥ 2 ký tự) trước và đọc hết từng cột từ trái sang phải, trong cột tách
+    theo khe ngang từ trên xuống. Tiêu đề trải ngang nhiều cột chặn khe dọc nên phần trên / dưới nó
+    được tách thành các dải riêng rồi mới tách cột.
+    Hạn chế: biểu mẫu kiểu "nhãn ... giá trị" có khe dọc rộng sẽ bị đọc hết cột nhãn rồi mới tới cột giá trị."""
+    if len(boxes) <= 1:
+        return list(boxes)
+    columns = _split_by_gap(boxes, 0, g * 2)
+    if len(columns) > 1:
+        return [b for column in columns for b in reading_order(column, g)]
+    rows = _split_by_gap(boxes, 1, 1)
+    if len(rows) > 1:
+        # Các hàng liền nhau cùng có khe dọc gộp thành một dải để tách cột lại trên cả dải;
+        # hàng một cột (tiêu đề trải ngang) ngắt dải
+        bands = []
+        for row in rows:
+            multi = len(_split_by_gap(row, 0, g * 2)) > 1
+            if bands and multi and bands[-1][0]:
+                bands[-1][1].extend(row)
+            else:
+                bands.append((multi, list(row)))
+        if len(bands) == 1:
+            # Cột các hàng không thẳng nhau: đọc từng hàng
+            return [b for row in rows for b in reading_order(row, g)]
+        return [b for _, band in bands for b in reading_order(band, g)]
+    # Các bbox chồng nhau theo cả hai trục: theo hàng, trong hàng từ trái sang phải
+    return sorted(boxes, key=lambda b: (b[1] // (g * 2), b[0]))
+
+
+def split_axis(ink, max_len):
+    """[(đầu, cuối)] cắt dãy lượng mực theo hàng / cột thành các đoạn ≤ max_len, tại chỗ ít mực nhất
+    ở nửa sau mỗi đoạn để không cắt ngang dòng chữ / từ."""
+    n = len(ink)
+    max_len = max(2, int(max_len))
+    if n <= max_len:
+        return [(0, n)]
+    spans = []
+    start = 0
+    while n - start > max_len:
+        window_start = start + max_len // 2
+        cut = window_start + int(np.argmin(ink[window_start:start + max_len]))
+        spans.append((start, cut))
+        start = cut
+    spans.append((start, n))
+    return spans
+
+
+def split_tiles(ink_crop, max_side):
+    """Các tile (x0, y0, x1, y1) có cạnh ≤ max_side của một vùng (tọa độ trong `ink_crop`, ảnh chữ = 255):
+    cắt thành dải theo hàng, rồi mỗi dải quá rộng cắt tiếp theo cột."""
+    tiles = []
+    for r0, r1 in split_axis(np.count_nonzero(ink_crop, axis=1), max_side):
+        for c0, c1 in split_axis(np.count_nonzero(ink_crop[r0:r1], axis=0), max_side):
+            tiles.append((c0, r0, c1, r1))
+    return tiles
+
+
+def iter_regions(gray, binarize):
+    """Sinh các ảnh đã nhị phân hóa (sẵn sàng cho Tesseract) theo thứ tự đọc.
+
+    `binarize` là hàm nhị phân hóa cuối cùng (giữ nguyên cách của UltimateOCR.preprocess).
+    """
+    small, factor = _downscale(gray)
+    small_fg = _foreground(small)
+
+    angle = estimate_skew(small_fg)
+    if abs(angle) >= 0.3:
+        gray = deskew(gray, angle)
+        small, factor = _downscale(gray)
+        small_fg = _foreground(small)
+
+    glyph_small = estimate_glyph_height(small_fg)
+    regions = find_text_regions(small_fg, glyph_small)
+    if not regions:
+        return
+
+    glyph_full = glyph_small / factor if glyph_small else None
+    scale = choose_scale(glyph_full, gray.shape)
+    H, W = gray.shape
+    # Cạnh tile trên ảnh thu nhỏ sao cho sau khi scale ảnh gốc không vượt TILE_MAX_SIDE (trừ phần đệm)
+    max_small = (TILE_MAX_SIDE - 2 * REGION_PADDING * scale) / scale * factor
+
+    for x, y, w, h in regions:
+        for tx0, ty0, tx1, ty1 in split_tiles(small_fg[y:y + h, x:x + w], max_small):
+            x0 = max(0, int((x + tx0) / factor) - REGION_PADDING)
+            y0 = max(0, int((y + ty0) / factor) - REGION_PADDING)
+            x1 = min(W, int((x + tx1) / factor) + REGION_PADDING)
+            y1 = min(H, int((y + ty1) / factor) + REGION_PADDING)
+            tile = gray[y0:y1, x0:x1]
+            if scale != 1.0:
+                interp = cv2.INTER_CUBIC if scale > 1 else cv2.INTER_AREA
+                tile = cv2.resize(tile, None, fx=scale, fy=scale, interpolation=interp)
+            yield binarize(tile)
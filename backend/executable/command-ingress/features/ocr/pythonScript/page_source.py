@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Đọc tài liệu nhiều trang (PDF, TIFF) theo kiểu lazy: mỗi lần chỉ giải mã / rasterize một trang.
+PDF được rasterize bằng poppler (pdfinfo + pdftoppm), đường dẫn lấy từ POPPLER_PATH nếu có.
+cv2 / numpy / PIL chỉ được import khi đọc trang, để is_multipage dùng được mà không tốn chi phí import.
+"""
+import io
+import os
+import re
+import shutil
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+MULTIPAGE_FORMATS = ('.pdf', '.tif', '.tiff')
+PDF_DPI = int(os.getenv("OCR_PDF_DPI", "300"))
+
+
+def is_multipage(path):
+    return os.path.splitext(path)[1].lower() in MULTIPAGE_FORMATS
+
+
+def _poppler_cmd(name):
+    custom = os.getenv("POPPLER_PATH")
+    if custom:
+        candidate = os.path.join(custom, name)
+        if os.path.exists(candidate) or os.path.exists(candidate + ".exe"):
+            return candidate
+    found = shutil.which(name)
+    if not found:
+        raise FileNotFoundError(f"Không tìm thấy {name} (poppler) để đọc PDF")
+    return found
+
+
+def pdf_page_count(path):
+    out = subprocess.run([_poppler_cmd("pdfinfo"), path], capture_output=True, check=True).stdout
+    match = re.search(rb"^Pages:\s+(\d+)", out, re.MULTILINE)
+    if not match:
+        raise ValueError(f"Không đọc được số trang PDF: {os.path.basename(path)}")
+    return int(match.group(1))
+
+
+def rasterize_pdf_page(path, page, dpi=PDF_DPI):
+    """Rasterize một trang PDF (đánh số từ 1) thành ảnh xám, không ghi file tạm."""
+    import cv2
+    import numpy as np
+
+    cmd = [_poppler_cmd("pdftoppm"), "-f", str(page), "-l", str(page), "-r", str(dpi), "-gray", path]
+    data = subprocess.run(cmd, capture_output=True, check=True).stdout
+    gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if gray is None:
+        raise ValueError(f"Không rasterize được trang {page}")
+    return gray
+
+
+@contextmanager
+def _pdf_file(path, data):
+    """poppler cần đọc ngẫu nhiên file PDF: nội dung nhận qua stdin được ghi ra một file tạm
+    riêng của process (không dùng thư mục upload chung) và xóa ngay khi đọc xong."""
+    if data is None:
+        yield path
+        return
+    fd, tmp = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        yield tmp
+    finally:
+        os.remove(tmp)
+
+
+def iter_pages(path, data=None):
+    """Sinh (số_trang, ảnh_xám) lần lượt từng trang. `data`: nội dung file thay cho đọc từ `path`."""
+    import numpy as np
+    from PIL import Image, ImageSequence
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.pdf':
+        with _pdf_file(path, data) as pdf:
+            for page in range(1, pdf_page_count(pdf) + 1):
+                yield page, rasterize_pdf_page(pdf, page)
+        return
+
+    with Image.open(io.BytesIO(data) if data is not None else path) as tiff:
+        for index, frame in enumerate(ImageSequence.Iterator(tiff), start=1):
+            yield index, np.array(frame.convert('L'))
@@ -8,53 +8,170 @@ Công nghệ: Tesseract OCR + OpenCV + PIL + Deskew + Gemini + Weighted Confiden
 import os
 import sys
 import io
-import cv2
-import numpy as np
-from PIL import Image
-import pytesseract
 import logging
 from datetime import datetime
-import requests
 import argparse
 import json
+import re
+import time
+import queue
+import atexit
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 
 # Load .env
 load_dotenv()
 
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', '..', '..', 'shared', 'pythonScript'))
+from worker import serve, env_int, check_stdin
+from result_cache import ResultCache, hash_file
+from llm_cache import get_llm_cache
+from llm_client import GeminiClient
+from lazy_import import lazy_import
+from frames import read_frames, hash_bytes
+from timing import Timings, use, stage, timed_iter, bind, pop_flags, profile, record_serialize
+from ndjson import stdout_emitter, file_record, summary_record
+import confidence
+from page_source import is_multipage, iter_pages
+import tesseract_api
+
+# Thư viện nặng chỉ được nạp khi thật sự OCR (sai tham số / trúng cache không phải chờ import)
+cv2 = lazy_import("cv2")
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+pytesseract = lazy_import("pytesseract")
+ocr_preprocess = lazy_import("ocr_preprocess")
+ocr_correct = lazy_import("ocr_correct")
+
 # Unicode stdout
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
 
+# Tăng khi thay đổi tiền xử lý / cấu hình Tesseract để cache cũ tự hết hiệu lực
+PREPROCESS_VERSION = 5
+OCR_CONFIGS = [("--psm 6 --oem 1", "vie+eng"), ("--psm 3", "eng")]
+# Cấu hình đầu tiên đạt ngưỡng này thì không chạy các cấu hình còn lại
+EARLY_STOP_CONF = float(os.getenv("OCR_EARLY_STOP_CONF", "85"))
+# Tài liệu nhiều trang: số trang OCR song song và số trang đã rasterize được phép chờ
+PAGE_WORKERS = env_int("OCR_PAGE_WORKERS", 2)
+PAGE_QUEUE_SIZE = env_int("OCR_PAGE_QUEUE_SIZE", 2)
+# Độ tin cậy tính tại chỗ (confidence.py); =1 để hỏi thêm LLM chấm điểm và lấy trung bình như cũ
+LLM_CONFIDENCE = os.getenv("OCR_LLM_CONFIDENCE", "0").lower() in ("1", "true", "yes")
+# Sửa lỗi tại chỗ bằng từ điển (ocr_correct.py); chỉ dòng có conf dưới OCR_REFINE_LINE_CONF mới gửi LLM,
+# và khi các dòng đó chiếm từ OCR_REFINE_PAGE_RATIO số ký tự trở lên thì gửi cả trang như trước
+# (OCR_REFINE_LINE_CONF=101 để luôn gửi cả trang). Chưa có từ điển thì dòng đủ chắc giữ nguyên bản Tesseract,
+# LLM vẫn chỉ nhận các dòng kém.
+LOCAL_CORRECT = os.getenv("OCR_LOCAL_CORRECT", "1").lower() in ("1", "true", "yes")
+REFINE_LINE_CONF = float(os.getenv("OCR_REFINE_LINE_CONF", "80"))
+REFINE_PAGE_RATIO = float(os.getenv("OCR_REFINE_PAGE_RATIO", "0.5"))
+# Tăng khi đổi cách chọn phần gửi LLM để bỏ kết quả cache cũ
+REFINE_VERSION = 2
+FRAGMENT_RE = re.compile(r"^###\s*(\d+)\s*$", re.MULTILINE)
+
+
+def word_stats(data, min_word_conf=20):
+    """(conf, độ dài) của các từ được giữ (bỏ từ rỗng / conf < min_word_conf)."""
+    conf = np.asarray([float(c) for c in data['conf']], dtype=np.float32)
+    lengths = np.fromiter((len(w.strip()) for w in data['text']), dtype=np.float32, count=len(data['text']))
+    mask = (conf >= min_word_conf) & (lengths > 0)
+    return conf[mask], lengths[mask]
+
+
+def weighted_confidence(data, min_word_conf=20):
+    """Độ tin cậy trung bình có trọng số theo độ dài từ (bỏ từ rỗng / conf < min_word_conf)."""
+    conf, lengths = word_stats(data, min_word_conf)
+    total_weight = lengths.sum()
+    return float((conf * lengths).sum() / total_weight) if total_weight > 0 else 0.0
+
+
+def layout_lines(data):
+    """Cấu trúc văn bản từ kết quả image_to_data: [đoạn (block/paragraph)] → [dòng] → [(từ, conf)]."""
+    paragraphs = []
+    lines = []
+    words = []
+    current_par = current_line = None
+
+    for i, word in enumerate(data['text']):
+        if data['level'][i] != 5 or not word.strip():
+            continue
+        par_key = (data['block_num'][i], data['par_num'][i])
+        line_key = par_key + (data['line_num'][i],)
+        if line_key != current_line:
+            if words:
+                lines.append(words)
+                words = []
+            if par_key != current_par and lines:
+                paragraphs.append(lines)
+                lines = []
+            current_par, current_line = par_key, line_key
+        words.append((word.strip(), float(data['conf'][i])))
+
+    if words:
+        lines.append(words)
+    if lines:
+        paragraphs.append(lines)
+    return paragraphs
+
+
+def render_paragraphs(paragraphs):
+    """Từ trong một dòng cách nhau bởi dấu cách, các dòng xuống hàng, các đoạn cách nhau một dòng trống
+    như image_to_string. Dòng có thể là chuỗi (đã sửa) hoặc [(từ, conf)]."""
+    return "\n\n".join(
+        "\n".join(line if isinstance(line, str) else " ".join(w for w, _ in line) for line in lines)
+        for lines in paragraphs
+    )
+
+
+def layout_text(data):
+    """Dựng lại văn bản từ kết quả image_to_data."""
+    return render_paragraphs(layout_lines(data))
+
+
+def line_confidence(line):
+    """Conf trung bình theo độ dài từ của một dòng [(từ, conf)]."""
+    total = sum(len(w) for w, _ in line)
+    return sum(max(c, 0.0) * len(w) for w, c in line) / total if total else 0.0
+
 
 class AIRefiner:
     def __init__(self, api_key, endpoint):
         self.api_key = api_key
         self.endpoint = endpoint
+        self.client = GeminiClient(api_key=api_key, endpoint=endpoint)
 
     def refine_text(self, raw_text):
         prompt = f"""Bạn là chuyên gia tiếng Việt. Sửa lỗi OCR và chuẩn hóa văn bản:
 {raw_text}
 Trả về kết quả cuối cùng duy nhất, không thêm ghi chú."""
-        payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        headers = {"Content-Type": "application/json"}
         try:
-            r = requests.post(self.endpoint, json=payload, headers=headers)
-            r.raise_for_status()
-            return r.json()['candidates'][0]['content']['parts'][0]['text']
+            return self.client.generate(prompt, site="ocr.refine_text")
         except Exception as e:
             logging.warning(f"LLM refine error: {e}")
             return raw_text
 
+    def refine_fragments(self, fragments):
+        """Sửa riêng các đoạn kém chắc chắn trong một lượt gọi; đoạn LLM không trả về thì giữ nguyên."""
+        body = "\n".join(f"### {i}\n{text}" for i, text in enumerate(fragments, 1))
+        prompt = f"""Bạn là chuyên gia tiếng Việt. Sửa lỗi OCR và chuẩn hóa từng đoạn dưới đây (mỗi đoạn mở đầu bằng dòng "### <số>"):
+{body}
+Trả về các đoạn đã sửa theo đúng định dạng đó (giữ nguyên các dòng "### <số>"), không thêm ghi chú."""
+        try:
+            response = self.client.generate(prompt, site="ocr.refine_fragments")
+        except Exception as e:
+            logging.warning(f"LLM refine error: {e}")
+            return fragments
+        parts = FRAGMENT_RE.split(response)
+        refined = {int(number): text.strip() for number, text in zip(parts[1::2], parts[2::2])}
+        return [refined.get(i) or text for i, text in enumerate(fragments, 1)]
+
     def rate_confidence(self, text):
         prompt = f"""Đánh giá độ tin cậy của văn bản sau trên thang điểm 0-100. Chỉ trả về số:
 {text}"""
-        payload = {"contents": [{"parts": [{"text": prompt}]}]}
-        headers = {"Content-Type": "application/json"}
         try:
-            r = requests.post(self.endpoint, json=payload, headers=headers)
-            r.raise_for_status()
-            score = r.json()['candidates'][0]['content']['parts'][0]['text']
+            score = self.client.generate(prompt, site="ocr.rate_confidence")
             return float(score.strip())
         except Exception as e:
             logging.warning(f"LLM confidence error: {e}")
@@ -66,91 +183,404 @@ class UltimateOCR:
         self.use_llm = use_llm
         self.llm_key = llm_key
         self.llm_endpoint = f"{llm_endpoint}?key={llm_key}" if use_llm else ''
+        # Dùng lại một AIRefiner (một session HTTP) cho mọi ảnh
+        self.refiner = AIRefiner(self.llm_key, self.llm_endpoint) if use_llm and llm_key else None
+        self.corrector = ocr_correct.get_corrector() if LOCAL_CORRECT else None
         self.tesseract_cmds = os.getenv("TESSERACT_CMDS", r"F:\\Tesseract-OCR\\tesseract.exe,/usr/bin/tesseract").split(',')
         self.min_conf = 60
-        self._setup_tesseract()
+        # Số vùng chữ OCR song song trong một ảnh (mặc định tuần tự vì batch đã song song theo ảnh)
+        self.region_threads = env_int("OCR_REGION_THREADS", 1)
+        # tesserocr (handle Tesseract giữ sẵn trong process) nếu đã cài, không thì gọi binary qua pytesseract
+        self.use_api = tesseract_api.use_api()
+        self._api_pool = None
+        self._api_lock = threading.Lock()
+        if not self.use_api:
+            self._setup_tesseract()
+        self.cache = ResultCache("ocr", {
+            "configs": OCR_CONFIGS,
+            "preprocess": PREPROCESS_VERSION,
+            "llm": llm_endpoint if use_llm else None,
+            "confidence": confidence.params(),
+            "llm_confidence": LLM_CONFIDENCE,
+            "correct": self.corrector.params() if self.corrector else None,
+            "refine": [REFINE_LINE_CONF, REFINE_PAGE_RATIO, REFINE_VERSION],
+        })
 
     def _setup_tesseract(self):
+        # Chỉ tìm đường dẫn; pytesseract được cấu hình ở lần OCR đầu tiên
         for cmd in self.tesseract_cmds:
             if os.path.exists(cmd):
-                pytesseract.pytesseract.tesseract_cmd = cmd
+                self.tesseract_cmd = cmd
                 return
         raise FileNotFoundError("Không tìm thấy Tesseract")
 
-    def preprocess(self, img):
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        img = cv2.adaptiveThreshold(img, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+    def binarize(self, gray):
+        return cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
                                      cv2.THRESH_BINARY_INV, 31, 12)
-        return img
 
-    def extract_text(self, image_path):
-        if not os.path.exists(image_path):
+    def preprocess(self, img):
+        return self.binarize(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY))
+
+    def extract_text(self, image_path, use_cache=True, data=None):
+        """`data`: nội dung ảnh nhận qua stdin (khi đó `image_path` chỉ là tên file)."""
+        if data is None and not os.path.exists(image_path):
             return f"[LỖI] Không tồn tại ảnh: {image_path}", 0
 
-        img = cv2.imread(image_path)
-        if img.shape[0] < 1000 or img.shape[1] < 1000:
-            img = cv2.resize(img, None, fx=2, fy=2, interpolation=cv2.INTER_CUBIC)
-        pre = self.preprocess(img)
+        if not use_cache:
+            return self._extract_text(image_path, data)
+        cached = self.cache.get_or_compute(
+            image_path, lambda: list(self._extract_text(image_path, data)),
+            content_hash=hash_bytes(data) if data is not None else None
+        )
+        return cached[0], cached[1]
 
-        configs = [("--psm 6 --oem 1", "vie+eng"), ("--psm 3", "eng")]
-        best_text = ""
-        best_conf = 0
+    def extract_pages(self, path, on_page=None, use_cache=True, data=None):
+        """OCR tài liệu nhiều trang (PDF/TIFF). Trang được rasterize lần lượt qua hàng đợi có giới hạn
+        nên bộ nhớ không tăng theo số trang; `on_page` được gọi ngay khi một trang xong."""
+        if data is None and not os.path.exists(path):
+            raise FileNotFoundError(f"Không tồn tại file: {path}")
+
+        content_hash = None
+        if use_cache and self.cache.enabled:
+            content_hash = hash_bytes(data) if data is not None else hash_file(path)
+        if content_hash:
+            cached = self.cache.get(path, content_hash, variant="pages")
+            if cached is not None:
+                for page in cached:
+                    if on_page:
+                        on_page(page)
+                return cached
+
+        pages_q = queue.Queue(maxsize=PAGE_QUEUE_SIZE)
+        pages = []
+        errors = []
+        lock = threading.Lock()
 
-        for config, lang in configs:
-            data = pytesseract.image_to_data(Image.fromarray(pre), lang=lang, config=config, output_type=pytesseract.Output.DICT)
-            weighted_sum, total_weight = 0, 0
-            for i in range(len(data['text'])):
-                word = data['text'][i].strip()
+        def produce():
+            try:
+                for item in timed_iter("load", iter_pages(path, data)):
+                    pages_q.put(item)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                for _ in range(PAGE_WORKERS):
+                    pages_q.put(None)
+
+        def consume():
+            while True:
+                item = pages_q.get()
+                if item is None:
+                    return
+                number, gray = item
                 try:
-                    conf = float(data['conf'][i])
-                    if conf < 20 or not word:
-                        continue
-                    weight = len(word)
-                    weighted_sum += conf * weight
-                    total_weight += weight
-                except:
-                    continue
-
-            avg_conf = weighted_sum / total_weight if total_weight > 0 else 0
+                    text, conf = self.extract_from_gray(gray)
+                    page = {"page": number, "text": text, "confidence": conf, "error": None}
+                except Exception as e:
+                    page = {"page": number, "text": "", "confidence": 0, "error": str(e)}
+                del gray
+                with lock:
+                    pages.append(page)
+                    if on_page:
+                        on_page(page)
+
+        threads = [threading.Thread(target=bind(produce))] + \
+                  [threading.Thread(target=bind(consume)) for _ in range(PAGE_WORKERS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+        pages.sort(key=lambda p: p["page"])
+        if content_hash and all(p["error"] is None for p in pages):
+            self.cache.put(path, pages, content_hash, variant="pages")
+        return pages
+
+    def api_pool(self):
+        with self._api_lock:
+            if self._api_pool is None:
+                # Đủ handle cho mọi luồng có thể OCR cùng lúc trong process (trang × vùng chữ)
+                self._api_pool = tesseract_api.TesseractApiPool(PAGE_WORKERS * self.region_threads)
+            return self._api_pool
+
+    def run_engine(self, pre, lang, config):
+        """Kết quả dạng image_to_data (dict) cho ảnh numpy `pre`."""
+        if self.use_api:
+            pool = self.api_pool()
+            with stage("engine"):
+                return pool.image_to_data(pre, lang, config)
+        pytesseract.pytesseract.tesseract_cmd = self.tesseract_cmd
+        with stage("engine"):
+            return pytesseract.image_to_data(Image.fromarray(pre), lang=lang, config=config,
+                                             output_type=pytesseract.Output.DICT)
+
+    def ocr_region(self, pre):
+        """(các đoạn theo layout_lines, conf trung bình, conf từng từ, độ dài từng từ) của cấu hình tốt nhất."""
+        best_paragraphs = []
+        best_conf = 0
+        best_words = (np.empty(0, np.float32), np.empty(0, np.float32))
+
+        # Mỗi cấu hình chỉ chạy Tesseract một lần: văn bản dựng lại từ image_to_data
+        for config, lang in OCR_CONFIGS:
+            data = self.run_engine(pre, lang, config)
+            avg_conf = weighted_confidence(data)
             if avg_conf > best_conf:
                 best_conf = avg_conf
-                best_text = pytesseract.image_to_string(Image.fromarray(pre), lang=lang, config=config)
+                best_paragraphs = layout_lines(data)
+                best_words = word_stats(data)
+            if best_conf >= EARLY_STOP_CONF:
+                break
+
+        return best_paragraphs, best_conf, best_words[0], best_words[1]
 
-        text_to_return = best_text.strip()
+    def _extract_text(self, image_path, data=None):
+        with stage("load"):
+            if data is not None:
+                gray = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_GRAYSCALE)
+            else:
+                gray = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            raise ValueError(f"Không đọc được ảnh: {image_path}")
+        return self.extract_from_gray(gray)
 
-        # LLM refine + confidence
-        if self.use_llm and self.llm_key:
-            ai = AIRefiner(self.llm_key, self.llm_endpoint)
-            refined = ai.refine_text(text_to_return)
-            text_to_return = refined.strip() or text_to_return
-            llm_conf = ai.rate_confidence(text_to_return)
+    def extract_from_gray(self, gray):
+        # Chỉ OCR các vùng có chữ (đã xoay thẳng, scale theo cỡ chữ, cắt tile)
+        regions = timed_iter("preprocess", ocr_preprocess.iter_regions(gray, self.binarize))
+        if self.region_threads > 1:
+            with ThreadPoolExecutor(self.region_threads) as pool:
+                parts = list(pool.map(bind(self.ocr_region), regions))
+        else:
+            parts = [self.ocr_region(pre) for pre in regions]
+        paragraphs = [par for part in parts for par in part[0]]
+
+        raw_text = render_paragraphs(paragraphs)
+        confs = np.concatenate([part[2] for part in parts]) if parts else np.empty(0, np.float32)
+        lengths = np.concatenate([part[3] for part in parts]) if parts else np.empty(0, np.float32)
+        text_to_return = self.correct(paragraphs, raw_text) if raw_text else raw_text
+        best_conf = confidence.ocr_confidence(confs, lengths)
+        if text_to_return != raw_text:
+            # Độ tin cậy trừ theo mức văn bản phải sửa (tại chỗ lẫn LLM)
+            best_conf = confidence.ocr_confidence(confs, lengths, raw_text, text_to_return)
+
+        if self.refiner and raw_text and LLM_CONFIDENCE:
+            with stage("llm_confidence"):
+                llm_conf = self.refiner.rate_confidence(text_to_return)
             if llm_conf:
-                best_conf = (best_conf + llm_conf) / 2  # trung bình giữa Tesseract và LLM
+                best_conf = (best_conf + llm_conf) / 2  # trung bình giữa điểm tại chỗ và LLM
 
         return text_to_return, round(best_conf, 2)
 
+    def correct(self, paragraphs, raw_text):
+        """Dòng đủ chắc sửa tại chỗ bằng từ điển (không có từ điển thì giữ nguyên); dòng kém chắc chắn
+        gom thành từng cụm liền nhau và chỉ gửi các cụm đó cho LLM (nhiều dòng kém thì gửi cả trang)."""
+        low = [[self.refiner is not None and line_confidence(line) < REFINE_LINE_CONF for line in lines]
+               for lines in paragraphs]
+        low_chars = sum(len(w) for lines, flags in zip(paragraphs, low)
+                        for line, flag in zip(lines, flags) if flag for w, _ in line)
+        total_chars = sum(len(w) for lines in paragraphs for line in lines for w, _ in line)
+        if low_chars and low_chars >= REFINE_PAGE_RATIO * total_chars:
+            with stage("llm_refine"):
+                return self.refiner.refine_text(raw_text).strip() or raw_text
 
-def handle_cli():
+        corrected = []
+        spans = []   # (đoạn, dòng đầu, dòng cuối + 1) của các cụm dòng kém
+        with stage("correct"):
+            for p, (lines, flags) in enumerate(zip(paragraphs, low)):
+                out = []
+                for i, (line, flag) in enumerate(zip(lines, flags)):
+                    if flag:
+                        if spans and spans[-1][0] == p and spans[-1][2] == i:
+                            spans[-1] = (p, spans[-1][1], i + 1)
+                        else:
+                            spans.append((p, i, i + 1))
+                        out.append(line)
+                    elif self.corrector:
+                        out.append(self.corrector.correct_line(w for w, _ in line))
+                    else:
+                        out.append(line)
+                corrected.append(out)
+
+        if spans:
+            fragments = [render_paragraphs([corrected[p][start:end]]) for p, start, end in spans]
+            with stage("llm_refine"):
+                refined = self.refiner.refine_fragments(fragments)
+            # Thay từ cuối lên để chỉ số dòng của các cụm phía trước không đổi
+            for (p, start, end), text in reversed(list(zip(spans, refined))):
+                corrected[p][start:end] = [text]
+        return render_paragraphs(corrected)
+
+
+def build_parser():
     parser = argparse.ArgumentParser()
-    parser.add_argument('images', nargs='+')
+    parser.add_argument('images', nargs='*')
     parser.add_argument('--llm_key', type=str, default=os.getenv('LLM_API_KEY'))
     parser.add_argument('--llm_endpoint', type=str, default=os.getenv('LLM_ENDPOINT'))
-    args = parser.parse_args()
+    parser.add_argument('--no-cache', dest='use_cache', action='store_false')
+    parser.add_argument('--workers', type=int, default=env_int('OCR_WORKERS', os.cpu_count() or 1))
+    parser.add_argument('--stream', action='store_true')
+    parser.add_argument('--stdin-frames', dest='stdin_frames', action='store_true',
+                        help='đọc nội dung ảnh từ stdin (frame có độ dài) thay vì đường dẫn')
+    return parser
 
-    ocr = UltimateOCR(
-        use_llm=bool(args.llm_key and args.llm_endpoint),
-        llm_key=args.llm_key,
-        llm_endpoint=args.llm_endpoint
-    )
 
-    results = []
-    for path in args.images:
-        try:
-            text, conf = ocr.extract_text(path)
-            results.append({"text": text, "confidence": conf, "error": None})
-        except Exception as e:
-            results.append({"text": f"[LỖI] {str(e)}", "confidence": 0, "error": str(e)})
+_ocr_instances = {}
+
+
+def get_ocr(llm_key, llm_endpoint):
+    # Giữ lại instance theo cặp (key, endpoint) để worker không phải khởi tạo lại
+    cache_key = (llm_key, llm_endpoint)
+    if cache_key not in _ocr_instances:
+        _ocr_instances[cache_key] = UltimateOCR(
+            use_llm=bool(llm_key and llm_endpoint),
+            llm_key=llm_key,
+            llm_endpoint=llm_endpoint
+        )
+    return _ocr_instances[cache_key]
+
+
+def merge_pages(pages):
+    texts = [p["text"] for p in pages if p["text"]]
+    total_len = sum(len(t) for t in texts)
+    conf = sum(p["confidence"] * len(p["text"]) for p in pages) / total_len if total_len else 0
+    return "\n\n".join(texts), round(conf, 2)
+
+
+def ocr_one(ocr, path, use_cache=True, on_page=None, data=None, timings=False):
+    """`timings`: thêm khối thời gian từng giai đoạn của ảnh này vào kết quả."""
+    if not timings:
+        return _ocr_one(ocr, path, use_cache, on_page, data)
+    t = Timings()
+    with use(t):
+        entry = _ocr_one(ocr, path, use_cache, on_page, data)
+    entry["timings"] = t.as_dict()
+    return entry
+
+
+def _ocr_one(ocr, path, use_cache=True, on_page=None, data=None):
+    # Lỗi của từng ảnh được gói vào kết quả để không ảnh hưởng các ảnh khác trong lô
+    try:
+        if is_multipage(path):
+            pages = ocr.extract_pages(path, on_page=on_page, use_cache=use_cache, data=data)
+            text, conf = merge_pages(pages)
+            return {"text": text, "confidence": conf, "error": None, "pages": pages}
+        text, conf = ocr.extract_text(path, use_cache=use_cache, data=data)
+        return {"text": text, "confidence": conf, "error": None}
+    except Exception as e:
+        return {"text": f"[LỖI] {str(e)}", "confidence": 0, "error": str(e)}
+
+
+def _init_pool_worker(thread_limit, llm_key, llm_endpoint):
+    # Mỗi process chạy Tesseract một luồng để tổng số luồng không vượt số nhân; chỉ đặt ở process con
+    os.environ["OMP_THREAD_LIMIT"] = thread_limit
+    get_ocr(llm_key, llm_endpoint)
+
+
+def _pool_ocr_one(path, use_cache, data=None, timings=False, llm_key=None, llm_endpoint=None):
+    return ocr_one(get_ocr(llm_key, llm_endpoint), path, use_cache, data=data, timings=timings)
+
+
+# Một pool cho cả process, dùng lại giữa các lượt gọi (--serve): số process con cố định theo --workers
+# của lượt tạo pool, mỗi process giữ UltimateOCR theo cặp (key, endpoint) của job. Dùng spawn (không
+# fork) vì ở --serve process cha đã có các luồng worker đang chạy.
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None:
+            _pool_workers = workers
+            _pool = ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_pool_worker,
+                initargs=(os.getenv("OCR_OMP_THREAD_LIMIT", "1"), os.getenv('LLM_API_KEY'), os.getenv('LLM_ENDPOINT'))
+            )
+            atexit.register(_pool.shutdown)
+        return _pool
+
+
+def pool_size():
+    """Số process con của pool đã tạo (None nếu chưa có) — giới hạn số ảnh thật sự chạy song song."""
+    return _pool_workers
+
+
+def run(argv, emit=None, frames=None):
+    """`emit`: mỗi trang / mỗi file được gửi ra ngay khi xong dưới dạng bản ghi NDJSON, kết thúc
+    bằng bản ghi summary (xem ndjson.py).
+    `frames`: [(tên, bytes)] nội dung file nhận trực tiếp (worker hoặc --stdin-frames)."""
+    argv, timings, profile_kind = pop_flags(argv)
+    args = build_parser().parse_args(argv)
+    if args.stdin_frames and frames is None:
+        check_stdin("--stdin-frames")
+        frames = read_frames()
+    if frames:
+        names = [name for name, _ in frames]
+        datas = [data for _, data in frames]
+    else:
+        names = args.images
+        datas = [None] * len(names)
+    if not names:
+        raise ValueError("Thiếu ảnh đầu vào")
+    workers = max(1, min(pool_size() or args.workers, len(names)))
+    started = time.perf_counter()
+
+    with profile(profile_kind, "ocr"):
+        results = _run_batch(args, names, datas, workers, timings, emit)
+
+    elapsed = time.perf_counter() - started
+    if emit:
+        emit(summary_record(results, elapsed, workers=workers))
+    rate = len(names) / elapsed if elapsed > 0 else 0.0
+    print(f"[OCR] {len(names)} ảnh trong {elapsed:.2f}s ({rate:.2f} ảnh/giây, {workers} worker)", file=sys.stderr)
+    get_llm_cache().log_stats()
+    return results
+
+
+def _run_batch(args, names, datas, workers, timings, emit):
+    if workers == 1:
+        ocr = get_ocr(args.llm_key, args.llm_endpoint)
+        results = []
+        for index, (path, data) in enumerate(zip(names, datas)):
+            name = os.path.basename(path)
+            on_page = (lambda page, i=index, n=name: emit({"type": "page", "index": i, "file": n, **page})) if emit else None
+            entry = ocr_one(ocr, path, args.use_cache, on_page=on_page, data=data, timings=timings)
+            if emit:
+                emit(file_record(index, name, entry))
+            results.append(entry)
+        ocr.cache.log_stats()
+    elif emit:
+        # Trang nằm ở process con nên chỉ có bản ghi file, gửi theo thứ tự ảnh xong
+        pool = get_pool(args.workers)
+        futures = {pool.submit(_pool_ocr_one, path, args.use_cache, data, timings,
+                               args.llm_key, args.llm_endpoint): index
+                   for index, (path, data) in enumerate(zip(names, datas))}
+        results = [None] * len(names)
+        for future in as_completed(futures):
+            index = futures[future]
+            results[index] = future.result()
+            emit(file_record(index, os.path.basename(names[index]), results[index]))
+    else:
+        pool = get_pool(args.workers)
+        n = len(names)
+        # map giữ nguyên thứ tự ảnh đầu vào
+        results = list(pool.map(_pool_ocr_one, names, [args.use_cache] * n, datas, [timings] * n,
+                                [args.llm_key] * n, [args.llm_endpoint] * n))
+    return results
+
+
+def handle_cli():
+    if '--serve' in sys.argv[1:]:
+        get_ocr(os.getenv('LLM_API_KEY'), os.getenv('LLM_ENDPOINT'))
+        serve(run, max_concurrency=env_int('OCR_WORKER_CONCURRENCY', 2))
+        return
+
+    if '--stream' in sys.argv[1:]:
+        run(sys.argv[1:], emit=stdout_emitter())
+        return
 
+    results = record_serialize(run(sys.argv[1:]), ensure_ascii=False, indent=2)
     print(json.dumps(results, ensure_ascii=False, indent=2))
 
 
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""
+Tesseract chạy trong process qua tesserocr (C API) thay cho pytesseract.
+
+pytesseract mỗi lần gọi ghi ảnh ra file PNG tạm, fork binary `tesseract` và binary đó nạp lại
+traineddata (vie+eng) từ đầu: với ảnh nhỏ (ảnh chụp bảng trắng) chi phí khởi động lấn át phần nhận dạng.
+Ở đây mỗi cặp (ngôn ngữ, OEM) giữ sẵn các handle PyTessBaseAPI đã Init, ảnh numpy được đưa thẳng
+vào bộ nhớ của Tesseract, và handle được dùng chung giữa các luồng (trang / vùng chữ) qua một pool
+có giới hạn. tesserocr nhả GIL khi nhận dạng nên các luồng chạy song song thật.
+
+Kết quả trả về cùng dạng pytesseract.image_to_data(output_type=DICT) (chỉ các dòng cấp từ, level 5)
+nên phần dựng văn bản / tính độ tin cậy phía sau không đổi.
+
+Biến môi trường:
+  OCR_ENGINE         auto (mặc định: tesserocr nếu đã cài, không thì pytesseract) | api | cli
+  OCR_TESSDATA       thư mục traineddata cho tesserocr (mặc định theo TESSDATA_PREFIX / lúc build)
+"""
+import os
+import re
+import queue
+import threading
+import importlib.util
+from contextlib import contextmanager
+
+ENGINE = os.getenv("OCR_ENGINE", "auto").strip().lower()
+TESSDATA = os.getenv("OCR_TESSDATA", "").strip()
+
+
+def use_api():
+    """Có dùng tesserocr không (chỉ kiểm tra đã cài, chưa import: module C nạp ở lần OCR đầu tiên)."""
+    if ENGINE == "cli":
+        return False
+    if importlib.util.find_spec("tesserocr") is not None:
+        return True
+    if ENGINE == "api":
+        raise ModuleNotFoundError("OCR_ENGINE=api nhưng chưa cài tesserocr", name="tesserocr")
+    return False
+
+
+def parse_config(config):
+    """"--psm 6 --oem 1" → (psm, oem); thiếu thì dùng mặc định của Tesseract (3 / 3)."""
+    psm = re.search(r"--psm\s+(\d+)", config)
+    oem = re.search(r"--oem\s+(\d+)", config)
+    return int(psm.group(1)) if psm else 3, int(oem.group(1)) if oem else 3
+
+
+class TesseractApiPool:
+    def __init__(self, max_handles):
+        self.tesserocr = importlib.import_module("tesserocr")
+        self.max_handles = max(1, max_handles)
+        self._pools = {}    # (lang, oem) → (hàng đợi handle rảnh, [số handle đã tạo])
+        self._lock = threading.Lock()
+
+    def _pool(self, key):
+        with self._lock:
+            if key not in self._pools:
+                self._pools[key] = (queue.LifoQueue(), [0])
+            return self._pools[key]
+
+    def _create(self, lang, oem):
+        kwargs = {"lang": lang, "oem": self.tesserocr.OEM(oem)}
+        if TESSDATA:
+            kwargs["path"] = TESSDATA
+        return self.tesserocr.PyTessBaseAPI(**kwargs)
+
+    @contextmanager
+    def handle(self, lang, oem):
+        """Mượn một handle đã Init cho (lang, oem); tạo thêm khi chưa đủ max_handles, không thì chờ."""
+        idle, created = self._pool((lang, oem))
+        try:
+            api = idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = created[0] < self.max_handles
+                if can_create:
+                    created[0] += 1
+            if can_create:
+                try:
+                    api = self._create(lang, oem)
+                except Exception:
+                    with self._lock:
+                        created[0] -= 1
+                    raise
+            else:
+                api = idle.get()
+        try:
+            yield api
+        finally:
+            api.Clear()
+            idle.put(api)
+
+    def image_to_data(self, gray, lang, config):
+        """`gray`: ảnh numpy uint8 một kênh (hoặc RGB). Trả dict cùng khóa với image_to_data."""
+        tesserocr = self.tesserocr
+        RIL = tesserocr.RIL
+        psm, oem = parse_config(config)
+        height, width = gray.shape[:2]
+        channels = 1 if gray.ndim == 2 else gray.shape[2]
+        data = {key: [] for key in ("level", "block_num", "par_num", "line_num", "word_num",
+                                    "left", "top", "width", "height", "conf", "text")}
+
+        with self.handle(lang, oem) as api:
+            api.SetPageSegMode(tesserocr.PSM(psm))
+            api.SetImageBytes(gray.tobytes(), width, height, channels, width * channels)
+            api.Recognize()
+            iterator = api.GetIterator()
+            block = par = line = word = 0
+            # Ảnh không có chữ: không có iterator
+            for item in tesserocr.iterate_level(iterator, RIL.WORD) if iterator is not None else ():
+                if item.IsAtBeginningOf(RIL.BLOCK):
+                    block, par, line, word = block + 1, 0, 0, 0
+                if item.IsAtBeginningOf(RIL.PARA):
+                    par, line, word = par + 1, 0, 0
+                if item.IsAtBeginningOf(RIL.TEXTLINE):
+                    line, word = line + 1, 0
+                word += 1
+                text = item.GetUTF8Text(RIL.WORD)
+                if text is None:
+                    continue
+                box = item.BoundingBox(RIL.WORD) or (0, 0, 0, 0)
+                data["level"].append(5)
+                data["block_num"].append(block)
+                data["par_num"].append(par)
+                data["line_num"].append(line)
+                data["word_num"].append(word)
+                data["left"].append(box[0])
+                data["top"].append(box[1])
+                data["width"].append(box[2] - box[0])
+                data["height"].append(box[3] - box[1])
+                data["conf"].append(item.Confidence(RIL.WORD))
+                data["text"].append(text)
+        return data
@@ -1,19 +1,22 @@
 import { UploadedFile } from 'express-fileupload';
 import path from 'path';
-import fs from 'fs/promises';
 import { spawn } from 'child_process';
+import { getPythonWorkerPool, isPythonWorkerMode } from '../../../shared/python-worker';
+import { FrameFile, writeFrames } from '../../../shared/frames';
+import { getScheduler, JobPriority } from '../../../shared/scheduler';
+import { docxCost } from '../../../shared/job-cost';
 
-export class ReadDocxService {
-    async handleDocxFiles(docxFiles: UploadedFile[]): Promise<any[]> {
-        const uploadDir = path.join(__dirname, '../../../uploads_docx');
-        await fs.mkdir(uploadDir, { recursive: true });
+export type DocxSection = { title: string; text: string };
 
+export class ReadDocxService {
+    /**
+     * `sections`: kèm danh sách section (tách theo tiêu đề / bảng) để trích xuất use case tăng dần
+     */
+    async handleDocxFiles(docxFiles: UploadedFile[], priority: JobPriority = 'interactive', sections = false): Promise<any[]> {
         const results: any[] = [];
         for (const file of docxFiles) {
-            const savePath = path.join(uploadDir, file.name);
-            await file.mv(savePath);
             try {
-                const result = await this.runDocxToText(savePath);
+                const result = await this.runDocxToText({ name: file.name, data: file.data }, priority, sections);
                 results.push(result);
             } catch (error: any) {
                 results.push({ text: null, confidence: 0, error: error.message || 'Internal error' });
@@ -22,12 +25,21 @@ export class ReadDocxService {
         return results;
     }
 
-    async runDocxToText(docxPath: string): Promise<any> {
+    async runDocxToText(file: FrameFile, priority: JobPriority = 'interactive', sections = false): Promise<any> {
+        return getScheduler().run('docx', docxCost([file]), priority, () => this.execDocx(file, sections));
+    }
+
+    private execDocx(file: FrameFile, sections: boolean): Promise<any> {
         const scriptPath = path.join(__dirname, '../pythonScript/process_docx.py');
-        const args = [scriptPath, docxPath];
+        const args = sections ? ['--sections'] : [];
+
+        if (isPythonWorkerMode()) {
+            return getPythonWorkerPool(scriptPath).run(args, [file]);
+        }
 
         return new Promise((resolve, reject) => {
-            const python = spawn('python', args);
+            const python = spawn('python', [scriptPath, '--stdin-frames', ...args]);
+            writeFrames(python, [file]);
             let result = '';
             let error = '';
 
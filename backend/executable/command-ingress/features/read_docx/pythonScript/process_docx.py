@@ -1,24 +1,245 @@
+import os
+import re
 import sys
 import json
-from docx import Document
+import zipfile
+import xml.etree.ElementTree as ET
+from xml.parsers import expat
 
-def extract_text(docx_path):
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(BASE_DIR, '..', '..', '..', 'shared', 'pythonScript'))
+from worker import serve, env_int, check_stdin
+from result_cache import ResultCache
+from frames import read_frames, hash_bytes, as_stream
+from timing import Timings, use, stage, timed_iter, pop_flags, profile, record_serialize
+
+# Tăng khi đổi cách trích xuất để bỏ qua cache cũ
+EXTRACTOR_VERSION = 3
+result_cache = ResultCache("docx", {"extractor": "stream-xml", "version": EXTRACTOR_VERSION})
+
+W = "http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+HEADING_STYLE = re.compile(r"^(heading\s*\d|title)$", re.IGNORECASE)
+CHUNK_SIZE = 1 << 16
+
+
+def load_heading_styles(zf):
+    """styleId của các style tiêu đề (tên 'heading N' / 'Title' hoặc có outlineLvl), tính cả style kế thừa."""
     try:
-        doc = Document(docx_path)
-        text = "\n".join([para.text for para in doc.paragraphs])
-        # Đọc thêm text trong bảng
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    if cell.text.strip():
-                        text += "\n" + cell.text
-        return {"text": text, "confidence": 1.0, "error": None}
+        root = ET.fromstring(zf.read("word/styles.xml"))
+    except KeyError:
+        return set()
+    ns = "{" + W
+    based_on = {}
+    headings = set()
+    for style in root.iter(ns + "style"):
+        sid = style.get(ns + "styleId")
+        name = style.find(ns + "name")
+        if (name is not None and HEADING_STYLE.match(name.get(ns + "val", ""))) \
+                or style.find(f"{ns}pPr/{ns}outlineLvl") is not None:
+            headings.add(sid)
+        parent = style.find(ns + "basedOn")
+        if parent is not None:
+            based_on[sid] = parent.get(ns + "val")
+    for sid in list(based_on):
+        seen = set()
+        cur = sid
+        while cur in based_on and cur not in seen and cur not in headings:
+            seen.add(cur)
+            cur = based_on[cur]
+        if cur in headings:
+            headings.add(sid)
+    return headings
+
+
+class _BlockCollector:
+    """Handler expat cho word/document.xml: không dựng cây XML, chỉ giữ trạng thái đoạn/bảng đang mở."""
+
+    def __init__(self, heading_styles):
+        self.heading_styles = heading_styles
+        self.blocks = []
+        self.paragraphs = []    # ngăn xếp đoạn đang mở (đoạn trong textbox lồng trong đoạn)
+        self.in_text = 0
+        self.tables = []        # mỗi bảng: danh sách hàng; mỗi hàng: danh sách ô (đã bỏ ô gộp)
+        self.cells = []         # ngăn xếp ô đang mở: {"texts": [...], "continuation": bool}
+
+    def start(self, name, attrs):
+        if not name.startswith(W):
+            return
+        tag = name[len(W):]
+        if tag == "t":
+            self.in_text += 1
+        elif tag == "p":
+            self.paragraphs.append({"parts": [], "heading": False})
+        elif tag == "tab" and self.paragraphs:
+            self.paragraphs[-1]["parts"].append("\t")
+        elif tag in ("br", "cr") and self.paragraphs:
+            self.paragraphs[-1]["parts"].append("\n")
+        elif tag == "pStyle" and self.paragraphs:
+            if attrs.get(W + "val") in self.heading_styles:
+                self.paragraphs[-1]["heading"] = True
+        elif tag == "outlineLvl" and self.paragraphs:
+            self.paragraphs[-1]["heading"] = True
+        elif tag == "tbl":
+            self.tables.append([])
+        elif tag == "tr" and self.tables:
+            self.tables[-1].append([])
+        elif tag == "tc":
+            self.cells.append({"texts": [], "continuation": False})
+        elif tag == "vMerge" and self.cells:
+            # Ô gộp dọc (không phải 'restart') đã được in ở hàng trên
+            self.cells[-1]["continuation"] = attrs.get(W + "val", "continue") != "restart"
+
+    def end(self, name):
+        if not name.startswith(W):
+            return
+        tag = name[len(W):]
+        if tag == "t":
+            self.in_text -= 1
+        elif tag == "p" and self.paragraphs:
+            para = self.paragraphs.pop()
+            text = "".join(para["parts"])
+            if self.cells:
+                self.cells[-1]["texts"].append(text)
+            else:
+                self.blocks.append(("paragraph", text, para["heading"]))
+        elif tag == "tc" and self.cells:
+            cell = self.cells.pop()
+            content = "\n".join(t for t in cell["texts"] if t.strip()).strip()
+            # gridSpan: ô gộp ngang chỉ xuất hiện một lần trong XML nên không bị lặp
+            if self.tables and self.tables[-1] and content and not cell["continuation"]:
+                self.tables[-1][-1].append(content)
+        elif tag == "tbl" and self.tables:
+            rows = self.tables.pop()
+            text = "\n".join(" | ".join(row) for row in rows if row)
+            if self.cells:
+                self.cells[-1]["texts"].append(text)
+            elif text:
+                self.blocks.append(("table", text, False))
+
+    def data(self, text):
+        if self.in_text and self.paragraphs:
+            self.paragraphs[-1]["parts"].append(text)
+
+
+def iter_blocks(source):
+    """Đọc word/document.xml trực tiếp từ file zip bằng parser expat tăng dần, sinh các khối theo
+    đúng thứ tự: ("paragraph", text, is_heading) hoặc ("table", text, False).
+    Không dựng cây XML nên bộ nhớ chỉ phụ thuộc vào khối đang mở.
+    `source` là đường dẫn hoặc file-like (BytesIO)."""
+    with zipfile.ZipFile(source) as zf:
+        with stage("load"):
+            collector = _BlockCollector(load_heading_styles(zf))
+        parser = expat.ParserCreate(namespace_separator="}")
+        parser.buffer_text = True
+        parser.StartElementHandler = collector.start
+        parser.EndElementHandler = collector.end
+        parser.CharacterDataHandler = collector.data
+
+        with zf.open("word/document.xml") as xml:
+            # load: giải nén từng khối, parse: expat
+            for chunk in timed_iter("load", iter(lambda: xml.read(CHUNK_SIZE), b"")):
+                with stage("parse"):
+                    parser.Parse(chunk, False)
+                if collector.blocks:
+                    yield from collector.blocks
+                    collector.blocks = []
+            parser.Parse(b"", True)
+            yield from collector.blocks
+
+
+def split_sections(blocks):
+    """Gom các khối thành section: mỗi tiêu đề mở một section mới, mỗi bảng là một section riêng
+    mang tiêu đề của section chứa nó. Ranh giới chỉ phụ thuộc cấu trúc tài liệu nên sửa một chỗ không làm
+    xê dịch các section khác (trích xuất use case tăng dần theo section, xem process_metadata.py)."""
+    sections = []
+    current = {"title": "", "blocks": [], "emitted": False}
+
+    def close():
+        if current["blocks"] or (current["title"] and not current["emitted"]):
+            sections.append({"title": current["title"], "blocks": current["blocks"]})
+
+    for kind, text, is_heading in blocks:
+        if not text.strip():
+            continue
+        if is_heading:
+            close()
+            current = {"title": text.strip(), "blocks": [], "emitted": False}
+        elif kind == "table":
+            if current["blocks"]:
+                close()
+            sections.append({"title": current["title"], "blocks": [text]})
+            current = {"title": current["title"], "blocks": [], "emitted": True}
+        else:
+            current["blocks"].append(text)
+    close()
+    return [
+        {"title": s["title"], "text": "\n".join(([s["title"]] if s["title"] else []) + s["blocks"])}
+        for s in sections
+    ]
+
+
+def extract_text(docx_path, sections=False):
+    """`docx_path` là đường dẫn hoặc file-like (nội dung nhận qua stdin)."""
+    try:
+        blocks = list(iter_blocks(docx_path))
+        text = "\n".join(text for _, text, _ in blocks)
+        result = {"text": text, "confidence": 1.0, "error": None}
+        if sections:
+            with stage("sections"):
+                result["sections"] = split_sections(blocks)
+        return result
     except Exception as e:
         return {"text": None, "confidence": 0, "error": str(e)}
 
+
+def run(argv, frames=None):
+    argv, timings, profile_kind = pop_flags(argv)
+    t = Timings() if timings else None
+    with use(t), profile(profile_kind, "docx"):
+        result = _run(argv, frames)
+    if t is not None:
+        result["timings"] = t.as_dict()
+    return result
+
+def _run(argv, frames=None):
+    use_cache = "--no-cache" not in argv
+    sections = "--sections" in argv
+    if "--stdin-frames" in argv and frames is None:
+        check_stdin("--stdin-frames")
+        frames = read_frames()
+    paths = [arg for arg in argv if arg not in ("--no-cache", "--sections", "--stdin-frames")]
+    variant = {"sections": sections}
+    cacheable = lambda r: r.get("error") is None
+
+    # Nội dung file gửi thẳng qua stdin: đọc zip từ bộ nhớ, không ghi ra đĩa
+    if frames:
+        _, data = frames[0]
+        if not use_cache:
+            return extract_text(as_stream(data), sections)
+        result = result_cache.get_or_compute(
+            None, lambda: extract_text(as_stream(data), sections),
+            cacheable=cacheable, variant=variant, content_hash=hash_bytes(data)
+        )
+        result_cache.log_stats()
+        return result
+
+    if not paths:
+        return {"text": None, "confidence": 0, "error": "No file path provided"}
+    if not use_cache or not os.path.isfile(paths[0]):
+        return extract_text(paths[0], sections)
+    result = result_cache.get_or_compute(
+        paths[0], lambda: extract_text(paths[0], sections),
+        cacheable=cacheable, variant=variant
+    )
+    result_cache.log_stats()
+    return result
+
 if __name__ == "__main__":
+    if "--serve" in sys.argv[1:]:
+        serve(run, max_concurrency=env_int("DOCX_WORKER_CONCURRENCY", 4))
+        sys.exit(0)
     if len(sys.argv) < 2:
-        print(json.dumps({"text": None, "confidence": 0, "error": "No file path provided"}))
+        print(json.dumps(run([])))
         sys.exit(1)
-    result = extract_text(sys.argv[1])
-    print(json.dumps(result)) 
\ No newline at end of file
+    result = run(sys.argv[1:])
+    print(json.dumps(record_serialize(result)))
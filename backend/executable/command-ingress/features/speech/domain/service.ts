@@ -1,7 +1,14 @@
 import { spawn } from 'child_process';
-import fs from 'fs';
 import path from 'path';
 import { UploadedFile } from 'express-fileupload';
+import { getPythonWorkerPool, isPythonWorkerMode } from '../../../shared/python-worker';
+import { FrameFile, writeFrames } from '../../../shared/frames';
+import { streamPython } from '../../../shared/python-stream';
+import { getScheduler, JobPriority } from '../../../shared/scheduler';
+import { loadSttResources, sttCost } from '../../../shared/job-cost';
+import env from '../../../utils/env';
+
+const scriptPath = path.join(__dirname, '../pythonScript/process_STT.py');
 
 export interface SpeechToTextResult {
     file: string;
@@ -19,15 +26,65 @@ export interface SpeechToTextResult {
 
 
 export class SpeechToTextService {
-    async handleAudio(files: UploadedFile | UploadedFile[], context: string): Promise<SpeechToTextResult[]> {
+    async handleAudio(
+        files: UploadedFile | UploadedFile[],
+        context: string,
+        priority: JobPriority = 'interactive',
+    ): Promise<SpeechToTextResult[]> {
+        const inputs = this.toInputs(files);
+
+        // === 2. Chia job (STT_FILES_PER_JOB file mỗi job), mỗi job được xếp lịch theo RAM / số lõi
+        const batches = this.chunk(inputs, env.STT_FILES_PER_JOB);
+
+        const allResults: SpeechToTextResult[] = [];
+
+        for (const batch of batches) {
+            const batchResult = await this.schedule(batch, priority, () => this.runPython(batch, context));
+            allResults.push(...batchResult);
+        }
+
+        return allResults;
+    }
+
+    /**
+     * Như handleAudio nhưng `onFile` được gọi ngay khi từng file chép lời + cải thiện xong,
+     * `index` là vị trí của file trong `files`.
+     */
+    async streamAudio(
+        files: UploadedFile | UploadedFile[],
+        context: string,
+        onFile: (entry: SpeechToTextResult, index: number) => void,
+        priority: JobPriority = 'interactive',
+    ): Promise<SpeechToTextResult[]> {
+        const inputs = this.toInputs(files);
+        const allResults: SpeechToTextResult[] = [];
+        let offset = 0;
+
+        for (const batch of this.chunk(inputs, env.STT_FILES_PER_JOB)) {
+            const start = offset;
+            const batchResult = await this.schedule(batch, priority, () =>
+                streamPython(scriptPath, [`--context=${context}`], batch, {
+                    onFile: (entry, index) => onFile(entry, start + index),
+                }));
+            allResults.push(...batchResult);
+            offset += batch.length;
+        }
+
+        return allResults;
+    }
+
+    private async schedule<T>(batch: FrameFile[], priority: JobPriority, task: () => Promise<T>): Promise<T> {
+        const resources = await loadSttResources(scriptPath);
+        return getScheduler().run('stt', sttCost(batch, resources), priority, task);
+    }
+
+    private toInputs(files: UploadedFile | UploadedFile[]): FrameFile[] {
         const audioFiles = Array.isArray(files) ? files : [files];
-        const savedPaths: string[] = [];
-        const uploadDir = path.join(process.cwd(), 'uploads_Audio');
-        if (!fs.existsSync(uploadDir)) fs.mkdirSync(uploadDir, { recursive: true });
+        const inputs: FrameFile[] = [];
 
         const allowed = ['.mp3', '.m4a', '.wav', '.flac', '.ogg', '.webm', '.aac'];
 
-        // === 1. Save all uploaded files
+        // === 1. Kiểm tra định dạng, giữ nội dung trong bộ nhớ để gửi thẳng sang Python
         for (const file of audioFiles) {
             let ext = path.extname(file.name || '').toLowerCase();
             if (!ext && (file as any).mimetype) {
@@ -43,28 +100,12 @@ export class SpeechToTextService {
                 throw new Error(`Unsupported file: ${file.name}`);
             }
 
-            const safe = file.name.replace(/[^\w.-]/g, '_');
-            const unique = `${Date.now()}_${safe}`;
-            const dest = path.join(uploadDir, unique);
-
-            await (file as any).mv(dest);
-            savedPaths.push(dest);
+            // Python nhận dạng định dạng theo phần mở rộng của tên file
+            const name = path.extname(file.name || '') ? file.name : `${file.name || 'audio'}${ext}`;
+            inputs.push({ name, data: file.data });
         }
 
-        // === 2. Chia batch (ví dụ mỗi batch 2 file)
-        const batches = this.chunk(savedPaths, 2);
-
-        const allResults: SpeechToTextResult[] = [];
-
-        for (const batch of batches) {
-            const batchResult = await this.runPython(batch, context);
-            allResults.push(...batchResult);
-        }
-
-        // === 3. Cleanup sau 10s
-        setTimeout(() => savedPaths.forEach(p => fs.unlink(p, () => { })), 10_000);
-
-        return allResults;
+        return inputs;
     }
 
     private chunk<T>(array: T[], size: number): T[][] {
@@ -76,10 +117,16 @@ export class SpeechToTextService {
     }
 
 
-    private runPython(audioPaths: string[], context: string): Promise<SpeechToTextResult[]> {
+    private runPython(files: FrameFile[], context: string): Promise<SpeechToTextResult[]> {
+        const args = [`--context=${context}`];
+
+        if (isPythonWorkerMode()) {
+            return getPythonWorkerPool(scriptPath).run(args, files);
+        }
+
         return new Promise((resolve, reject) => {
-            const scriptPath = path.join(__dirname, '../pythonScript/process_STT.py');
-            const python = spawn('python', [scriptPath, ...audioPaths, `--context=${context}`]);
+            const python = spawn('python', [scriptPath, '--stdin-frames', ...args]);
+            writeFrames(python, files);
 
             let stdout = '';
             let stderr = '';
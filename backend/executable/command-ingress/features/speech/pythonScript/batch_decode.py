@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Giải mã Whisper theo batch: ghép cửa sổ mel 30 s của nhiều đoạn (từ nhiều file hoặc nhiều đoạn
+của cùng một file) thành một lượt encoder/decoder, rồi tách kết quả về lại từng file.
+
+model.transcribe chỉ xử lý một cửa sổ mỗi lượt (batch 1), CPU/GPU bị dùng rất kém khi chép lời
+nhiều file; ở đây mỗi lượt giải mã `batch_size` cửa sổ cùng lúc.
+
+Cả batch giải mã tham lam (temperature 0), mỗi đoạn tự nhận diện ngôn ngữ. Đoạn nào có dấu hiệu
+lặp (compression ratio cao) hoặc log-prob thấp được giải mã lại riêng bằng model.transcribe
+(có fallback nhiệt độ như trước); đoạn gần như chắc chắn là im lặng thì bỏ.
+
+Với cascade (cascade.py), batch chạy bằng mô hình nhanh: `escalate(stats)` chọn thêm các cửa sổ
+cần giải mã lại và `fallback(audio, language)` giải mã chúng bằng mô hình lớn. whisper.decode chỉ
+trả chỉ số cho cả cửa sổ nên ở đây đơn vị giải mã lại là cả đoạn ≤ 30 s, không phải từng segment.
+"""
+from collections import Counter, defaultdict
+
+from lazy_import import lazy_import
+from timing import Stopwatch
+import confidence
+
+torch = lazy_import("torch")
+whisper = lazy_import("whisper")
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+# Mỗi token thời gian cách nhau 2 frame mel (HOP_LENGTH 160 / 16 kHz) = 0.02 s
+TIME_PRECISION = 0.02
+
+# Ngưỡng giống mặc định của whisper.transcribe
+COMPRESSION_RATIO_THRESHOLD = 2.4
+LOGPROB_THRESHOLD = -1.0
+NO_SPEECH_THRESHOLD = 0.6
+
+
+class BatchDecoder:
+    """Nhận các đoạn (key, offset, audio ≤ 30 s), giải mã mỗi khi đủ `batch_size` đoạn.
+
+    Kết quả gom theo key (thường là chỉ số file): `pending(key)` cho biết key còn đoạn trong hàng
+    đợi hay không, `pop(key)` trả kết quả đã ghép của key đó.
+    `timings_of(key)` → Timings (hoặc None): thời gian mỗi lượt giải mã được chia cho các key
+    trong batch theo số đoạn, lượt giải mã lại tính riêng cho key của đoạn đó.
+    """
+
+    def __init__(self, model, batch_size=8, fp16=False, timings_of=None, fallback=None, escalate=None):
+        self.model = model
+        self.fallback = fallback or (lambda audio, language: model.transcribe(audio, fp16=fp16, language=language))
+        self.escalate = escalate or (lambda stats: False)
+        self.timings_of = timings_of or (lambda key: None)
+        self.batch_size = max(1, batch_size)
+        self.fp16 = fp16
+        self.tokenizer = whisper.tokenizer.get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages, task="transcribe"
+        )
+        self.parts = defaultdict(list)
+        self.errors = {}
+        self.batches = 0
+        self.fallbacks = 0
+        self._queue = []
+
+    def add(self, key, offset, audio):
+        self._queue.append((key, offset, audio))
+        if len(self._queue) >= self.batch_size:
+            self._run()
+
+    def flush(self):
+        if self._queue:
+            self._run()
+
+    def fail(self, key, error):
+        self.errors.setdefault(key, error)
+
+    def pending(self, key):
+        return any(k == key for k, _, _ in self._queue)
+
+    def pop(self, key):
+        """Kết quả của `key`: dict text / language / segments, hoặc ném lỗi đã gặp khi giải mã."""
+        parts = self.parts.pop(key, [])
+        error = self.errors.pop(key, None)
+        if error is not None:
+            raise error
+        return merge_parts(parts)
+
+    def _run(self):
+        batch, self._queue = self._queue, []
+        watch = Stopwatch()
+        try:
+            results = self._decode([audio for _, _, audio in batch])
+        except Exception as e:
+            for key, _, _ in batch:
+                self.fail(key, e)
+            return
+        self._charge(Counter(key for key, _, _ in batch), watch.stop())
+        self.batches += 1
+        for (key, offset, audio), result in zip(batch, results):
+            self.parts[key].append(self._to_part(key, offset, audio, result))
+
+    def _charge(self, counts, elapsed):
+        total = sum(counts.values())
+        for key, count in counts.items():
+            timings = self.timings_of(key)
+            if timings is not None:
+                share = count / total
+                timings.add("engine", *(value * share for value in elapsed), count=count)
+
+    def _decode(self, audios):
+        n_mels = self.model.dims.n_mels
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(whisper.pad_or_trim(torch.from_numpy(audio)), n_mels)
+            for audio in audios
+        ]).to(self.model.device)
+        options = whisper.DecodingOptions(task="transcribe", fp16=self.fp16, without_timestamps=False)
+        with torch.inference_mode():
+            return whisper.decode(self.model, mel, options)
+
+    def _to_part(self, key, offset, audio, result):
+        duration = len(audio) / SAMPLE_RATE
+        part = {"offset": offset, "language": result.language, "text": "", "segments": [],
+                "confidence": None, "duration": duration}
+
+        if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.avg_logprob < LOGPROB_THRESHOLD:
+            return part
+
+        stats = {"text": result.text, "avg_logprob": result.avg_logprob,
+                 "compression_ratio": result.compression_ratio, "no_speech_prob": result.no_speech_prob}
+        hard = result.compression_ratio > COMPRESSION_RATIO_THRESHOLD or result.avg_logprob < LOGPROB_THRESHOLD
+        if hard or self.escalate(stats):
+            # Giải mã lại riêng đoạn khó, dùng fallback nhiệt độ của whisper
+            self.fallbacks += 1
+            watch = Stopwatch()
+            single = self.fallback(audio, result.language)
+            self._charge({key: 1}, watch.stop())
+            segments = [(seg["start"], seg["end"], seg["text"].strip()) for seg in single.get("segments", [])]
+            part["text"] = single["text"].strip()
+            part["confidence"] = confidence.speech_confidence(single.get("segments", []))
+        else:
+            segments = self.split_segments(result.tokens, duration)
+            part["text"] = result.text.strip()
+            # whisper.decode chỉ có số liệu cho cả cửa sổ: cả đoạn chung một điểm
+            part["confidence"] = round(confidence.segment_confidence(stats), 2)
+
+        part["segments"] = [{
+            "start": round(offset + start, 2),
+            "end": round(offset + end, 2),
+            "text": text
+        } for start, end, text in segments if text]
+        return part
+
+    def split_segments(self, tokens, duration):
+        """Tách chuỗi token có timestamp (<|t0|> chữ <|t1|><|t1|> chữ ...) thành (start, end, text)."""
+        begin = self.tokenizer.timestamp_begin
+        eot = self.tokenizer.eot
+        segments = []
+        start = 0.0
+        text_tokens = []
+        for token in tokens:
+            if token >= begin:
+                time = min((token - begin) * TIME_PRECISION, duration)
+                if text_tokens:
+                    segments.append((start, time, text_tokens))
+                    text_tokens = []
+                start = time
+            elif token < eot:
+                text_tokens.append(token)
+        if text_tokens:
+            segments.append((start, duration, text_tokens))
+        return [(start, end, self.tokenizer.decode(toks).strip()) for start, end, toks in segments]
+
+
+def merge_parts(parts):
+    """Ghép các đoạn của một file theo thứ tự thời gian; ngôn ngữ lấy theo đoạn đầu tiên,
+    độ tin cậy là trung bình các đoạn có chữ theo thời lượng."""
+    parts = sorted(parts, key=lambda p: p["offset"])
+    return {
+        "text": " ".join(p["text"] for p in parts if p["text"]).strip(),
+        "language": parts[0]["language"] if parts else "unknown",
+        "segments": [seg for p in parts for seg in p["segments"]],
+        "confidence": confidence.weighted_mean((p["confidence"], p["duration"]) for p in parts if p["text"])
+    }
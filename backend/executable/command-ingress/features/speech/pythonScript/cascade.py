@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Cascade hai tầng: chép lời bằng mô hình nhanh (tiny / base / small) trước, chỉ những segment
+kém chắc chắn mới được giải mã lại bằng mô hình chính (lớn hơn) rồi ghép vào đúng vị trí.
+
+Segment "kém chắc chắn" dựa trên các chỉ số Whisper trả kèm mỗi segment:
+  - avg_logprob thấp          → mô hình nhanh không chắc về chữ
+  - compression_ratio cao     → lặp từ / ảo giác
+  - no_speech_prob cao        → không rõ là lời nói hay tạp âm
+Các segment kém liền nhau được gom thành một khoảng (≤ MAX_SPAN giây) để mô hình lớn có ngữ cảnh.
+
+Biến môi trường:
+  STT_CASCADE_MODEL        mô hình nhanh, vd. "tiny" / "base" (trống = tắt cascade)
+  STT_CASCADE_LOGPROB      ngưỡng avg_logprob (mặc định -0.6)
+  STT_CASCADE_COMPRESSION  ngưỡng compression_ratio (mặc định 2.0)
+  STT_CASCADE_NO_SPEECH    ngưỡng no_speech_prob (mặc định 0.5)
+"""
+import os
+
+SAMPLE_RATE = 16000
+FAST_MODEL = os.getenv("STT_CASCADE_MODEL", "").strip()
+LOGPROB_THRESHOLD = float(os.getenv("STT_CASCADE_LOGPROB", "-0.6"))
+COMPRESSION_THRESHOLD = float(os.getenv("STT_CASCADE_COMPRESSION", "2.0"))
+NO_SPEECH_THRESHOLD = float(os.getenv("STT_CASCADE_NO_SPEECH", "0.5"))
+# Đệm hai đầu khoảng cắt lại và độ dài tối đa một khoảng (một cửa sổ Whisper)
+PAD_SECONDS = 0.2
+MAX_SPAN = 30.0
+
+
+def params():
+    """Tham số ảnh hưởng kết quả, dùng làm khóa cache."""
+    return {"fast": FAST_MODEL, "logprob": LOGPROB_THRESHOLD,
+            "compression": COMPRESSION_THRESHOLD, "no_speech": NO_SPEECH_THRESHOLD}
+
+
+def needs_escalation(stats):
+    """`stats`: segment của model.transcribe hoặc dict tương tự (avg_logprob, compression_ratio,
+    no_speech_prob, text)."""
+    if not (stats.get("text") or "").strip():
+        return False
+    return (stats.get("avg_logprob", 0.0) < LOGPROB_THRESHOLD
+            or stats.get("compression_ratio", 0.0) > COMPRESSION_THRESHOLD
+            or stats.get("no_speech_prob", 0.0) > NO_SPEECH_THRESHOLD)
+
+
+def escalation_spans(segments):
+    """[(chỉ số đầu, chỉ số cuối)] của các dãy segment liền nhau cần giải mã lại."""
+    spans = []
+    for i, seg in enumerate(segments):
+        if not needs_escalation(seg):
+            continue
+        if spans and spans[-1][1] == i - 1 and seg["end"] - segments[spans[-1][0]]["start"] <= MAX_SPAN:
+            spans[-1] = (spans[-1][0], i)
+        else:
+            spans.append((i, i))
+    return spans
+
+
+def escalate(result, audio, transcribe_strong):
+    """Giải mã lại các khoảng kém chắc chắn của `result` (kết quả model.transcribe của mô hình nhanh).
+
+    `audio`: waveform float32 16 kHz mà `result` được chép từ.
+    `transcribe_strong(clip, language)` → kết quả model.transcribe của mô hình lớn cho đoạn cắt.
+    Trả (kết quả mới cùng dạng model.transcribe, số segment đã thay).
+    """
+    segments = result.get("segments", [])
+    spans = escalation_spans(segments)
+    if not spans:
+        return result, 0
+
+    duration = len(audio) / SAMPLE_RATE
+    language = result.get("language")
+    merged = []
+    replaced = 0
+    previous = 0
+    for first, last in spans:
+        merged.extend(segments[previous:first])
+        start = max(0.0, segments[first]["start"] - PAD_SECONDS)
+        end = min(duration, segments[last]["end"] + PAD_SECONDS)
+        clip = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        strong = transcribe_strong(clip, language)
+        # Giữ mốc thời gian trong khoảng gốc để không chồng lên segment bên cạnh
+        low, high = segments[first]["start"], segments[last]["end"]
+        merged.extend({**seg, "start": min(high, max(low, start + seg["start"])),
+                       "end": max(low, min(high, start + seg["end"]))}
+                      for seg in strong.get("segments", []))
+        replaced += last - first + 1
+        previous = last + 1
+    merged.extend(segments[previous:])
+
+    # Văn bản của Whisper là các segment nối liền (mỗi segment đã có khoảng trắng đầu)
+    return {**result, "text": "".join(seg["text"] for seg in merged), "segments": merged}, replaced
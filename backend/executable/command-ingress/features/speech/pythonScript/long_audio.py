@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Cắt âm thanh dài theo khoảng lặng (VAD năng lượng) để chép lời song song.
+Âm thanh được giải mã dần qua pipe ffmpeg nên không giữ toàn bộ waveform trong RAM.
+
+Nội dung file nhận thẳng qua stdin (`data`) được bơm vào ffmpeg qua pipe:0, riêng container mp4
+(m4a) có thể đặt chỉ mục (moov) ở cuối file nên phải ghi ra file tạm riêng để ffmpeg seek được.
+"""
+import os
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+FRAME_SAMPLES = 480  # 30 ms
+NEEDS_SEEK = ('.m4a', '.mp4', '.mov')
+
+
+@contextmanager
+def audio_input(name, data=None):
+    """Trả (nguồn cho ffmpeg, bytes cần bơm vào stdin hoặc None)."""
+    if data is None:
+        yield name, None
+        return
+    ext = os.path.splitext(name)[1].lower()
+    if ext not in NEEDS_SEEK:
+        yield "pipe:0", data
+        return
+    fd, tmp = tempfile.mkstemp(suffix=ext)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        yield tmp, None
+    finally:
+        os.remove(tmp)
+
+
+def _feed_stdin(proc, data):
+    """Ghi `data` vào stdin của ffmpeg ở luồng riêng để không nghẽn khi stdout đầy."""
+    def write():
+        try:
+            proc.stdin.write(data)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    return thread
+
+
+def probe_duration(audio_path, data=None):
+    """Độ dài file (giây) theo ffprobe, None nếu không đọc được."""
+    cmd = ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", audio_path]
+    try:
+        out = subprocess.run(cmd, input=data, capture_output=True, check=True).stdout.decode().strip()
+        return float(out)
+    except (OSError, subprocess.CalledProcessError, ValueError):
+        return None
+
+
+def stream_pcm(audio_path, block_seconds=5, data=None):
+    """Sinh các block float32 mono 16 kHz từ ffmpeg."""
+    cmd = [
+        "ffmpeg", "-nostdin" if data is None else "-hide_banner", "-threads", "0", "-i", audio_path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-",
+    ]
+    block_bytes = block_seconds * SAMPLE_RATE * 2
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE if data is not None else subprocess.DEVNULL,
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    feeder = _feed_stdin(proc, data) if data is not None else None
+    try:
+        while True:
+            raw = proc.stdout.read(block_bytes)
+            if not raw:
+                break
+            if len(raw) % 2:
+                raw = raw[:-1]
+            yield np.frombuffer(raw, np.int16).astype(np.float32) / 32768.0
+    finally:
+        proc.stdout.close()
+        if feeder:
+            feeder.join()
+        if proc.wait() != 0:
+            raise RuntimeError(f"ffmpeg không giải mã được: {os.path.basename(audio_path)}")
+
+
+def decode_pcm(audio_path, data=None):
+    """Giải mã toàn bộ file thành waveform float32 (dùng cho file ngắn)."""
+    blocks = list(stream_pcm(audio_path, data=data))
+    return np.concatenate(blocks) if blocks else np.zeros(0, np.float32)
+
+
+class VadChunker:
+    """Gom frame có tiếng nói thành đoạn dài tối đa `max_chunk` giây,
+    ưu tiên cắt ở khoảng lặng và bỏ hẳn các đoạn chỉ có im lặng."""
+
+    def __init__(self, threshold_db=-40.0, min_silence=0.5, min_chunk=5.0, max_chunk=30.0, pad=0.2, max_silence=2.0):
+        self.threshold_db = threshold_db
+        self.min_silence = int(min_silence * SAMPLE_RATE)
+        self.max_silence = int(max_silence * SAMPLE_RATE)
+        self.min_chunk = int(min_chunk * SAMPLE_RATE)
+        self.max_chunk = int(max_chunk * SAMPLE_RATE)
+        self.pad = int(pad * SAMPLE_RATE)
+
+        self.buf = np.zeros(0, np.float32)
+        self.buf_start = 0          # chỉ số mẫu (toàn cục) của buf[0]
+        self.chunk_start = None     # chỉ số mẫu bắt đầu đoạn đang gom
+        self.last_speech_end = 0
+        self.frame_db = []          # năng lượng các frame của đoạn đang gom
+        self.db_start = 0           # chỉ số mẫu của frame_db[0]
+        self._tail = np.zeros(0, np.float32)
+
+    def _slice(self, start, end):
+        return self.buf[start - self.buf_start:end - self.buf_start]
+
+    def _drop_before(self, index):
+        cut = max(0, index - self.buf_start)
+        self.buf = self.buf[cut:]
+        self.buf_start += cut
+
+    def _emit(self, end):
+        start = self.chunk_start
+        audio = self._slice(start, end).copy()
+        self.chunk_start = None
+        self.frame_db = []
+        return start / SAMPLE_RATE, audio
+
+    def feed(self, samples):
+        """Nạp thêm mẫu, trả về danh sách (offset_giây, audio) đã cắt xong."""
+        samples = np.concatenate([self._tail, samples])
+        n_frames = len(samples) // FRAME_SAMPLES
+        self._tail = samples[n_frames * FRAME_SAMPLES:]
+        if n_frames == 0:
+            return []
+
+        frames = samples[:n_frames * FRAME_SAMPLES]
+        first_index = self.buf_start + len(self.buf)
+        self.buf = np.concatenate([self.buf, frames])
+
+        rms = np.sqrt(np.mean(frames.reshape(n_frames, FRAME_SAMPLES) ** 2, axis=1))
+        db = 20 * np.log10(np.maximum(rms, 1e-10))
+        speech = db > self.threshold_db
+
+        chunks = []
+        for i in range(n_frames):
+            frame_start = first_index + i * FRAME_SAMPLES
+            frame_end = frame_start + FRAME_SAMPLES
+
+            if self.chunk_start is None:
+                if speech[i]:
+                    self.chunk_start = max(frame_start - self.pad, self.buf_start)
+                    self.last_speech_end = frame_end
+                    self.frame_db = [db[i]]
+                    self.db_start = frame_start
+                else:
+                    self._drop_before(frame_end - self.pad)
+                continue
+
+            self.frame_db.append(db[i])
+            if speech[i]:
+                self.last_speech_end = frame_end
+
+            silence_run = frame_end - self.last_speech_end
+            chunk_len = frame_end - self.chunk_start
+
+            if silence_run >= self.min_silence and (chunk_len >= self.min_chunk or silence_run >= self.max_silence):
+                chunks.append(self._emit(min(self.last_speech_end + self.pad, frame_end)))
+                self._drop_before(frame_end - self.pad)
+            elif chunk_len >= self.max_chunk:
+                # Không có khoảng lặng đủ dài → cắt ở frame nhỏ tiếng nhất trong 5 giây cuối
+                window = min(len(self.frame_db), int(5 * SAMPLE_RATE / FRAME_SAMPLES))
+                quietest = int(np.argmin(self.frame_db[-window:])) + len(self.frame_db) - window
+                cut = self.db_start + (quietest + 1) * FRAME_SAMPLES
+                remaining = self.frame_db[quietest + 1:]
+                chunks.append(self._emit(cut))
+                self._drop_before(cut)
+                if remaining:
+                    self.chunk_start = cut
+                    self.frame_db = remaining
+                    self.db_start = cut
+
+        return chunks
+
+    def flush(self):
+        if self.chunk_start is None:
+            return []
+        end = min(self.last_speech_end + self.pad, self.buf_start + len(self.buf))
+        return [self._emit(end)] if end > self.chunk_start else []
+
+
+def iter_speech_chunks(audio_path, data=None, **vad_options):
+    """Sinh (offset_giây, audio float32) cho từng đoạn có tiếng nói trong file."""
+    chunker = VadChunker(**vad_options)
+    for block in stream_pcm(audio_path, data=data):
+        yield from chunker.feed(block)
+    yield from chunker.flush()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot trọng số Whisper dạng memory-map.
+
+Checkpoint gốc của Whisper là fp16 và được torch.load đọc toàn bộ vào RAM rồi chép sang mô hình fp32,
+nên mỗi process tốn gấp đôi bộ nhớ lúc tải. Lần tải đầu tiên ghi lại state_dict fp32 ra
+<WHISPER_SNAPSHOT_DIR>/<model>.pt; các lần sau torch.load(mmap=True) + load_state_dict(assign=True)
+dùng thẳng trang file làm tensor: tải gần như tức thì và các worker cùng máy chia sẻ page cache.
+
+Chỉ dùng cho mô hình fp32 (STT_CPU_INT8=0). Lượng tử hóa int8 thay trọng số mọi lớp Linear bằng bản
+int8 đóng gói riêng của từng process (packed params được đóng gói lại khi nạp, không mmap được), nên với
+int8 snapshot gần như không còn gì để chia sẻ; khi đó whisper_cpu.py tải thẳng checkpoint gốc.
+
+Biến môi trường:
+  WHISPER_SNAPSHOT_DIR  thư mục snapshot (mặc định <download_root>/snapshots)
+  WHISPER_SNAPSHOT      =0 để tắt (luôn dùng whisper.load_model)
+"""
+import os
+import sys
+import tempfile
+from dataclasses import asdict
+
+from lazy_import import lazy_import
+
+torch = lazy_import("torch")
+whisper = lazy_import("whisper")
+
+SNAPSHOT_ENABLED = os.getenv("WHISPER_SNAPSHOT", "1").lower() not in ("0", "false", "no")
+SNAPSHOT_FORMAT = 1
+
+
+def snapshot_path(name, download_root):
+    root = os.getenv("WHISPER_SNAPSHOT_DIR") or os.path.join(download_root, "snapshots")
+    return os.path.join(root, f"{name}.v{SNAPSHOT_FORMAT}.pt")
+
+
+def save_snapshot(model, path):
+    state = model.state_dict()
+    # Buffer không lưu trong state_dict (mask, alignment_heads) được ghi riêng dưới dạng dense
+    extra = {}
+    for key, buf in model.named_buffers():
+        if key not in state:
+            extra[key] = {"tensor": buf.to_dense() if buf.is_sparse else buf, "sparse": buf.is_sparse}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    os.close(fd)
+    try:
+        torch.save({"dims": asdict(model.dims), "state": state, "buffers": extra}, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def load_snapshot(path):
+    checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    dims = whisper.model.ModelDimensions(**checkpoint["dims"])
+    # Dựng khung trên thiết bị meta (không cấp phát, không khởi tạo ngẫu nhiên) rồi gán tensor mmap
+    with torch.device("meta"):
+        model = whisper.model.Whisper(dims)
+    model.load_state_dict(checkpoint["state"], assign=True)
+    for key, entry in checkpoint["buffers"].items():
+        module_name, _, buffer_name = key.rpartition(".")
+        module = model.get_submodule(module_name) if module_name else model
+        tensor = entry["tensor"].to_sparse() if entry["sparse"] else entry["tensor"]
+        module.register_buffer(buffer_name, tensor, persistent=False)
+    leftover = [name for name, t in list(model.named_parameters()) + list(model.named_buffers()) if t.is_meta]
+    if leftover:
+        raise RuntimeError(f"Snapshot thiếu tensor: {leftover[:3]}")
+    return model.eval()
+
+
+def load_model(name, download_root, shared=True):
+    """Mô hình Whisper fp32 trên CPU, ưu tiên snapshot mmap; tạo snapshot ở lần tải đầu tiên.
+    `shared=False` (mô hình sắp bị lượng tử hóa): tải checkpoint gốc, không dùng / tạo snapshot."""
+    if not SNAPSHOT_ENABLED or not shared:
+        return whisper.load_model(name, device="cpu", download_root=download_root)
+
+    path = snapshot_path(name, download_root)
+    if os.path.exists(path):
+        try:
+            return load_snapshot(path)
+        except Exception as e:
+            print(f"[STT] Không dùng được snapshot {path}: {e}", file=sys.stderr)
+
+    model = whisper.load_model(name, device="cpu", download_root=download_root)
+    try:
+        save_snapshot(model, path)
+    except Exception as e:
+        print(f"[STT] Không ghi được snapshot {path}: {e}", file=sys.stderr)
+    return model
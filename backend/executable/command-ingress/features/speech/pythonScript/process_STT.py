@@ -2,10 +2,13 @@ import sys
 import os
 import io
 import json
-import torch
-import whisper
+import shutil
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
 from dotenv import load_dotenv
-import google.generativeai as genai
 
 # === Thiết lập mã hóa UTF-8 cho đầu ra console (Windows)
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
@@ -13,14 +16,35 @@ sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
 # === Thư mục gốc dự án ===
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
+sys.path.insert(0, os.path.join(BASE_DIR, '..', '..', '..', 'shared', 'pythonScript'))
+from worker import serve, env_int, check_stdin
+from result_cache import ResultCache, hash_file
+from frames import read_frames, hash_bytes
+from timing import Timings, use, stage, timed_iter, bind, pop_flags, profile, record_serialize
+from ndjson import stdout_emitter, file_record, summary_record
+from llm_cache import get_llm_cache
+from llm_client import GeminiClient
+from lazy_import import lazy_import
+import whisper_cpu
+import cascade
+import confidence
+
+# torch / whisper chỉ được import khi thật sự chép lời: kiểm tra tham số, sai định dạng
+# và trúng cache trả về ngay mà không phải chờ vài giây import + tải mô hình
+torch = lazy_import("torch")
+whisper = lazy_import("whisper")
+long_audio = lazy_import("long_audio")
+batch_decode = lazy_import("batch_decode")
+
 # === Load biến môi trường từ .env ===
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
 CUSTOM_FFMPEG_PATH = os.getenv("FFMPEG_PATH")
 CUSTOM_MODEL_PATH = os.getenv("WHISPER_MODEL_PATH")
-TOTAL_MEMORY_LARGE = float(os.getenv("TOTAL_MEMORY_LARGE"))
-TOTAL_MEMORY_MEDIUM = float(os.getenv("TOTAL_MEMORY_MEDIUM"))
-TOTAL_MEMORY_SMALL = float(os.getenv("TOTAL_MEMORY_SMALL"))
+# VRAM tối thiểu (GB) cho từng mô hình khi chạy CUDA
+TOTAL_MEMORY_LARGE = float(os.getenv("TOTAL_MEMORY_LARGE") or 10)
+TOTAL_MEMORY_MEDIUM = float(os.getenv("TOTAL_MEMORY_MEDIUM") or 5)
+TOTAL_MEMORY_SMALL = float(os.getenv("TOTAL_MEMORY_SMALL") or 2)
 
 # === Cấu hình đường dẫn FFMPEG ===
 if CUSTOM_FFMPEG_PATH:
@@ -30,16 +54,54 @@ else:
     os.environ["PATH"] += os.pathsep + default_ffmpeg
 
 # === Cấu hình Gemini (LLM từ Google) ===
-genai.configure(api_key=API_KEY)
-llm_model = genai.GenerativeModel(model_name="gemini-2.0-flash")
+LLM_MODEL_NAME = "gemini-2.0-flash"
+llm_client = GeminiClient(api_key=API_KEY, model=LLM_MODEL_NAME)
+llm_cache = get_llm_cache()
+
+DOWNLOAD_ROOT = CUSTOM_MODEL_PATH or os.path.join(BASE_DIR, '..', 'libraries', 'models_whisper')
+SUPPORTED_FORMATS = ['.mp3', '.m4a', '.webm', '.wav', '.flac', '.aac', '.ogg']
+
+# === Chế độ âm thanh dài: cắt theo khoảng lặng và chép lời song song
+LONG_AUDIO_SECONDS = float(os.getenv("STT_LONG_AUDIO_SECONDS", "600"))
+CHUNK_SECONDS = float(os.getenv("STT_CHUNK_SECONDS", "30"))
+VAD_THRESHOLD_DB = float(os.getenv("STT_VAD_THRESHOLD_DB", "-40"))
+PARALLEL_WORKERS = env_int("STT_PARALLEL_WORKERS", max(1, min(4, (os.cpu_count() or 2) // 2)))
+
+# === Giải mã theo batch: khi một lượt gọi có nhiều file ngắn, gom các đoạn ≤ 30 s của chúng thành batch.
+# Một file, file dài (≥ STT_LONG_AUDIO_SECONDS) hoặc --long vẫn chép lời từng file như cũ
+# (=1 để tắt hẳn batch)
+BATCH_SIZE = env_int("STT_BATCH_SIZE", 8)
+
+# === Cache kết quả chép lời theo nội dung file + mô hình (tăng PIPELINE_VERSION khi đổi cách xử lý)
+PIPELINE_VERSION = 2
+
+# Độ tin cậy tính từ avg_logprob / no_speech_prob của Whisper (confidence.py);
+# =1 để hỏi thêm LLM chấm điểm bản đã cải thiện và lấy trung bình
+LLM_CONFIDENCE = os.getenv("STT_LLM_CONFIDENCE", "0").lower() in ("1", "true", "yes")
 
 # === Chọn thiết bị xử lý ===
-device = "cuda" if torch.cuda.is_available() else "cpu"
-print(f"[DEVICE] whisper_device={device}", file=sys.stderr)
+_device = None
+
+def _cuda_possible():
+    """Kiểm tra rẻ trước khi import torch: máy không có driver NVIDIA thì chắc chắn chạy CPU."""
+    if os.getenv("CUDA_VISIBLE_DEVICES", None) in ("", "-1"):
+        return False
+    return os.path.exists("/dev/nvidia0") or shutil.which("nvidia-smi") is not None
+
+def get_device():
+    global _device
+    if _device is None:
+        forced = os.getenv("STT_DEVICE")
+        if forced:
+            _device = forced
+        else:
+            _device = "cuda" if _cuda_possible() and torch.cuda.is_available() else "cpu"
+        print(f"[DEVICE] whisper_device={_device}", file=sys.stderr)
+    return _device
 
-# === Tự động chọn mô hình Whisper phù hợp theo GPU ===
+# === Tự động chọn mô hình Whisper phù hợp theo GPU, hoặc theo RAM / số lõi khi chạy CPU ===
 def choose_model_name():
-    if device == "cuda":
+    if get_device() == "cuda":
         total_mem = torch.cuda.get_device_properties(0).total_memory / (1024 ** 3)
         if total_mem >= TOTAL_MEMORY_LARGE:
             return "large"
@@ -49,14 +111,92 @@ def choose_model_name():
             return "small"
         else:
             return "tiny"
-    return "small"
-
-MODEL_NAME = choose_model_name()
-DOWNLOAD_ROOT = CUSTOM_MODEL_PATH or os.path.join(BASE_DIR, '..', 'libraries', 'models_whisper')
-SUPPORTED_FORMATS = ['.mp3', '.m4a', '.webm', '.wav', '.flac', '.aac', '.ogg']
-
-print(f"Đang tải mô hình Whisper: {MODEL_NAME}", file=sys.stderr)
-model = whisper.load_model(MODEL_NAME, device=device, download_root=DOWNLOAD_ROOT)
+    return whisper_cpu.choose_cpu_model()
+
+_model_name = None
+_result_cache = None
+_models = {}
+_model_lock = threading.Lock()
+
+def get_model_name():
+    global _model_name
+    if _model_name is None:
+        _model_name = choose_model_name()
+    return _model_name
+
+def use_cpu_int8():
+    # Trên CPU: int8 (lượng tử hóa động) + số luồng tường minh
+    return get_device() == "cpu" and whisper_cpu.CPU_INT8
+
+def cascade_model_name():
+    """Mô hình nhanh khi bật cascade (STT_CASCADE_MODEL khác mô hình chính), ngược lại None."""
+    name = cascade.FAST_MODEL
+    return name if name and name != get_model_name() else None
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        params = {"model": get_model_name(), "int8": use_cpu_int8(), "version": PIPELINE_VERSION,
+                  "confidence": confidence.params()}
+        if cascade_model_name():
+            params["cascade"] = cascade.params()
+        _result_cache = ResultCache("stt", params)
+    return _result_cache
+
+def _load_model(name):
+    """Tải mô hình `name` một lần cho mỗi process (an toàn với nhiều luồng)."""
+    with _model_lock:
+        if name not in _models:
+            print(f"Đang tải mô hình Whisper: {name}", file=sys.stderr)
+            with stage("load"):
+                if get_device() == "cpu":
+                    whisper_cpu.configure_threads()
+                    _models[name] = whisper_cpu.load_cpu_model(name, DOWNLOAD_ROOT, int8=use_cpu_int8())
+                else:
+                    _models[name] = whisper.load_model(name, device=get_device(), download_root=DOWNLOAD_ROOT)
+    return _models[name]
+
+def get_model():
+    """Mô hình chính, tải ở lần chép lời đầu tiên."""
+    return _load_model(get_model_name())
+
+def get_fast_model():
+    """Mô hình tầng đầu của cascade, hoặc mô hình chính khi cascade tắt."""
+    name = cascade_model_name()
+    return _load_model(name) if name else get_model()
+
+def _transcribe_strong(audio, language=None):
+    return get_model().transcribe(audio, fp16=(get_device() == "cuda"), language=language,
+                                  condition_on_previous_text=False)
+
+def whisper_transcribe(audio, language=None):
+    """model.transcribe; khi bật cascade thì chạy mô hình nhanh rồi giải mã lại bằng mô hình chính
+    các segment kém chắc chắn (`audio` phải là waveform)."""
+    model = get_fast_model()
+    with stage("engine"):
+        result = model.transcribe(audio, fp16=(get_device() == "cuda"), language=language)
+    if not cascade_model_name():
+        return result
+
+    with stage("escalate"):
+        result, replaced = cascade.escalate(result, audio, _transcribe_strong)
+    if replaced:
+        print(f"[STT] cascade {cascade_model_name()} → {get_model_name()}: giải mã lại {replaced} segment",
+              file=sys.stderr)
+    return result
+
+def resources():
+    """Chi phí tài nguyên của một process chép lời: mô hình do choose_model_name chọn (+ mô hình
+    nhanh khi bật cascade), RAM và số luồng. Node dùng để xếp lịch job (--resources)."""
+    device = get_device()
+    models = [get_model_name()] + ([cascade_model_name()] if cascade_model_name() else [])
+    if device == "cpu":
+        memory = sum(whisper_cpu.model_memory_mb(name, use_cpu_int8()) for name in models)
+        cores = int(os.getenv("STT_NUM_THREADS", "0")) or whisper_cpu.cpu_cores()
+    else:
+        # Trọng số nằm trên GPU, RAM chỉ còn torch + CUDA runtime
+        memory, cores = 1500, 1
+    return {"device": device, "models": models, "memory_mb": memory, "cores": cores}
 
 # === Cải thiện kết quả văn bản bằng LLM (Gemini) ===
 def improve_transcription(text, lang="unknown", context=None):
@@ -99,8 +239,9 @@ If a sentence is unclear, try to rewrite it in the most contextually accurate wa
 """
 
     try:
-        response = llm_model.generate_content(prompt)
-        return response.text.strip() if response.text else "⚠️ Không có phản hồi từ LLM."
+        with stage("llm_refine"):
+            response = llm_client.generate(prompt, site="stt.improve_transcription")
+        return response.strip() if response else "⚠️ Không có phản hồi từ LLM."
     except Exception as e:
         return f"⚠️ Không thể cải thiện nội dung: {str(e)}"
 
@@ -114,25 +255,77 @@ Chỉ trả về một số duy nhất (không kèm giải thích).
 {text}
 """
     try:
-        response = llm_model.generate_content(prompt)
-        confidence_value = float(response.text.strip())
+        with stage("llm_confidence"):
+            response = llm_client.generate(prompt, site="stt.evaluate_confidence")
+        confidence_value = float(response.strip())
         return round(confidence_value, 2)
     except Exception as e:
         return None
 
 # === Hàm chuyển âm thanh thành văn bản và tách segment
-def transcribe(audio_path):
-    if not os.path.isfile(audio_path):
+def check_input(audio_path, data=None):
+    if data is None and not os.path.isfile(audio_path):
         raise FileNotFoundError(f"Không tìm thấy file: {audio_path}")
 
     ext = os.path.splitext(audio_path)[1].lower()
     if ext not in SUPPORTED_FORMATS:
         raise ValueError(f"Định dạng không hỗ trợ: {ext}")
 
-    result = model.transcribe(audio_path, fp16=(device == "cuda"))
+def transcribe(audio_path, long_mode=None, use_cache=True, data=None):
+    """`data`: nội dung file nhận qua stdin (khi đó `audio_path` chỉ là tên file)."""
+    check_input(audio_path, data)
+
+    if not use_cache or not get_result_cache().enabled:
+        return _transcribe_input(audio_path, long_mode, data)[0]
+
+    # Tra cache trước khi gọi ffprobe: độ dài file cố định theo nội dung nên mỗi file
+    # chỉ có một trong hai biến thể (ngắn / dài) được lưu
+    cache = get_result_cache()
+    content_hash = hash_bytes(data) if data is not None else hash_file(audio_path)
+    candidates = [long_mode] if long_mode is not None else [False, True]
+    # Một lượt tra = một lần trúng / trượt trong thống kê, dù phải dò cả hai biến thể
+    for candidate in candidates:
+        cached = cache.get(audio_path, content_hash, variant=long_variant(candidate), count=False)
+        if cached is not None:
+            cache.record(True)
+            return cached
+    cache.record(False)
+
+    result, long_mode = _transcribe_input(audio_path, long_mode, data)
+    cache.put(audio_path, result, content_hash, variant=long_variant(long_mode))
+    return result
+
+def _transcribe_input(audio_path, long_mode, data):
+    with long_audio.audio_input(audio_path, data) as (source, feed):
+        long_mode = resolve_long_mode(source, long_mode, feed)
+        return _transcribe(source, long_mode, feed), long_mode
+
+def resolve_long_mode(audio_path, long_mode, data=None):
+    if long_mode is None:
+        with stage("probe"):
+            duration = long_audio.probe_duration(audio_path, data)
+        long_mode = duration is not None and duration >= LONG_AUDIO_SECONDS
+    return long_mode
+
+def long_variant(long_mode):
+    return {"long": True, "chunk": CHUNK_SECONDS, "vad": VAD_THRESHOLD_DB} if long_mode else None
+
+def _transcribe(audio_path, long_mode, data=None):
+    if long_mode:
+        return transcribe_long(audio_path, data)
+
+    # Nội dung qua pipe: giải mã bằng ffmpeg thành waveform rồi đưa thẳng vào Whisper;
+    # cascade cần waveform để cắt lại các đoạn kém chắc chắn
+    if data is not None or cascade_model_name():
+        with stage("decode"):
+            audio = long_audio.decode_pcm(audio_path, data)
+    else:
+        audio = audio_path
+    result = whisper_transcribe(audio)
+    raw_segments = result.get("segments", [])
 
     segments = []
-    for seg in result.get("segments", []):
+    for seg in raw_segments:
         segments.append({
             "start": round(seg["start"], 2),
             "end": round(seg["end"], 2),
@@ -142,52 +335,340 @@ def transcribe(audio_path):
     return {
         "text": result["text"].strip(),
         "language": result.get("language", "unknown"),
-        "segments": segments
+        "segments": segments,
+        "confidence": confidence.speech_confidence(raw_segments)
     }
 
-# === Chạy như CLI
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Cách dùng: python process_STT.py <file1> <file2> ... [--context=ngữ_cảnh]", file=sys.stderr)
-        sys.exit(1)
+def _init_chunk_worker(threads):
+    whisper_cpu.configure_threads(threads)
+
+# Pool chép lời đoạn dùng chung cho mọi file dài của process: mỗi process con nạp mô hình Whisper
+# một lần rồi giữ lại cho các file sau. Dùng spawn (không fork) vì ở --serve process cha đã có
+# các luồng worker đang chạy.
+_chunk_pool = None
+_chunk_pool_lock = threading.Lock()
+
+def get_chunk_pool():
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is None:
+            threads = max(1, (os.cpu_count() or 1) // PARALLEL_WORKERS)
+            _chunk_pool = ProcessPoolExecutor(
+                PARALLEL_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_chunk_worker, initargs=(threads,)
+            )
+        return _chunk_pool
+
+def _drop_chunk_pool(pool):
+    """Bỏ pool hỏng (process con bị kill, hết RAM) để lần gọi sau tạo pool mới."""
+    global _chunk_pool
+    with _chunk_pool_lock:
+        if _chunk_pool is pool:
+            _chunk_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+def _transcribe_chunk(offset, audio, language=None):
+    result = whisper_transcribe(audio, language)
+    raw_segments = result.get("segments", [])
+    segments = []
+    for seg in raw_segments:
+        segments.append({
+            "start": round(offset + seg["start"], 2),
+            "end": round(offset + seg["end"], 2),
+            "text": seg["text"].strip()
+        })
+    return {
+        "offset": offset,
+        "text": result["text"].strip(),
+        "language": result.get("language", language or "unknown"),
+        "segments": segments,
+        "confidence": confidence.speech_confidence(raw_segments),
+        "duration": sum(seg["end"] - seg["start"] for seg in raw_segments)
+    }
+
+# === Chép lời file dài: đoạn đầu dùng để nhận diện ngôn ngữ, các đoạn sau chạy song song
+def transcribe_long(audio_path, data=None):
+    chunks = timed_iter("decode", long_audio.iter_speech_chunks(
+        audio_path, data=data, threshold_db=VAD_THRESHOLD_DB, max_chunk=CHUNK_SECONDS
+    ))
+    first = next(chunks, None)
+    if first is None:
+        return {"text": "", "language": "unknown", "segments": []}
+
+    head = _transcribe_chunk(*first)
+    language = head["language"]
+    parts = [head]
+
+    if PARALLEL_WORKERS <= 1 or get_device() == "cuda":
+        parts += [_transcribe_chunk(offset, audio, language) for offset, audio in chunks]
+    else:
+        pool = get_chunk_pool()
+        pending = set()
+        try:
+            for offset, audio in chunks:
+                # Giới hạn số đoạn đang chờ để bộ nhớ không tăng theo độ dài file
+                if len(pending) >= PARALLEL_WORKERS * 2:
+                    with stage("engine"):
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    parts += [f.result() for f in done]
+                pending.add(pool.submit(_transcribe_chunk, offset, audio, language))
+            # Các đoạn chạy ở process con: engine ở đây là thời gian chờ kết quả
+            with stage("engine"):
+                parts += [f.result() for f in pending]
+        except BrokenProcessPool:
+            _drop_chunk_pool(pool)
+            raise
+        finally:
+            for f in pending:
+                f.cancel()
+
+    parts.sort(key=lambda p: p["offset"])
+    print(f"[STT] {os.path.basename(audio_path)}: {len(parts)} đoạn, {PARALLEL_WORKERS} worker", file=sys.stderr)
+
+    return {
+        "text": " ".join(p["text"] for p in parts if p["text"]).strip(),
+        "language": language,
+        "segments": [seg for p in parts for seg in p["segments"]],
+        "confidence": confidence.weighted_mean((p["confidence"], p["duration"]) for p in parts)
+    }
 
+# === Chép lời nhiều file theo batch: đoạn VAD của mọi file được giải mã chung từng nhóm BATCH_SIZE
+def batch_variant():
+    return {"batch": True, "chunk": min(CHUNK_SECONDS, batch_decode.WINDOW_SECONDS), "vad": VAD_THRESHOLD_DB}
+
+def transcribe_batch(inputs, use_cache=True, file_timings=None):
+    """Sinh (chỉ số file, kết quả hoặc Exception) theo thứ tự file xong, không theo thứ tự vào.
+    `file_timings`: Timings của từng file; thời gian mỗi lượt giải mã chung được chia theo số đoạn."""
+    timings_of = (lambda index: file_timings[index]) if file_timings else (lambda index: None)
+    caching = use_cache and get_result_cache().enabled
+    todo = []
+    for index, (path, data) in enumerate(inputs):
+        try:
+            check_input(path, data)
+            content_hash = None
+            if caching:
+                content_hash = hash_bytes(data) if data is not None else hash_file(path)
+                cached = get_result_cache().get(path, content_hash, variant=batch_variant())
+                if cached is not None:
+                    yield index, cached
+                    continue
+            todo.append((index, path, data, content_hash))
+        except Exception as e:
+            yield index, e
+
+    if not todo:
+        return
+
+    with use(timings_of(todo[0][0])):
+        model = get_fast_model()
+    # Cascade: cả batch giải mã bằng mô hình nhanh, cửa sổ kém chắc chắn chuyển sang mô hình chính
+    escalation = {"fallback": _transcribe_strong, "escalate": cascade.needs_escalation} if cascade_model_name() else {}
+    decoder = batch_decode.BatchDecoder(model, BATCH_SIZE, fp16=(get_device() == "cuda"), timings_of=timings_of,
+                                        **escalation)
+    max_chunk = min(CHUNK_SECONDS, batch_decode.WINDOW_SECONDS)
+    chunks = 0
+
+    def finish(index, path, content_hash):
+        try:
+            output = decoder.pop(index)
+        except Exception as e:
+            return index, e
+        if content_hash is not None:
+            get_result_cache().put(path, output, content_hash, variant=batch_variant())
+        return index, output
+
+    waiting = []
+    for index, path, data, content_hash in todo:
+        try:
+            with use(timings_of(index)), long_audio.audio_input(path, data) as (source, feed):
+                for offset, audio in timed_iter("decode", long_audio.iter_speech_chunks(
+                    source, data=feed, threshold_db=VAD_THRESHOLD_DB, max_chunk=max_chunk
+                )):
+                    decoder.add(index, offset, audio)
+                    chunks += 1
+        except Exception as e:
+            decoder.fail(index, e)
+        waiting.append((index, path, content_hash))
+
+        # File không còn đoạn nào chờ giải mã thì trả ngay để bước LLM chạy song song với file sau
+        for item in [w for w in waiting if not decoder.pending(w[0])]:
+            waiting.remove(item)
+            yield finish(*item)
+
+    decoder.flush()
+    for item in waiting:
+        yield finish(*item)
+
+    print(f"[STT] batch: {len(todo)} file, {chunks} đoạn, {decoder.batches} lượt giải mã "
+          f"(batch {decoder.batch_size}), {decoder.fallbacks} đoạn giải mã lại", file=sys.stderr)
+
+def plan_inputs(inputs, long_mode, file_timings=None):
+    """Chia file thành (chỉ số giải mã batch, chỉ số chép lời từng file). Chỉ batch khi có từ hai file
+    ngắn trở lên; file dài đi qua transcribe_long để các đoạn chạy song song ở chunk pool."""
+    if BATCH_SIZE <= 1 or len(inputs) < 2 or long_mode:
+        return [], list(range(len(inputs)))
+    batch, each = [], []
+    for index, (path, data) in enumerate(inputs):
+        with use(file_timings[index] if file_timings else None), stage("probe"), \
+                long_audio.audio_input(path, data) as (source, feed):
+            duration = long_audio.probe_duration(source, feed)
+        # Không đọc được độ dài (file hỏng / sai định dạng): để batch báo lỗi như các file khác
+        (each if duration is not None and duration >= LONG_AUDIO_SECONDS else batch).append(index)
+    if len(batch) < 2:
+        return [], list(range(len(inputs)))
+    return batch, each
+
+def _subset(outputs, indices):
+    """Đổi chỉ số trong danh sách con về chỉ số trong danh sách file gốc."""
+    for local, output in outputs:
+        yield indices[local], output
+
+def transcribe_inputs(inputs, long_mode=None, use_cache=True, file_timings=None):
+    batch, each = plan_inputs(inputs, long_mode, file_timings)
+
+    def pick(indices):
+        return [inputs[i] for i in indices], [file_timings[i] for i in indices] if file_timings else None
+
+    if batch:
+        batch_inputs, batch_timings = pick(batch)
+        yield from _subset(transcribe_batch(batch_inputs, use_cache, batch_timings), batch)
+    if each:
+        each_inputs, each_timings = pick(each)
+        yield from _subset(transcribe_each(each_inputs, long_mode, use_cache, each_timings), each)
+
+def transcribe_each(inputs, long_mode=None, use_cache=True, file_timings=None):
+    for index, (path, data) in enumerate(inputs):
+        # Không yield bên trong use(): context của generator dùng chung với nơi gọi
+        with use(file_timings[index] if file_timings else None):
+            try:
+                output = transcribe(path, long_mode, use_cache, data)
+            except Exception as e:
+                output = e
+        yield index, output
+
+def refine_entry(entry, raw_text, lang, context):
+    improved = improve_transcription(raw_text, lang, context)
+    entry["text"] = improved
+    if LLM_CONFIDENCE:
+        llm_score = evaluate_confidence(improved)
+        if llm_score is not None:
+            local = entry.get("confidence")
+            entry["confidence"] = round((local + llm_score) / 2, 2) if local is not None else llm_score
+
+# === Xử lý một lượt gọi (dùng chung cho CLI và worker)
+def run(argv, frames=None, emit=None):
+    """`frames`: [(tên, bytes)] nội dung file nhận trực tiếp (worker hoặc --stdin-frames).
+    `emit`: gửi từng bản ghi NDJSON ngay khi có (--stream, xem ndjson.py)."""
+    argv, timings, profile_kind = pop_flags(argv)
     context = None
+    long_mode = None
+    use_cache = True
     args = []
-    for arg in sys.argv[1:]:
+    for arg in argv:
         if arg.startswith("--context="):
             context = arg.split("=", 1)[1]
+        elif arg == "--long":
+            long_mode = True
+        elif arg == "--no-cache":
+            use_cache = False
+        elif arg == "--stream":
+            continue
+        elif arg == "--stdin-frames":
+            if frames is None:
+                check_stdin("--stdin-frames")
+                frames = read_frames()
         else:
             args.append(arg)
 
-    results = []
-
-    for path in args:
-        entry = {"file": os.path.basename(path)}
+    inputs = frames if frames else [(path, None) for path in args]
+    if not inputs:
+        raise ValueError("Thiếu đường dẫn file âm thanh")
+
+    file_timings = [Timings() for _ in inputs] if timings else None
+    started = time.perf_counter()
+    with profile(profile_kind, "stt"):
+        results = process_inputs(inputs, long_mode, use_cache, context, file_timings, emit)
+
+    if emit:
+        emit(summary_record(results, time.perf_counter() - started))
+    get_result_cache().log_stats()
+    llm_cache.log_stats()
+    return results
+
+def process_inputs(inputs, long_mode, use_cache, context, file_timings=None, emit=None):
+    """`emit`: bản ghi segment ngay khi một file chép lời xong, bản ghi file khi file đó xong cả bước LLM."""
+    results = [None] * len(inputs)
+    pending = []
+
+    def complete(index):
+        entry = results[index]
+        if file_timings:
+            entry["timings"] = file_timings[index].as_dict()
+        if emit:
+            emit(file_record(index, entry["file"], entry))
+
+    def on_refined(future, index):
+        # Lỗi của bước LLM được ném lại ở future.result() bên dưới
+        if future.exception() is None:
+            complete(index)
+
+    for index, output in transcribe_inputs(inputs, long_mode, use_cache, file_timings):
+        name = os.path.basename(inputs[index][0])
+        entry = {"file": name}
+        results[index] = entry
         try:
-            output = transcribe(path)
+            if isinstance(output, Exception):
+                raise output
             raw_text = output["text"]
             lang = output["language"]
             segments = output.get("segments", [])
             entry["language"] = lang
             entry["segments"] = segments
+            if output.get("confidence") is not None:
+                entry["confidence"] = output["confidence"]
+            if emit:
+                for segment in segments:
+                    emit({"type": "segment", "index": index, "file": name, **segment})
 
             if not raw_text.strip():
                 entry["text"] = ""
                 entry["warning"] = "⚠️ Không nhận diện được nội dung trong âm thanh."
             else:
-                improved = improve_transcription(raw_text, lang, context)
-                confidence = evaluate_confidence(improved)
-                entry["text"] = improved
-                if confidence is not None:
-                    entry["confidence"] = confidence
+                # Gọi LLM ở luồng nền để file kế tiếp được chép lời song song
+                with use(file_timings[index] if file_timings else None):
+                    task = bind(refine_entry)
+                future = llm_client.executor.submit(task, entry, raw_text, lang, context)
+                future.add_done_callback(lambda f, i=index: on_refined(f, i))
+                pending.append(future)
+                continue
 
         except Exception as e:
             entry["error"] = str(e)
 
-        results.append(entry)
+        complete(index)
 
-    print(json.dumps(results, ensure_ascii=False, indent=2))
+    for future in pending:
+        future.result()
+    return results
 
+# === Chạy như CLI
+if __name__ == "__main__":
+    if "--serve" in sys.argv[1:]:
+        # Whisper không an toàn khi nhiều luồng dùng chung một model → mặc định 1 job một lúc
+        serve(run, max_concurrency=env_int("STT_WORKER_CONCURRENCY", 1))
+        sys.exit(0)
+
+    if "--resources" in sys.argv[1:]:
+        print(json.dumps(resources()))
+        sys.exit(0)
 
+    if len(sys.argv) < 2:
+        print("Cách dùng: python process_STT.py (<file1> <file2> ... | --stdin-frames) [--context=ngữ_cảnh] [--long] [--no-cache] [--stream] | --serve | --resources", file=sys.stderr)
+        sys.exit(1)
 
+    if "--stream" in sys.argv[1:]:
+        run(sys.argv[1:], emit=stdout_emitter())
+        sys.exit(0)
 
+    results = record_serialize(run(sys.argv[1:]), ensure_ascii=False, indent=2)
+    print(json.dumps(results, ensure_ascii=False, indent=2))
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Chạy Whisper trên CPU:
+  - chọn mô hình theo RAM còn trống và số lõi (thay vì luôn "small")
+  - lượng tử hóa động int8 các lớp Linear (trọng số int8, kích hoạt lượng tử hóa khi chạy)
+  - đặt số luồng intra-op của torch một cách tường minh
+
+int8 hay fp32: int8 tốn ~0.55 lần RAM mỗi process và nhanh hơn, nhưng trọng số đã lượng tử hóa là bản
+riêng của từng process và phải lượng tử hóa lại mỗi lần nạp. fp32 (STT_CPU_INT8=0) nạp từ snapshot mmap
+(model_snapshot.py) nên các worker trên cùng máy dùng chung một bản trọng số trong page cache: chạy
+nhiều worker STT cùng lúc thì fp32 thường tốn ít RAM tổng hơn.
+
+Biến môi trường:
+  STT_CPU_INT8            =0 để chạy fp32 như cũ (mặc định 1)
+  STT_NUM_THREADS         số luồng intra-op (mặc định = số lõi)
+  STT_CPU_MEMORY_MEDIUM   RAM trống tối thiểu (GB) để dùng "medium" (mặc định 6)
+  STT_CPU_MEMORY_SMALL    RAM trống tối thiểu (GB) để dùng "small" (mặc định 2)
+  STT_CPU_CORES_MEDIUM    số lõi tối thiểu để dùng "medium" (mặc định 8)
+"""
+import os
+import sys
+
+from lazy_import import lazy_import
+import model_snapshot
+
+torch = lazy_import("torch")
+whisper = lazy_import("whisper")
+
+CPU_INT8 = os.getenv("STT_CPU_INT8", "1").lower() not in ("0", "false", "no")
+MEMORY_MEDIUM = float(os.getenv("STT_CPU_MEMORY_MEDIUM", "6"))
+MEMORY_SMALL = float(os.getenv("STT_CPU_MEMORY_SMALL", "2"))
+CORES_MEDIUM = int(os.getenv("STT_CPU_CORES_MEDIUM", "8"))
+
+# RSS gần đúng (MB) của một process đã nạp mô hình fp32 trên CPU, gồm cả torch
+MODEL_MEMORY_MB = {"tiny": 450, "base": 550, "small": 1100, "medium": 2700, "large": 5200, "turbo": 3300}
+# int8 chỉ lượng tử hóa các lớp Linear (phần lớn trọng số), embedding và torch giữ nguyên
+INT8_MEMORY_FACTOR = 0.55
+
+
+def available_memory_gb():
+    """RAM còn dùng được (GB): MemAvailable trên Linux, sysconf nếu có, None nếu không xác định."""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / (1024 ** 2)
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_AVPHYS_PAGES") / (1024 ** 3)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def cpu_cores():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def choose_cpu_model(memory_gb=None, cores=None):
+    memory_gb = available_memory_gb() if memory_gb is None else memory_gb
+    cores = cpu_cores() if cores is None else cores
+    if memory_gb is None:
+        return "small"
+    if memory_gb >= MEMORY_MEDIUM and cores >= CORES_MEDIUM:
+        return "medium"
+    if memory_gb >= MEMORY_SMALL:
+        return "small"
+    return "base"
+
+
+def model_memory_mb(name, int8=CPU_INT8):
+    """Ước lượng RAM (MB) để chạy mô hình `name` trên CPU, dùng cho bộ lập lịch phía Node."""
+    base = MODEL_MEMORY_MB.get(name.split(".")[0].split("-")[0], MODEL_MEMORY_MB["large"])
+    return round(base * INT8_MEMORY_FACTOR) if int8 else base
+
+
+def configure_threads(threads=None):
+    threads = threads or int(os.getenv("STT_NUM_THREADS", "0")) or cpu_cores()
+    torch.set_num_threads(threads)
+    return threads
+
+
+def quantize_int8(model):
+    """Lượng tử hóa động int8 các lớp Linear của Whisper (tại chỗ).
+
+    whisper.model.Linear là lớp con của nn.Linear (chỉ ép kiểu trọng số theo input),
+    quantize_dynamic chỉ nhận đúng kiểu nn.Linear nên phải đổi lớp trước khi lượng tử hóa.
+    Embedding token (dùng làm lớp chiếu đầu ra) giữ nguyên fp32.
+    """
+    for module in model.modules():
+        if type(module) is whisper.model.Linear:
+            module.__class__ = torch.nn.Linear
+    torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return model
+
+
+def load_cpu_model(name, download_root=None, int8=CPU_INT8):
+    # Snapshot mmap chỉ có ích khi trọng số giữ nguyên fp32 (xem model_snapshot.py)
+    model = model_snapshot.load_model(name, download_root, shared=not int8)
+    model.eval()
+    if int8:
+        quantize_int8(model)
+    print(f"[STT] CPU model={name} int8={int8} threads={torch.get_num_threads()}", file=sys.stderr)
+    return model
@@ -0,0 +1,23 @@
+// shared/frames.ts
+import { ChildProcessWithoutNullStreams } from 'child_process';
+
+export type FrameFile = { name: string; data: Buffer };
+
+/**
+ * Đóng gói một file thành frame để gửi thẳng vào stdin của script Python (`--stdin-frames`):
+ * [4 byte big-endian: độ dài header][header JSON: {"name", "size"}][nội dung].
+ * Phía Python tương ứng: shared/pythonScript/frames.py.
+ */
+export function encodeFrame(name: string, data: Buffer): Buffer {
+    const header = Buffer.from(JSON.stringify({ name, size: data.length }), 'utf-8');
+    const prefix = Buffer.alloc(4);
+    prefix.writeUInt32BE(header.length, 0);
+    return Buffer.concat([prefix, header, data]);
+}
+
+export function writeFrames(python: ChildProcessWithoutNullStreams, files: FrameFile[]) {
+    // Script có thể thoát sớm (lỗi tham số) → bỏ qua EPIPE, lỗi thật đã nằm ở stderr / mã thoát
+    python.stdin.on('error', () => { });
+    for (const file of files) python.stdin.write(encodeFrame(file.name, file.data));
+    python.stdin.end();
+}
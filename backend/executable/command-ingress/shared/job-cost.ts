@@ -0,0 +1,131 @@
+// shared/job-cost.ts
+import os from 'os';
+import path from 'path';
+import { spawn } from 'child_process';
+import { FrameFile } from './frames';
+import { JobCost } from './scheduler';
+import { isPythonWorkerMode } from './python-worker';
+
+/**
+ * Ước lượng chi phí (RAM, số lõi) của từng loại job Python cho ResourceScheduler.
+ * Ở chế độ worker, interpreter + thư viện + mô hình đã thường trú (đã nằm trong MemAvailable)
+ * nên chỉ tính phần bộ nhớ làm việc của job.
+ */
+const MB = 1024 * 1024;
+
+// Process Python mới: interpreter + numpy / cv2 / python-docx ...
+const PYTHON_PROCESS_MB = 120;
+// Ảnh OCR: RGB + xám + vùng chữ scale theo cỡ chữ (MAX_SCALE = 3) và tile, xem ocr_preprocess.py
+const OCR_BYTES_PER_PIXEL = 12;
+// PDF / TIFF hoặc ảnh không đọc được kích thước: coi như trang A4 ở 300 DPI (page_source.py)
+const DEFAULT_PAGE_PIXELS = 2480 * 3508;
+// Số trang cùng lúc trong bộ nhớ khi OCR file nhiều trang (OCR_PAGE_WORKERS + OCR_PAGE_QUEUE_SIZE)
+const PAGES_IN_FLIGHT = 4;
+
+const processMb = (mb: number) => (isPythonWorkerMode() ? 0 : mb);
+
+/** (rộng, cao) đọc từ header PNG / JPEG / BMP / GIF / WebP, null nếu không nhận ra. */
+export function imageSize(data: Buffer): { width: number; height: number } | null {
+    if (data.length < 30) return null;
+    if (data.readUInt32BE(0) === 0x89504e47) {
+        return { width: data.readUInt32BE(16), height: data.readUInt32BE(20) };
+    }
+    if (data.toString('ascii', 0, 2) === 'BM') {
+        return { width: data.readInt32LE(18), height: Math.abs(data.readInt32LE(22)) };
+    }
+    if (data.toString('ascii', 0, 3) === 'GIF') {
+        return { width: data.readUInt16LE(6), height: data.readUInt16LE(8) };
+    }
+    if (data.toString('ascii', 0, 4) === 'RIFF' && data.toString('ascii', 8, 12) === 'WEBP') {
+        const chunk = data.toString('ascii', 12, 16);
+        if (chunk === 'VP8X') return { width: data.readUIntLE(24, 3) + 1, height: data.readUIntLE(27, 3) + 1 };
+        if (chunk === 'VP8 ') return { width: data.readUInt16LE(26) & 0x3fff, height: data.readUInt16LE(28) & 0x3fff };
+        if (chunk === 'VP8L') {
+            const bits = data.readUInt32LE(21);
+            return { width: (bits & 0x3fff) + 1, height: ((bits >> 14) & 0x3fff) + 1 };
+        }
+        return null;
+    }
+    if (data[0] === 0xff && data[1] === 0xd8) {
+        // Duyệt các marker tới SOFn (trừ DHT / JPG / DAC) để lấy kích thước
+        let offset = 2;
+        while (offset + 9 < data.length) {
+            if (data[offset] !== 0xff) return null;
+            const marker = data[offset + 1];
+            if (marker >= 0xc0 && marker <= 0xcf && ![0xc4, 0xc8, 0xcc].includes(marker)) {
+                return { width: data.readUInt16BE(offset + 7), height: data.readUInt16BE(offset + 5) };
+            }
+            offset += 2 + data.readUInt16BE(offset + 2);
+        }
+    }
+    return null;
+}
+
+function ocrFileBytes(file: FrameFile): number {
+    const size = imageSize(file.data);
+    if (size) return size.width * size.height * OCR_BYTES_PER_PIXEL;
+    return DEFAULT_PAGE_PIXELS * OCR_BYTES_PER_PIXEL * PAGES_IN_FLIGHT;
+}
+
+/** OCR chạy song song `workers` ảnh (process_OCR.py: OCR_WORKERS, mặc định số lõi). */
+export function ocrCost(files: FrameFile[]): JobCost {
+    const workers = Math.max(1, Math.min(Number(process.env.OCR_WORKERS) || os.cpus().length, files.length));
+    const largest = files.map(ocrFileBytes).sort((a, b) => b - a).slice(0, workers);
+    const pool = workers > 1 ? workers * processMb(PYTHON_PROCESS_MB) : 0;
+    return {
+        memoryMb: processMb(PYTHON_PROCESS_MB) + pool + largest.reduce((a, b) => a + b, 0) / MB,
+        cores: workers,
+    };
+}
+
+export function docxCost(files: FrameFile[]): JobCost {
+    // XML đã giải nén của docx lớn gấp vài lần file zip
+    const bytes = files.reduce((n, f) => n + f.data.length, 0);
+    return { memoryMb: processMb(80) + (bytes * 8) / MB, cores: 1 };
+}
+
+/** Insight / gộp use case chủ yếu chờ Gemini nên chiếm rất ít lõi. */
+export function insightCost(textLength = 0): JobCost {
+    return { memoryMb: processMb(80) + (textLength * 16) / MB, cores: 0.1 };
+}
+
+export type SttResources = { device: string; models: string[]; memory_mb: number; cores: number };
+
+const sttResources = new Map<string, Promise<SttResources>>();
+
+/**
+ * Mô hình Whisper mà process_STT.py sẽ dùng (choose_model_name, cascade) cùng RAM / số luồng của nó,
+ * hỏi script một lần (`--resources`) rồi dùng lại.
+ */
+export function loadSttResources(scriptPath: string): Promise<SttResources> {
+    let cached = sttResources.get(scriptPath);
+    if (!cached) {
+        const fallback: SttResources = { device: 'cpu', models: [], memory_mb: 1500, cores: os.cpus().length };
+        cached = new Promise<SttResources>((resolve) => {
+            const python = spawn('python', [scriptPath, '--resources']);
+            let stdout = '';
+            python.stdout.on('data', (data) => (stdout += data.toString()));
+            python.on('error', () => resolve(fallback));
+            python.on('close', (code) => {
+                try {
+                    resolve(code === 0 ? JSON.parse(stdout) : fallback);
+                } catch (e) {
+                    resolve(fallback);
+                }
+            });
+        });
+        cached.then((r) => console.log(`[SCHED] STT ${path.basename(scriptPath)}: ${JSON.stringify(r)}`));
+        sttResources.set(scriptPath, cached);
+    }
+    return cached;
+}
+
+/** Mô hình (nếu phải nạp trong process mới) + waveform float32 16 kHz của các file. */
+export function sttCost(files: FrameFile[], resources: SttResources): JobCost {
+    // Âm thanh nén ~128 kbps → waveform float32 16 kHz lớn hơn khoảng 4 lần
+    const bytes = files.reduce((n, f) => n + f.data.length, 0) * 4;
+    return {
+        memoryMb: processMb(resources.memory_mb) + 100 + bytes / MB,
+        cores: resources.cores,
+    };
+}
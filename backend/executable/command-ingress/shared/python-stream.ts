@@ -0,0 +1,72 @@
+// shared/python-stream.ts
+import { spawn } from 'child_process';
+import readline from 'readline';
+import { getPythonWorkerPool, isPythonWorkerMode } from './python-worker';
+import { FrameFile, writeFrames } from './frames';
+
+/** Một dòng NDJSON của script chạy `--stream` (xem shared/pythonScript/ndjson.py). */
+export type StreamRecord = {
+    type: 'page' | 'segment' | 'file' | 'summary';
+    index?: number;
+    file?: string;
+    [key: string]: any;
+};
+
+export type StreamHandlers = {
+    /** Kết quả cuối của file thứ `index` (cùng dạng phần tử khi chạy không stream). */
+    onFile?: (entry: any, index: number) => void;
+    /** Mọi bản ghi, kể cả page / segment / summary. */
+    onRecord?: (record: StreamRecord) => void;
+};
+
+/**
+ * Chạy script Python ở chế độ stream: worker thường trú (job "stream") hoặc process riêng với
+ * `--stdin-frames --stream`, đọc stdout từng dòng thay vì chờ cả mảng JSON ở cuối.
+ * `onFile` được gọi ngay khi từng file xong để bước sau (insight) chạy chồng lên bước trích xuất.
+ * Kết quả trả về sắp theo thứ tự file đầu vào, giống chế độ không stream.
+ */
+export function streamPython(
+    scriptPath: string,
+    args: string[],
+    files: FrameFile[],
+    handlers: StreamHandlers = {},
+): Promise<any[]> {
+    const results: any[] = new Array(files.length);
+    const onRecord = (record: StreamRecord) => {
+        handlers.onRecord?.(record);
+        if (record.type !== 'file' || record.index === undefined) return;
+        const { type: _type, index, ...entry } = record;
+        results[index] = entry;
+        handlers.onFile?.(entry, index);
+    };
+
+    if (isPythonWorkerMode()) {
+        return getPythonWorkerPool(scriptPath).stream(args, files, onRecord).then(() => results);
+    }
+
+    return new Promise((resolve, reject) => {
+        const python = spawn('python', [scriptPath, '--stdin-frames', '--stream', ...args]);
+        writeFrames(python, files);
+
+        let stderr = '';
+        const lines = readline.createInterface({ input: python.stdout });
+        lines.on('line', (line) => {
+            if (!line.trim()) return;
+            let record: StreamRecord;
+            try {
+                record = JSON.parse(line);
+            } catch (e) {
+                console.warn('⚠️ Dòng NDJSON không hợp lệ từ Python:', line);
+                return;
+            }
+            onRecord(record);
+        });
+
+        python.stderr.on('data', (data) => (stderr += data.toString()));
+        python.on('error', (err) => reject(err));
+        python.on('close', (code) => {
+            if (code !== 0) return reject(new Error(stderr || `Python exited with code ${code}`));
+            resolve(results);
+        });
+    });
+}
@@ -0,0 +1,145 @@
+// shared/python-worker.ts
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process';
+import readline from 'readline';
+import env from '../utils/env';
+import { FrameFile } from './frames';
+
+type PendingJob = {
+    resolve: (value: any) => void;
+    reject: (reason: any) => void;
+    onEvent?: (record: any) => void;
+};
+
+/**
+ * Một process Python thường trú chạy script với cờ `--serve`.
+ * Model / cấu hình chỉ nạp một lần, các job gửi qua stdin theo dạng JSON-lines.
+ * Nội dung file (nếu có) đi kèm job dưới dạng base64 nên không cần ghi ra ổ đĩa.
+ */
+export class PythonWorker {
+    private python?: ChildProcessWithoutNullStreams;
+    private pending = new Map<number, PendingJob>();
+    private nextId = 1;
+
+    constructor(private readonly scriptPath: string) { }
+
+    get load(): number {
+        return this.pending.size;
+    }
+
+    run(args: string[], files?: FrameFile[]): Promise<any> {
+        return this.send(args, files);
+    }
+
+    /**
+     * Job dạng stream: mỗi bản ghi NDJSON của script được chuyển cho `onEvent` ngay khi tới,
+     * promise xong khi script gửi {"done": true}.
+     */
+    stream(args: string[], files: FrameFile[] | undefined, onEvent: (record: any) => void): Promise<void> {
+        return this.send(args, files, onEvent);
+    }
+
+    private send(args: string[], files?: FrameFile[], onEvent?: (record: any) => void): Promise<any> {
+        const python = this.ensureStarted();
+        const id = this.nextId++;
+        const job: any = { id, args };
+        if (files?.length) {
+            job.files = files.map((f) => ({ name: f.name, data: f.data.toString('base64') }));
+        }
+        if (onEvent) job.stream = true;
+
+        return new Promise((resolve, reject) => {
+            this.pending.set(id, { resolve, reject, onEvent });
+            python.stdin.write(JSON.stringify(job) + '\n');
+        });
+    }
+
+    private ensureStarted(): ChildProcessWithoutNullStreams {
+        if (this.python) return this.python;
+
+        const python = spawn('python', [this.scriptPath, '--serve']);
+        this.python = python;
+
+        const lines = readline.createInterface({ input: python.stdout });
+        lines.on('line', (line) => this.onLine(line));
+
+        python.stderr.on('data', (data) => console.error('[PYTHON WORKER STDERR]', data.toString()));
+
+        const fail = (reason: string) => {
+            if (this.python === python) this.python = undefined;
+            for (const job of this.pending.values()) job.reject(new Error(reason));
+            this.pending.clear();
+        };
+        python.on('error', (err) => fail(`Không thể khởi động Python worker: ${err.message}`));
+        python.on('exit', (code) => fail(`Python worker đã dừng với mã ${code}`));
+
+        return python;
+    }
+
+    private onLine(line: string) {
+        let message: any;
+        try {
+            message = JSON.parse(line);
+        } catch (e) {
+            console.warn('⚠️ Dòng không hợp lệ từ Python worker:', line);
+            return;
+        }
+        if (message.ready) return;
+
+        const job = this.pending.get(message.id);
+        if (!job) return;
+        if (message.event) {
+            job.onEvent?.(message.event);
+            return;
+        }
+        this.pending.delete(message.id);
+
+        if (message.error) job.reject(new Error(message.error));
+        else job.resolve(message.done ? undefined : message.result);
+    }
+
+    stop() {
+        this.python?.stdin.end();
+    }
+}
+
+/**
+ * Nhóm nhỏ worker cho một script, job mới được giao cho worker đang rảnh nhất.
+ */
+export class PythonWorkerPool {
+    private workers: PythonWorker[];
+
+    constructor(scriptPath: string, size: number) {
+        this.workers = Array.from({ length: Math.max(1, size) }, () => new PythonWorker(scriptPath));
+    }
+
+    run(args: string[], files?: FrameFile[]): Promise<any> {
+        return this.idlest().run(args, files);
+    }
+
+    stream(args: string[], files: FrameFile[] | undefined, onEvent: (record: any) => void): Promise<void> {
+        return this.idlest().stream(args, files, onEvent);
+    }
+
+    private idlest(): PythonWorker {
+        return this.workers.reduce((a, b) => (b.load < a.load ? b : a));
+    }
+
+    stop() {
+        this.workers.forEach((w) => w.stop());
+    }
+}
+
+const pools = new Map<string, PythonWorkerPool>();
+
+export const isPythonWorkerMode = (): boolean => env.PYTHON_WORKER_MODE;
+
+export function getPythonWorkerPool(scriptPath: string): PythonWorkerPool {
+    let pool = pools.get(scriptPath);
+    if (!pool) {
+        pool = new PythonWorkerPool(scriptPath, env.PYTHON_WORKER_POOL_SIZE);
+        pools.set(scriptPath, pool);
+    }
+    return pool;
+}
+
+process.on('exit', () => pools.forEach((pool) => pool.stop()));
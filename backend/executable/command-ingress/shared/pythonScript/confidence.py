@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+"""
+Độ tin cậy 0–100 tính tại chỗ từ số liệu của engine, thay cho lượt hỏi LLM "chấm điểm" riêng
+(tốn một round trip mỗi file và mỗi lần hỏi ra một số khác).
+
+Giọng nói (Whisper), mỗi segment:
+    điểm = 100 · sigmoid(SLOPE · avg_logprob + INTERCEPT)
+  hiệu chỉnh để avg_logprob ≈ -0.15 (giọng rõ, headset) → ~95 và ≈ -1.0 (ngưỡng fallback của
+  Whisper) → ~30; segment có no_speech_prob cao (dễ là ảo giác trên tạp âm) hoặc lặp từ
+  (compression_ratio cao) bị trừ điểm. Điểm cả file là trung bình theo thời lượng segment.
+
+OCR (Tesseract):
+  trung bình conf của từ theo độ dài, trừ theo tỉ lệ ký tự nằm trong từ conf thấp (phân bố lệch
+  về phía thấp thì điểm giảm dù trung bình còn cao), rồi trừ theo mức LLM phải sửa văn bản
+  (khoảng cách chỉnh sửa theo ký tự giữa bản thô và bản đã sửa).
+
+Biến môi trường (hệ số hiệu chỉnh, fit lại khi có dữ liệu gán nhãn):
+  CONF_STT_SLOPE / CONF_STT_INTERCEPT   (mặc định 4.5 / 3.6)
+  CONF_OCR_LOW_WORD                     conf dưới ngưỡng này là từ "kém" (mặc định 60)
+  CONF_OCR_EDIT_WEIGHT                  mức trừ khi văn bản bị sửa hoàn toàn (mặc định 0.5)
+"""
+import os
+import math
+import difflib
+
+from lazy_import import lazy_import
+
+# Chỉ phần OCR cần numpy; STT tính điểm không phải nạp
+np = lazy_import("numpy")
+
+STT_SLOPE = float(os.getenv("CONF_STT_SLOPE", "4.5"))
+STT_INTERCEPT = float(os.getenv("CONF_STT_INTERCEPT", "3.6"))
+NO_SPEECH_FLOOR = 0.3
+COMPRESSION_LIMIT = 2.4
+
+OCR_LOW_WORD = float(os.getenv("CONF_OCR_LOW_WORD", "60"))
+OCR_LOW_WEIGHT = 0.5
+OCR_EDIT_WEIGHT = float(os.getenv("CONF_OCR_EDIT_WEIGHT", "0.5"))
+
+
+def params():
+    """Hệ số ảnh hưởng điểm, dùng làm khóa cache."""
+    return {"stt": [STT_SLOPE, STT_INTERCEPT], "ocr": [OCR_LOW_WORD, OCR_EDIT_WEIGHT]}
+
+
+# === Giọng nói
+def segment_confidence(seg):
+    """`seg`: segment của model.transcribe hoặc dict cùng khóa (avg_logprob, no_speech_prob, compression_ratio)."""
+    x = STT_SLOPE * seg.get("avg_logprob", 0.0) + STT_INTERCEPT
+    score = 1.0 / (1.0 + math.exp(-x))
+    no_speech = seg.get("no_speech_prob", 0.0)
+    if no_speech > NO_SPEECH_FLOOR:
+        score *= 1.0 - 0.5 * (no_speech - NO_SPEECH_FLOOR) / (1.0 - NO_SPEECH_FLOOR)
+    if seg.get("compression_ratio", 0.0) > COMPRESSION_LIMIT:
+        score *= 0.5
+    return 100.0 * score
+
+
+def weighted_mean(pairs):
+    """[(điểm, trọng số)] → trung bình có trọng số làm tròn 2 chữ số, None nếu không có gì."""
+    pairs = [(score, weight) for score, weight in pairs if score is not None and weight > 0]
+    total = sum(weight for _, weight in pairs)
+    return round(sum(score * weight for score, weight in pairs) / total, 2) if total else None
+
+
+def speech_confidence(segments):
+    """Điểm cả đoạn / file: trung bình segment_confidence theo thời lượng segment."""
+    return weighted_mean((segment_confidence(seg), max(seg["end"] - seg["start"], 0.01))
+                         for seg in segments if seg.get("text", "").strip())
+
+
+# === OCR
+def word_confidence(confs, lengths):
+    """Điểm từ phân bố conf của các từ (mảng numpy của word_stats, đã lọc): trung bình theo độ dài,
+    trừ theo tỉ lệ ký tự thuộc từ có conf < OCR_LOW_WORD."""
+    confs = np.asarray(confs, dtype=np.float64)
+    lengths = np.asarray(lengths, dtype=np.float64)
+    total = lengths.sum()
+    if total <= 0:
+        return 0.0
+    mean = (confs * lengths).sum() / total
+    low = lengths[confs < OCR_LOW_WORD].sum() / total
+    return float(mean * (1.0 - OCR_LOW_WEIGHT * low))
+
+
+def edit_ratio(before, after):
+    """Khoảng cách chỉnh sửa chuẩn hóa theo số ký tự: 0 (giống hệt) – 1 (khác hoàn toàn).
+
+    Căn hai văn bản theo từ, từ bị thay chỉ tính phần ký tự khác nhau (sửa dấu "chao" → "chào"
+    tốn ít hơn thay cả từ); so sánh ký tự trên toàn văn bản dài thì quá chậm."""
+    a, b = before.split(), after.split()
+    total = max(len(" ".join(a)), len(" ".join(b)))
+    if not total:
+        return 0.0
+    changed = 0.0
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, a, b, autojunk=False).get_opcodes():
+        if tag == "equal":
+            continue
+        left, right = " ".join(a[i1:i2]), " ".join(b[j1:j2])
+        if tag == "replace":
+            similarity = difflib.SequenceMatcher(None, left, right, autojunk=False).ratio()
+            changed += (1.0 - similarity) * max(len(left), len(right))
+        else:
+            changed += len(left) + len(right)
+    return min(1.0, changed / total)
+
+
+def ocr_confidence(confs, lengths, raw_text=None, refined_text=None):
+    score = word_confidence(confs, lengths)
+    if raw_text is not None and refined_text is not None:
+        score *= 1.0 - OCR_EDIT_WEIGHT * edit_ratio(raw_text, refined_text)
+    return round(score, 2)
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Nhận nội dung file trực tiếp qua stdin, không qua ổ đĩa.
+
+Mỗi frame:
+  [4 byte big-endian: độ dài header][header JSON UTF-8: {"name": "...", "size": N}][N byte nội dung]
+Các frame nối tiếp nhau tới EOF. Phía Node tương ứng: shared/frames.ts.
+
+Ở chế độ worker (--serve), job JSON mang file dưới dạng base64:
+  {"id": 1, "args": [...], "files": [{"name": "...", "data": "<base64>"}]}
+"""
+import io
+import sys
+import json
+import base64
+import struct
+import hashlib
+
+HEADER_LEN = struct.Struct(">I")
+MAX_HEADER = 64 * 1024
+
+
+class FrameError(ValueError):
+    pass
+
+
+def _read_exact(stream, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(remaining)
+        if not chunk:
+            raise FrameError(f"Frame bị cắt cụt: thiếu {remaining} byte")
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def iter_frames(stream=None):
+    """Sinh (name, bytes) cho từng frame trên stream nhị phân (mặc định stdin)."""
+    stream = stream or sys.stdin.buffer
+    while True:
+        prefix = stream.read(HEADER_LEN.size)
+        if not prefix:
+            return
+        if len(prefix) < HEADER_LEN.size:
+            prefix += _read_exact(stream, HEADER_LEN.size - len(prefix))
+        (header_len,) = HEADER_LEN.unpack(prefix)
+        if header_len > MAX_HEADER:
+            raise FrameError(f"Header frame quá lớn: {header_len} byte")
+        header = json.loads(_read_exact(stream, header_len).decode("utf-8"))
+        yield header.get("name") or "stdin", _read_exact(stream, int(header["size"]))
+
+
+def read_frames(stream=None):
+    return list(iter_frames(stream))
+
+
+def encode_frame(name, data):
+    header = json.dumps({"name": name, "size": len(data)}, ensure_ascii=False).encode("utf-8")
+    return HEADER_LEN.pack(len(header)) + header + data
+
+
+def write_frames(stream, files):
+    for name, data in files:
+        stream.write(encode_frame(name, data))
+    stream.flush()
+
+
+def decode_job_files(files):
+    """files của job worker (base64) → [(name, bytes)]."""
+    return [(f.get("name") or "file", base64.b64decode(f.get("data") or "")) for f in files or []]
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def as_stream(data):
+    return io.BytesIO(data)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+"""
+Import trì hoãn cho các thư viện nặng (torch, whisper, cv2, pytesseract, requests...).
+Module chỉ thực sự được nạp ở lần truy cập thuộc tính đầu tiên, nên các nhánh không cần tới
+(kiểm tra tham số, sai định dạng, trúng cache) không phải trả chi phí import.
+
+    cv2 = lazy_import("cv2")
+    ...
+    cv2.imread(path)   # lúc này mới import cv2
+"""
+import sys
+import importlib
+import importlib.util
+
+
+class LazyModule:
+    """Đại diện cho module chưa nạp; lần truy cập thuộc tính đầu tiên mới import thật.
+
+    Không dùng importlib.util.LazyLoader: trên Python < 3.12 nó không khóa, hai luồng (trang / vùng chữ OCR,
+    job song song của worker) cùng chạm lần đầu có thể thấy module mới khởi tạo một nửa; nó cũng không nạp
+    được module C (extension). importlib.import_module đã có khóa theo từng module nên an toàn giữa các luồng.
+    """
+
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            module = importlib.import_module(self.__dict__["_name"])
+            self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        return f"<lazy module '{self.__dict__['_name']}'>"
+
+
+def lazy_import(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    # Thiếu thư viện thì báo ngay lúc khai báo như import thường
+    if importlib.util.find_spec(name) is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    return LazyModule(name)
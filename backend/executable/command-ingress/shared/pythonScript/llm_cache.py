@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Cache phản hồi LLM (Gemini) dùng chung cho các script, lưu trong SQLite.
+Khóa = tên model + prompt đã chuẩn hóa (Unicode NFC, gộp khoảng trắng).
+
+Biến môi trường:
+  LLM_CACHE_PATH         file SQLite (mặc định <command-ingress>/.cache/llm_cache.sqlite)
+  LLM_CACHE_TTL_HOURS    thời gian sống của một phản hồi (mặc định 168 = 7 ngày)
+  LLM_CACHE_MAX_ENTRIES  số bản ghi tối đa, vượt quá thì xóa bản ghi ít dùng nhất
+  LLM_CACHE_DISABLE      =1 để luôn gọi LLM
+"""
+import os
+import sys
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import defaultdict
+
+DEFAULT_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '.cache', 'llm_cache.sqlite'))
+
+
+def normalize_prompt(prompt):
+    prompt = unicodedata.normalize("NFC", prompt or "")
+    return " ".join(prompt.split())
+
+
+def prompt_key(model, prompt):
+    return hashlib.sha256(f"{model}\0{normalize_prompt(prompt)}".encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    def __init__(self, path=None, ttl_hours=None, max_entries=None, enabled=None):
+        self.path = path or os.getenv("LLM_CACHE_PATH") or DEFAULT_PATH
+        self.ttl = float(ttl_hours or os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600
+        self.max_entries = int(max_entries or os.getenv("LLM_CACHE_MAX_ENTRIES", "20000"))
+        if enabled is None:
+            enabled = os.getenv("LLM_CACHE_DISABLE", "").lower() not in ("1", "true", "yes")
+        self.enabled = enabled
+        self.session = defaultdict(lambda: {"hits": 0, "misses": 0})
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY, model TEXT, response TEXT,
+                created_at REAL, last_access REAL)""")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+            conn.execute("""CREATE TABLE IF NOT EXISTS stats (
+                site TEXT PRIMARY KEY, hits INTEGER DEFAULT 0, misses INTEGER DEFAULT 0)""")
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _count(self, db, site, hit):
+        self.session[site]["hits" if hit else "misses"] += 1
+        column = "hits" if hit else "misses"
+        db.execute("INSERT OR IGNORE INTO stats(site) VALUES (?)", (site,))
+        db.execute(f"UPDATE stats SET {column} = {column} + 1 WHERE site = ?", (site,))
+
+    def get(self, site, model, prompt):
+        key = prompt_key(model, prompt)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            hit = row is not None and now - row[1] <= self.ttl
+            if hit:
+                db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._count(db, site, hit)
+            db.commit()
+        return row[0] if hit else None
+
+    def put(self, model, prompt, response):
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses(key, model, response, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (prompt_key(model, prompt), model, response, now, now),
+            )
+            db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            total = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            if total > self.max_entries:
+                db.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                    (total - self.max_entries,),
+                )
+            db.commit()
+
+    def cached(self, site, model, prompt, call):
+        """Trả phản hồi đã cache, nếu chưa có thì gọi `call()` và lưu lại.
+        Lỗi hoặc phản hồi rỗng không được cache."""
+        if not self.enabled:
+            return call()
+        try:
+            response = self.get(site, model, prompt)
+        except sqlite3.Error as e:
+            print(f"[LLM CACHE] lỗi đọc cache: {e}", file=sys.stderr)
+            return call()
+        if response is not None:
+            return response
+        response = call()
+        if isinstance(response, str) and response.strip():
+            try:
+                self.put(model, prompt, response)
+            except sqlite3.Error as e:
+                print(f"[LLM CACHE] lỗi ghi cache: {e}", file=sys.stderr)
+        return response
+
+    def stats(self):
+        with self._lock:
+            rows = self._db().execute("SELECT site, hits, misses FROM stats ORDER BY site").fetchall()
+        return {site: {"hits": hits, "misses": misses} for site, hits, misses in rows}
+
+    def log_stats(self):
+        for site, counts in sorted(self.session.items()):
+            print(f"[LLM CACHE] {site}: hits={counts['hits']} misses={counts['misses']}", file=sys.stderr)
+
+
+_shared = None
+
+
+def get_llm_cache():
+    global _shared
+    if _shared is None:
+        _shared = LLMCache()
+    return _shared
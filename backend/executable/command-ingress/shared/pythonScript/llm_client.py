@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Client Gemini (REST generateContent) dùng chung cho OCR, STT và Insight.
+  - một requests.Session giữ kết nối keep-alive (connection pool)
+  - giới hạn số request đồng thời, fan-out qua thread pool
+  - timeout, retry với backoff có jitter khi gặp 429/5xx, tôn trọng Retry-After
+  - giãn cách request theo LLM_RPM (requests per minute)
+  - đi qua cache phản hồi (llm_cache) trước khi gọi mạng
+
+Biến môi trường:
+  GEMINI_API_BASE     gốc API (mặc định https://generativelanguage.googleapis.com/v1beta),
+                      trỏ về server giả lập cục bộ khi test
+  LLM_TIMEOUT         timeout mỗi request (giây, mặc định 60)
+  LLM_MAX_RETRIES     số lần thử lại (mặc định 4)
+  LLM_MAX_CONCURRENCY số request song song tối đa (mặc định 4)
+  LLM_RPM             số request tối đa mỗi phút, 0 = không giới hạn
+"""
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_import import lazy_import
+from llm_cache import get_llm_cache
+
+requests = lazy_import("requests")
+
+DEFAULT_API_BASE = "https://generativelanguage.googleapis.com/v1beta"
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    pass
+
+
+class RateLimiter:
+    """Giãn đều thời điểm bắt đầu request để không vượt quá `rpm`."""
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm and rpm > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    def pause(self, seconds):
+        """Server báo quá tải → lùi toàn bộ các request kế tiếp."""
+        with self._lock:
+            self._next = max(self._next, time.monotonic() + seconds)
+
+
+class GeminiClient:
+    def __init__(self, api_key=None, model="gemini-2.0-flash", endpoint=None, timeout=None,
+                 max_retries=None, max_concurrency=None, rpm=None, cache=None):
+        self.api_key = api_key
+        self.model = model
+        api_base = os.getenv("GEMINI_API_BASE", DEFAULT_API_BASE).rstrip("/")
+        self.endpoint = endpoint or f"{api_base}/models/{model}:generateContent"
+        # Bỏ query (?key=...) để khóa cache chỉ phụ thuộc vào model
+        self.model_id = self.endpoint.split("?", 1)[0]
+        self.timeout = float(timeout or os.getenv("LLM_TIMEOUT", "60"))
+        self.max_retries = int(max_retries if max_retries is not None else os.getenv("LLM_MAX_RETRIES", "4"))
+        self.max_concurrency = int(max_concurrency or os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        self.limiter = RateLimiter(float(rpm if rpm is not None else os.getenv("LLM_RPM", "0")))
+        self.cache = cache or get_llm_cache()
+
+        self._session = None
+        self._session_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = None
+
+    @property
+    def session(self):
+        """Session HTTP tạo ở request đầu tiên: trúng cache thì không phải import requests."""
+        with self._session_lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._session = session
+        return self._session
+
+    @property
+    def executor(self):
+        """Thread pool cho fan-out; tạo khi cần để CLI chỉ gọi một lần không tốn thêm luồng."""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency * 2)
+        return self._executor
+
+    def _headers(self):
+        headers = {"Content-Type": "application/json"}
+        if self.api_key and "key=" not in self.endpoint:
+            headers["x-goog-api-key"] = self.api_key
+        return headers
+
+    def _backoff(self, attempt, retry_after=None):
+        if retry_after is not None:
+            return retry_after
+        return min(30.0, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.5)
+
+    def _request(self, prompt):
+        payload = {"contents": [{"parts": [{"text": prompt}]}]}
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            self.limiter.wait()
+            retry_after = None
+            throttled = False
+            try:
+                with self._slots:
+                    r = self.session.post(self.endpoint, json=payload, headers=self._headers(), timeout=self.timeout)
+                if r.status_code in RETRY_STATUS:
+                    last_error = LLMError(f"HTTP {r.status_code}: {r.text[:200]}")
+                    header = r.headers.get("Retry-After")
+                    if header and header.isdigit():
+                        retry_after = float(header)
+                    throttled = r.status_code == 429
+                else:
+                    r.raise_for_status()
+                    parts = r.json()["candidates"][0]["content"]["parts"]
+                    return "".join(part.get("text", "") for part in parts)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = LLMError(str(e))
+            except (requests.HTTPError, KeyError, IndexError, ValueError) as e:
+                raise LLMError(str(e)) from e
+
+            delay = self._backoff(attempt, retry_after)
+            if throttled:
+                # 429: lùi limiter dùng chung (cả các request khác), lần thử lại chờ ở limiter.wait() đầu vòng lặp
+                self.limiter.pause(delay)
+            elif attempt < self.max_retries:
+                time.sleep(delay)
+        raise last_error
+
+    def generate(self, prompt, site="default"):
+        """Gọi LLM (qua cache) và trả về text. Lỗi sau khi hết lượt retry → LLMError."""
+        return self.cache.cached(site, self.model_id, prompt, lambda: self._request(prompt))
+
+    def submit(self, prompt, site="default"):
+        return self.executor.submit(self.generate, prompt, site)
+
+    def generate_many(self, prompts, site="default"):
+        """Gửi song song nhiều prompt; kết quả theo đúng thứ tự, lỗi trả về dưới dạng exception."""
+        futures = [self.submit(prompt, site) for prompt in prompts]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return results
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Xuất kết quả dạng NDJSON (mỗi dòng một object JSON gọn) ngay khi từng phần xong (`--stream`).
+
+Các loại bản ghi:
+  {"type": "page",    "index": i, "file": ..., ...}   một trang của file nhiều trang (OCR)
+  {"type": "segment", "index": i, "file": ..., ...}   một đoạn thô vừa chép lời (STT)
+  {"type": "file",    "index": i, "file": ..., ...}   kết quả cuối của file thứ i (giống phần tử
+                                                      của danh sách khi chạy không --stream)
+  {"type": "summary", "files": N, "errors": K, "elapsed_ms": ...}   luôn là dòng cuối cùng
+Bản ghi "file" đến theo thứ tự xử lý xong, không theo thứ tự đầu vào: dùng "index" để sắp lại.
+
+Ở chế độ worker, job có "stream": true nhận từng bản ghi dạng {"id": ..., "event": {...}}.
+Phía Node tương ứng: shared/python-stream.ts.
+"""
+import sys
+import json
+import threading
+
+from timing import record_serialize
+
+
+def stdout_emitter(stream=None):
+    """Hàm emit(record) in mỗi bản ghi thành một dòng và flush ngay; an toàn khi nhiều luồng gọi."""
+    lock = threading.Lock()
+
+    def emit(record):
+        line = json.dumps(record_serialize(record, ensure_ascii=False), ensure_ascii=False)
+        with lock:
+            out = stream or sys.stdout
+            out.write(line + "\n")
+            out.flush()
+    return emit
+
+
+def file_record(index, name, entry):
+    return {"type": "file", "index": index, "file": name, **entry}
+
+
+def summary_record(results, elapsed, **extra):
+    errors = sum(1 for r in results if isinstance(r, dict) and r.get("error"))
+    return {"type": "summary", "files": len(results), "errors": errors,
+            "elapsed_ms": round(elapsed * 1000, 2), **extra}
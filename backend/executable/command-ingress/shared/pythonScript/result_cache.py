@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Cache kết quả trên đĩa cho các bộ trích xuất (OCR, STT, DOCX).
+Khóa = SHA-256 nội dung file + tham số engine, nên cùng một file tải lên
+nhiều lần (kể cả khác tên) chỉ phải xử lý một lần.
+
+Biến môi trường:
+  RESULT_CACHE_DIR      thư mục cache (mặc định <command-ingress>/.cache/results)
+  RESULT_CACHE_MAX_MB   dung lượng tối đa, vượt quá thì xóa file ít dùng nhất (LRU)
+  RESULT_CACHE_DISABLE  =1 để bỏ qua cache
+"""
+import os
+import sys
+import json
+import hashlib
+import tempfile
+import threading
+
+DEFAULT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '.cache', 'results'))
+# Ước lượng tổng dung lượng cache (byte), dùng chung giữa các process, để put() không phải quét cả cây
+SIZE_FILE = ".size"
+# Quét đầy đủ định kỳ để hiệu chỉnh ước lượng (ghi đồng thời không khóa có thể làm mất vài lần cộng dồn)
+RESCAN_EVERY = 256
+# Vượt giới hạn thì xóa xuống còn tỉ lệ này, để không phải quét lại ở ngay lần ghi sau
+EVICT_TO = 0.9
+
+
+def cache_disabled_by_env():
+    return os.getenv("RESULT_CACHE_DISABLE", "").lower() in ("1", "true", "yes")
+
+
+def hash_file(path, block_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def hash_params(params):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, namespace, params, root=None, max_mb=None, enabled=None):
+        self.namespace = namespace
+        self.params_hash = hash_params(params)
+        self.root = root or os.getenv("RESULT_CACHE_DIR") or DEFAULT_ROOT
+        self.max_bytes = int(float(max_mb or os.getenv("RESULT_CACHE_MAX_MB", "512")) * 1024 * 1024)
+        self.enabled = (not cache_disabled_by_env()) if enabled is None else enabled
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+    def _entry_path(self, content_hash, variant=None):
+        # variant: tham số phụ thay đổi theo từng lượt gọi (vd. chế độ xử lý)
+        key = f"{self.namespace}:{content_hash}:{self.params_hash}"
+        if variant is not None:
+            key += ":" + hash_params(variant)
+        key = hashlib.sha256(key.encode()).hexdigest()
+        return os.path.join(self.root, self.namespace, key[:2], key + ".json")
+
+    def get(self, path, content_hash=None, variant=None, count=True):
+        """Trả về kết quả đã cache hoặc None. Lần truy cập làm mới mtime (LRU).
+        `count=False`: chỉ dò (vd. thử nhiều biến thể cho một lượt tra), nơi gọi tự record() một lần."""
+        if not self.enabled:
+            return None
+        entry = self._entry_path(content_hash or hash_file(path), variant)
+        try:
+            with open(entry, "r", encoding="utf-8") as f:
+                result = json.load(f)
+            os.utime(entry, None)
+        except (OSError, ValueError):
+            result = None
+        if count:
+            self.record(result is not None)
+        return result
+
+    def record(self, hit):
+        """Ghi một lần trúng / trượt vào thống kê."""
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def put(self, path, result, content_hash=None, variant=None):
+        if not self.enabled:
+            return
+        entry = self._entry_path(content_hash or hash_file(path), variant)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(entry), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(result, f, ensure_ascii=False)
+            delta = os.path.getsize(tmp)
+            try:
+                delta -= os.path.getsize(entry)
+            except OSError:
+                pass
+            os.replace(tmp, entry)
+        except OSError:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+
+        with self._lock:
+            self._puts += 1
+            rescan = self._puts % RESCAN_EVERY == 0
+            estimate = self._add_size(delta)
+            if rescan or estimate is None or estimate > self.max_bytes:
+                self._evict()
+
+    def _size_path(self):
+        return os.path.join(self.root, SIZE_FILE)
+
+    def _add_size(self, delta):
+        """Cộng `delta` vào ước lượng dung lượng chung; None nếu chưa có ước lượng (cần quét)."""
+        try:
+            with open(self._size_path(), "r") as f:
+                total = int(f.read().strip()) + delta
+        except (OSError, ValueError):
+            return None
+        self._write_size(total)
+        return total
+
+    def _write_size(self, total):
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                f.write(str(max(0, total)))
+            os.replace(tmp, self._size_path())
+        except OSError:
+            pass
+
+    def get_or_compute(self, path, compute, cacheable=lambda result: True, variant=None, content_hash=None):
+        """`content_hash` cho sẵn khi nội dung không nằm trên đĩa (nhận qua stdin)."""
+        if not self.enabled:
+            return compute()
+        content_hash = content_hash or hash_file(path)
+        result = self.get(path, content_hash, variant)
+        if result is not None:
+            return result
+        result = compute()
+        if cacheable(result):
+            self.put(path, result, content_hash, variant)
+        return result
+
+    def _evict(self):
+        """Quét cả cache: vượt giới hạn thì xóa các mục có mtime cũ nhất cho tới khi tổng dung lượng
+        còn EVICT_TO giới hạn, rồi ghi lại dung lượng thật vào SIZE_FILE."""
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if not name.endswith(".json"):
+                    continue
+                full = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(full)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, full))
+                total += st.st_size
+        if total > self.max_bytes:
+            for _, size, full in sorted(entries):
+                try:
+                    os.remove(full)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.max_bytes * EVICT_TO:
+                    break
+        self._write_size(total)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "namespace": self.namespace,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else 0.0,
+        }
+
+    def log_stats(self):
+        if self.enabled and (self.hits or self.misses):
+            s = self.stats()
+            print(f"[CACHE] {s['namespace']}: hits={s['hits']} misses={s['misses']} hit_rate={s['hit_rate']}",
+                  file=sys.stderr)
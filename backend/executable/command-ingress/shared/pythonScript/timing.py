@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Đo thời gian từng giai đoạn (wall + CPU) của một request và profile tùy chọn.
+
+    t = Timings()
+    with use(t):                        # gắn vào context hiện tại
+        with stage("preprocess"):       # gọi ở bất kỳ đâu bên dưới, không cần truyền tham số
+            ...
+    result["timings"] = t.as_dict()     # {"preprocess": {"wall_ms", "cpu_ms", "count"}, ...}
+
+`stage()` không làm gì khi không có Timings trong context nên chi phí khi tắt gần như bằng 0.
+Luồng mới / thread pool không thừa hưởng context: bọc hàm bằng `bind(fn)` trước khi submit.
+cpu_ms là CPU của luồng chạy stage (time.thread_time); thời gian CPU của process con kết thúc
+trong stage (tesseract, ffmpeg) được ghi riêng vào child_cpu_ms.
+
+Cờ dòng lệnh dùng chung cho các script (tách bằng `pop_flags`):
+  --timings                thêm khối "timings" vào từng kết quả
+  --profile[=cpu|mem|all]  cProfile (.prof) và/hoặc tracemalloc (.txt) của request, ghi vào
+                           PROFILE_DIR (mặc định <command-ingress>/.profiles); cProfile chỉ thấy
+                           luồng gọi run()
+"""
+import os
+import sys
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+PROFILE_DIR = os.getenv("PROFILE_DIR") or os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', '..', '.profiles'))
+PROFILE_KINDS = ("cpu", "mem", "all")
+
+_current = ContextVar("timings", default=None)
+_profile_lock = threading.Lock()
+
+
+def _child_cpu():
+    t = os.times()
+    return t.children_user + t.children_system
+
+
+class Stopwatch:
+    def __init__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.thread_time()
+        self.child_cpu = _child_cpu()
+
+    def stop(self):
+        """(wall, cpu, child_cpu) tính bằng giây kể từ lúc tạo."""
+        return (time.perf_counter() - self.wall, time.thread_time() - self.cpu, _child_cpu() - self.child_cpu)
+
+
+class Timings:
+    """Cộng dồn thời gian theo tên stage; an toàn khi nhiều luồng cùng ghi."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, wall, cpu=0.0, child_cpu=0.0, count=1):
+        with self._lock:
+            entry = self.stages.setdefault(name, [0.0, 0.0, 0.0, 0])
+            entry[0] += wall
+            entry[1] += cpu
+            entry[2] += child_cpu
+            entry[3] += count
+
+    @contextmanager
+    def stage(self, name):
+        watch = Stopwatch()
+        try:
+            yield
+        finally:
+            self.add(name, *watch.stop())
+
+    def as_dict(self):
+        with self._lock:
+            out = {}
+            for name, (wall, cpu, child_cpu, count) in self.stages.items():
+                out[name] = {"wall_ms": round(wall * 1000, 2), "cpu_ms": round(cpu * 1000, 2), "count": count}
+                if child_cpu > 0:
+                    out[name]["child_cpu_ms"] = round(child_cpu * 1000, 2)
+            return out
+
+
+def current():
+    return _current.get()
+
+
+@contextmanager
+def use(timings):
+    """Đặt `timings` (hoặc None để tắt) làm đích của stage() trong khối lệnh."""
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def stage(name):
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    with timings.stage(name):
+        yield
+
+
+def timed_iter(name, iterable):
+    """Tính thời gian sinh từng phần tử của generator (đọc / rasterize / cắt đoạn) vào stage `name`."""
+    timings = _current.get()
+    if timings is None:
+        yield from iterable
+        return
+    iterator = iter(iterable)
+    while True:
+        with timings.stage(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def bind(fn):
+    """Gắn Timings hiện tại vào `fn` để gọi ở luồng khác (thread pool, threading.Thread)."""
+    timings = _current.get()
+    if timings is None:
+        return fn
+
+    def wrapper(*args, **kwargs):
+        with use(timings):
+            return fn(*args, **kwargs)
+    return wrapper
+
+
+def record_serialize(result, **dump_kwargs):
+    """Đo thời gian json.dumps của từng kết quả có khối "timings" rồi ghi vào stage serialize
+    (bản thân khối timings không được tính). Gọi trước khi in / trả kết quả."""
+    entries = result if isinstance(result, list) else [result]
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(entry.get("timings"), dict):
+            continue
+        body = {k: v for k, v in entry.items() if k != "timings"}
+        watch = Stopwatch()
+        json.dumps(body, **dump_kwargs)
+        wall, cpu, _ = watch.stop()
+        entry["timings"]["serialize"] = {"wall_ms": round(wall * 1000, 2), "cpu_ms": round(cpu * 1000, 2), "count": 1}
+    return result
+
+
+def pop_flags(argv):
+    """Tách --timings / --profile[=cpu|mem|all] khỏi argv → (argv còn lại, timings: bool, profile: str|None).
+    Từ "--" trở đi là dữ liệu (vd. văn bản người dùng), giữ nguyên kể cả "--"."""
+    rest, timings, profile = [], False, None
+    for index, arg in enumerate(argv):
+        if arg == "--":
+            rest.extend(argv[index:])
+            break
+        if arg == "--timings":
+            timings = True
+        elif arg == "--profile":
+            profile = "cpu"
+        elif arg.startswith("--profile="):
+            profile = arg.split("=", 1)[1] or "cpu"
+            if profile not in PROFILE_KINDS:
+                raise ValueError(f"--profile phải là một trong {', '.join(PROFILE_KINDS)}")
+        else:
+            rest.append(arg)
+    return rest, timings, profile
+
+
+def _profile_path(label, suffix):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    return os.path.join(PROFILE_DIR, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}{suffix}")
+
+
+@contextmanager
+def profile(kind, label):
+    """Profile một request; mỗi lúc chỉ một request trong process được profile."""
+    if not kind:
+        yield
+        return
+    if not _profile_lock.acquire(blocking=False):
+        print(f"[PROFILE] {label}: đang có request khác được profile, bỏ qua", file=sys.stderr)
+        yield
+        return
+
+    import cProfile
+    import tracemalloc
+    profiler = cProfile.Profile() if kind in ("cpu", "all") else None
+    trace_mem = kind in ("mem", "all") and not tracemalloc.is_tracing()
+    try:
+        if trace_mem:
+            tracemalloc.start(25)
+        if profiler:
+            profiler.enable()
+        yield
+    finally:
+        try:
+            if profiler:
+                profiler.disable()
+                path = _profile_path(label, ".prof")
+                profiler.dump_stats(path)
+                print(f"[PROFILE] cProfile → {path} (xem: python -m pstats {path})", file=sys.stderr)
+            if trace_mem:
+                snapshot = tracemalloc.take_snapshot()
+                current_mb, peak_mb = (v / 1024 / 1024 for v in tracemalloc.get_traced_memory())
+                tracemalloc.stop()
+                path = _profile_path(label, ".tracemalloc.txt")
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(f"current={current_mb:.1f}MB peak={peak_mb:.1f}MB\n")
+                    for stat in snapshot.statistics("traceback")[:30]:
+                        f.write(f"\n{stat.size / 1024:.1f} KiB, {stat.count} blocks\n")
+                        f.write("\n".join(stat.traceback.format()) + "\n")
+                print(f"[PROFILE] tracemalloc peak={peak_mb:.1f}MB → {path}", file=sys.stderr)
+        finally:
+            _profile_lock.release()
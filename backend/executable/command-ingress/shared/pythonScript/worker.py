@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+Worker thường trú cho các script Python (OCR, STT, DOCX, Insight).
+Script chỉ nạp mô hình / cấu hình một lần, sau đó nhận job qua stdin.
+
+Giao thức JSON-lines:
+  - vào : {"id": <id>, "args": ["arg1", "arg2", ...]}   (args giống hệt khi gọi CLI)
+          có thể kèm "files": [{"name": ..., "data": <base64>}] → handler nhận frames=[(name, bytes)]
+          "stream": true → handler nhận emit=..., mỗi bản ghi NDJSON (xem ndjson.py) được gửi ngay
+  - ra  : {"id": <id>, "result": <kết quả>} hoặc {"id": <id>, "error": "..."}
+          job stream: {"id": <id>, "event": {...}} ... rồi {"id": <id>, "done": true}
+  - khi sẵn sàng, worker in một dòng {"ready": true}
+"""
+import os
+import sys
+import json
+import queue
+import logging
+import threading
+import traceback
+
+from frames import decode_job_files
+from timing import record_serialize
+
+_STOP = object()
+# Đang chạy --serve: stdin là kênh nhận job, handler không được đọc dữ liệu từ đó
+_serving = False
+
+
+def env_int(name, default):
+    try:
+        return max(1, int(os.getenv(name, default)))
+    except (TypeError, ValueError):
+        return default
+
+
+def check_stdin(flag):
+    """Gọi trước khi đọc dữ liệu từ stdin (--stdin / --stdin-frames): ở --serve đọc stdin sẽ nuốt
+    các job kế tiếp của giao thức, nên báo lỗi để job đó trả {"error": ...}."""
+    if _serving:
+        raise ValueError(f"{flag} không dùng được ở chế độ --serve: gửi dữ liệu trong job (args / files)")
+
+
+class JsonLineWorker:
+    def __init__(self, handler, max_concurrency=1, max_queue=0, stdin=None, stdout=None):
+        self.handler = handler
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self._write_lock = threading.Lock()
+
+    def _write(self, payload):
+        line = json.dumps(payload, ensure_ascii=False)
+        with self._write_lock:
+            self.stdout.write(line + "\n")
+            self.stdout.flush()
+
+    def _run_job(self, job):
+        job_id = job.get("id")
+        try:
+            args = list(job.get("args") or [])
+            kwargs = {}
+            if job.get("files"):
+                kwargs["frames"] = decode_job_files(job["files"])
+            if job.get("stream"):
+                # Kết quả đã đi hết qua các event, không gửi lại cả danh sách
+                kwargs["emit"] = lambda record: self._write({"id": job_id, "event": record_serialize(record, ensure_ascii=False)})
+                self.handler(args, **kwargs)
+                self._write({"id": job_id, "done": True})
+                return
+            result = self.handler(args, **kwargs)
+            self._write({"id": job_id, "result": record_serialize(result, ensure_ascii=False)})
+        except BaseException as e:  # noqa: B036 - SystemExit từ argparse cũng phải trả về lỗi
+            logging.debug(traceback.format_exc())
+            self._write({"id": job_id, "error": str(e) or e.__class__.__name__})
+
+    def _consume(self):
+        while True:
+            job = self.jobs.get()
+            if job is _STOP:
+                return
+            self._run_job(job)
+
+    def serve_forever(self):
+        threads = [threading.Thread(target=self._consume, daemon=True) for _ in range(self.max_concurrency)]
+        for t in threads:
+            t.start()
+
+        self._write({"ready": True})
+
+        for line in self.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                self._write({"id": None, "error": f"Job JSON không hợp lệ: {e}"})
+                continue
+            self.jobs.put(job)
+
+        # stdin đóng → xử lý nốt các job trong hàng đợi rồi thoát
+        for _ in threads:
+            self.jobs.put(_STOP)
+        for t in threads:
+            t.join()
+
+
+def serve(handler, max_concurrency=1):
+    """Chạy worker trên stdin/stdout của process hiện tại.
+
+    stdout thật được giữ riêng cho giao thức; mọi lệnh print còn sót lại
+    trong script sẽ bị chuyển sang stderr để không làm hỏng luồng JSON.
+    """
+    global _serving
+    _serving = True
+    if hasattr(sys.stdin, "reconfigure"):
+        sys.stdin.reconfigure(encoding="utf-8")
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+    JsonLineWorker(handler, max_concurrency=max_concurrency, stdout=protocol_out).serve_forever()
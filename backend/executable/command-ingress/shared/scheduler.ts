@@ -0,0 +1,163 @@
+// shared/scheduler.ts
+import os from 'os';
+import fs from 'fs';
+import env from '../utils/env';
+
+export type JobPriority = 'interactive' | 'bulk';
+export type JobCost = { memoryMb: number; cores: number };
+
+type QueuedJob = {
+    kind: string;
+    cost: JobCost;
+    priority: JobPriority;
+    enqueuedAt: number;
+    start: () => void;
+};
+
+const PRIORITIES: JobPriority[] = ['interactive', 'bulk'];
+const WAIT_SAMPLES = 256;
+const SLOW_WAIT_MS = 1000;
+
+/** RAM còn dùng được (MB): MemAvailable trên Linux (tính cả page cache thu hồi được), os.freemem() nơi khác. */
+export function availableMemoryMb(): number {
+    try {
+        const match = /^MemAvailable:\s+(\d+) kB/m.exec(fs.readFileSync('/proc/meminfo', 'utf-8'));
+        if (match) return Number(match[1]) / 1024;
+    } catch (e) {
+        // Không có /proc (macOS, Windows)
+    }
+    return os.freemem() / 1024 / 1024;
+}
+
+function percentile(sorted: number[], p: number): number {
+    if (!sorted.length) return 0;
+    return sorted[Math.min(sorted.length - 1, Math.floor((p / 100) * sorted.length))];
+}
+
+/**
+ * Xếp lịch các job Python (OCR, STT, DOCX, insight) theo chi phí RAM / số lõi ước lượng (job-cost.ts).
+ *
+ * Một job được chạy khi tổng chi phí các job đang chạy cộng job mới nằm trong ngân sách
+ * (SCHED_MEMORY_MB, SCHED_CORES) và RAM thực còn trống (MemAvailable − SCHED_RESERVE_MB) đủ cho job.
+ * Còn lại xếp hàng: interactive luôn trước bulk, cùng mức thì FIFO. Job đầu hàng chưa vừa thì các job
+ * phía sau cũng chờ, để job lớn (Whisper) không bị các job nhỏ chen mãi. Khi không có job nào chạy,
+ * job đầu hàng luôn được nhận kể cả khi vượt ngân sách.
+ */
+export class ResourceScheduler {
+    private queues = new Map<JobPriority, QueuedJob[]>(PRIORITIES.map((p): [JobPriority, QueuedJob[]] => [p, []]));
+    private waits = new Map<JobPriority, number[]>(PRIORITIES.map((p): [JobPriority, number[]] => [p, []]));
+    private runningByKind = new Map<string, number>();
+    private running = 0;
+    private completed = 0;
+    private used: JobCost = { memoryMb: 0, cores: 0 };
+
+    constructor(
+        readonly memoryBudgetMb: number,
+        readonly coreBudget: number,
+        readonly reserveMb: number,
+        private readonly freeMemoryMb: () => number = availableMemoryMb,
+    ) { }
+
+    run<T>(kind: string, cost: JobCost, priority: JobPriority, task: () => Promise<T>): Promise<T> {
+        const normalized = {
+            memoryMb: Math.max(0, cost.memoryMb),
+            cores: Math.min(Math.max(0, cost.cores), this.coreBudget),
+        };
+
+        return new Promise<T>((resolve, reject) => {
+            const start = () => {
+                Promise.resolve()
+                    .then(task)
+                    .then(resolve, reject)
+                    .finally(() => this.release(kind, normalized));
+            };
+            this.queues.get(priority)!.push({ kind, cost: normalized, priority, enqueuedAt: Date.now(), start });
+            this.dispatch();
+        });
+    }
+
+    stats() {
+        const waitMs: Record<string, { p50: number; p95: number; max: number; samples: number }> = {};
+        for (const priority of PRIORITIES) {
+            const sorted = this.waits.get(priority)!.slice().sort((a, b) => a - b);
+            waitMs[priority] = {
+                p50: percentile(sorted, 50),
+                p95: percentile(sorted, 95),
+                max: sorted[sorted.length - 1] ?? 0,
+                samples: sorted.length,
+            };
+        }
+        return {
+            budget: { memoryMb: this.memoryBudgetMb, cores: this.coreBudget, reserveMb: this.reserveMb },
+            used: { memoryMb: Math.round(this.used.memoryMb), cores: Math.round(this.used.cores * 100) / 100 },
+            availableMemoryMb: Math.round(this.freeMemoryMb()),
+            running: Object.fromEntries(Array.from(this.runningByKind.entries())),
+            queued: Object.fromEntries(PRIORITIES.map((p) => [p, this.queues.get(p)!.length])),
+            waitMs,
+            completed: this.completed,
+        };
+    }
+
+    private fits(cost: JobCost): boolean {
+        if (this.running === 0) return true;
+        return this.used.memoryMb + cost.memoryMb <= this.memoryBudgetMb
+            && this.used.cores + cost.cores <= this.coreBudget
+            && this.freeMemoryMb() - this.reserveMb >= cost.memoryMb;
+    }
+
+    private dispatch() {
+        for (const priority of PRIORITIES) {
+            const queue = this.queues.get(priority)!;
+            while (queue.length && this.fits(queue[0].cost)) {
+                this.admit(queue.shift()!);
+            }
+            // Mức ưu tiên cao còn job chờ thì mức thấp hơn không được chạy
+            if (queue.length) return;
+        }
+    }
+
+    private admit(job: QueuedJob) {
+        const waited = Date.now() - job.enqueuedAt;
+        const samples = this.waits.get(job.priority)!;
+        samples.push(waited);
+        if (samples.length > WAIT_SAMPLES) samples.shift();
+        if (waited >= SLOW_WAIT_MS) {
+            console.log(`[SCHED] ${job.kind} (${job.priority}) chờ ${waited} ms, còn ${this.queueDepth()} job trong hàng đợi`);
+        }
+
+        this.running++;
+        this.runningByKind.set(job.kind, (this.runningByKind.get(job.kind) ?? 0) + 1);
+        this.used.memoryMb += job.cost.memoryMb;
+        this.used.cores += job.cost.cores;
+        job.start();
+    }
+
+    private release(kind: string, cost: JobCost) {
+        this.running--;
+        this.completed++;
+        const left = (this.runningByKind.get(kind) ?? 1) - 1;
+        if (left > 0) this.runningByKind.set(kind, left);
+        else this.runningByKind.delete(kind);
+        this.used.memoryMb = Math.max(0, this.used.memoryMb - cost.memoryMb);
+        this.used.cores = Math.max(0, this.used.cores - cost.cores);
+        this.dispatch();
+    }
+
+    private queueDepth(): number {
+        return PRIORITIES.reduce((n, p) => n + this.queues.get(p)!.length, 0);
+    }
+}
+
+let scheduler: ResourceScheduler | undefined;
+
+export function getScheduler(): ResourceScheduler {
+    if (!scheduler) {
+        scheduler = new ResourceScheduler(
+            env.SCHED_MEMORY_MB || Math.round((os.totalmem() / 1024 / 1024) * 0.85),
+            // Vượt số lõi một chút để job chờ Gemini (insight) chạy được cạnh OCR / Whisper dùng hết lõi
+            env.SCHED_CORES || os.cpus().length * 1.25,
+            env.SCHED_RESERVE_MB,
+        );
+    }
+    return scheduler;
+}
@@ -1,5 +1,5 @@
 import { cleanEnv } from 'envalid';
-import { bool, port, str } from 'envalid/dist/validators';
+import { bool, num, port, str } from 'envalid/dist/validators';
 
 const env = cleanEnv(process.env, {
   PORT: port(),
@@ -11,6 +11,15 @@ const env = cleanEnv(process.env, {
   GOOGLE_OAUTH_CLIENT_ID: str(),
   GOOGLE_OAUTH_CLIENT_SECRET: str(),
   GOOGLE_OAUTH_REDIRECT_URL: str(),
+  PYTHON_WORKER_MODE: bool({ default: false }),
+  PYTHON_WORKER_POOL_SIZE: num({ default: 1 }),
+  // Bộ lập lịch job Python: 0 = tự tính (85% RAM, 1.25 × số lõi của máy)
+  SCHED_MEMORY_MB: num({ default: 0 }),
+  SCHED_CORES: num({ default: 0 }),
+  SCHED_RESERVE_MB: num({ default: 512 }),
+  STT_FILES_PER_JOB: num({ default: 4 }),
+  // Bật /metrics/scheduler (chỉ dùng nội bộ, vẫn cần JWT)
+  SCHED_METRICS: bool({ default: false }),
 });
 
 export default env;
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Test các script Python của command-ingress (chạy từ thư mục backend: python -m pytest tests).
+Các script được chạy bằng `python <script>.py` nên import nhau theo thư mục, không theo package:
+thêm các thư mục đó vào sys.path giống như lúc chạy thật.
+"""
+import os
+import sys
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+COMMAND_INGRESS = os.path.join(BACKEND_DIR, 'executable', 'command-ingress')
+
+for path in (
+    os.path.join(BACKEND_DIR, 'benchmarks'),
+    os.path.join(COMMAND_INGRESS, 'shared', 'pythonScript'),
+    os.path.join(COMMAND_INGRESS, 'features', 'insight', 'pythonScript'),
+):
+    if path not in sys.path:
+        sys.path.insert(0, path)
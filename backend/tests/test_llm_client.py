@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""GeminiClient gọi server giả lập cục bộ (benchmarks/stub_gemini.py): retry, Retry-After, giới hạn
+số request đồng thời và thứ tự kết quả của generate_many."""
+import time
+
+import pytest
+
+from stub_gemini import StubGemini
+from llm_cache import LLMCache
+from llm_client import GeminiClient, LLMError
+
+
+@pytest.fixture
+def stub():
+    server = StubGemini(latency_ms=0, jitter_ms=0).start()
+    yield server
+    server.stop()
+
+
+def make_client(stub, **kwargs):
+    kwargs.setdefault("max_retries", 3)
+    return GeminiClient(api_key="test", endpoint=stub.endpoint(), timeout=5, rpm=0,
+                        cache=LLMCache(enabled=False), **kwargs)
+
+
+def test_retries_server_errors_until_success(stub):
+    stub.fail_next(503, times=2, retry_after=0)
+    client = make_client(stub)
+
+    assert client.generate("xin chào") == "xin chào"
+    assert stub.stats()["failures"] == 2
+    assert stub.stats()["requests"] == 1
+
+
+def test_retries_429_with_backoff(stub):
+    stub.fail_next(429)
+    client = make_client(stub)
+
+    started = time.monotonic()
+    assert client.generate("xin chào") == "xin chào"
+    # Không có Retry-After: backoff lần đầu 0.5 s × jitter [0.5, 1.5]
+    assert time.monotonic() - started >= 0.25
+    assert stub.stats()["failures"] == 1
+
+
+def test_honours_retry_after(stub):
+    stub.fail_next(429, retry_after=1)
+    client = make_client(stub)
+
+    started = time.monotonic()
+    assert client.generate("xin chào") == "xin chào"
+    # Chờ đúng Retry-After một lần (không cộng thêm một lượt backoff riêng)
+    assert 1.0 <= time.monotonic() - started < 1.5
+
+
+def test_next_request_does_not_wait_after_retry(stub):
+    stub.fail_next(429, retry_after=1)
+    client = make_client(stub)
+
+    client.generate("câu đầu")
+    started = time.monotonic()
+    client.generate("câu sau")
+    assert time.monotonic() - started < 0.5
+
+
+def test_gives_up_after_max_retries(stub):
+    stub.fail_next(500, times=3, retry_after=0)
+    client = make_client(stub, max_retries=2)
+
+    with pytest.raises(LLMError, match="HTTP 500"):
+        client.generate("xin chào")
+    assert stub.stats()["failures"] == 3
+    assert stub.stats()["requests"] == 0
+
+
+def test_does_not_retry_client_errors(stub):
+    stub.fail_next(400, times=2)
+    client = make_client(stub)
+
+    with pytest.raises(LLMError):
+        client.generate("xin chào")
+    assert stub.stats()["failures"] == 1
+
+
+def test_concurrency_cap(stub):
+    stub.latency_ms = 100
+    client = make_client(stub, max_concurrency=2)
+
+    prompts = [f"câu hỏi số {i}" for i in range(8)]
+    assert client.generate_many(prompts) == prompts
+    assert stub.stats()["max_in_flight"] == 2
+
+
+def test_generate_many_keeps_input_order(stub):
+    # Độ trễ ngẫu nhiên → các request hoàn thành lệch thứ tự gửi
+    stub.latency_ms, stub.jitter_ms = 50, 50
+    client = make_client(stub, max_concurrency=4)
+
+    prompts = [f"đoạn văn bản {i}" for i in range(12)]
+    assert client.generate_many(prompts) == prompts
+
+
+def test_generate_many_returns_errors_in_place(stub, monkeypatch):
+    client = make_client(stub)
+    generate = client.generate
+
+    def failing(prompt, site="default"):
+        if prompt == "lỗi":
+            raise LLMError("hỏng")
+        return generate(prompt, site)
+
+    monkeypatch.setattr(client, "generate", failing)
+    results = client.generate_many(["a b c", "lỗi", "d e f"])
+    assert results[0] == "a b c"
+    assert isinstance(results[1], LLMError)
+    assert results[2] == "d e f"
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Gộp use case gần trùng: TF-IDF băm, union-find, ngưỡng gộp, use case chuẩn và thứ tự đầu ra."""
+import numpy as np
+import pytest
+
+import merge_use_cases as muc
+
+
+def use_case(role, goal, tasks=(), **extra):
+    return {"role": role, "goal": goal, "tasks": list(tasks), **extra}
+
+
+def group(source, accepted=(), suggested=()):
+    return {"source": {"type": source}, "accepted_use_cases": list(accepted), "suggested_use_cases": list(suggested)}
+
+
+def test_tfidf_rows_are_normalized():
+    matrix = muc.tfidf_matrix(["xuất hóa đơn", "xuất hóa đơn", "nhập kho", ""], 64)
+
+    assert matrix.shape == (4, 64)
+    assert matrix.dtype == np.float32
+    np.testing.assert_allclose(np.linalg.norm(matrix[:3], axis=1), 1.0, rtol=1e-5)
+    assert not matrix[3].any()
+    assert matrix[0] @ matrix[1] == pytest.approx(1.0, rel=1e-5)
+    assert matrix[0] @ matrix[2] < 0.5
+
+
+def test_union_find_keeps_first_index_as_root():
+    uf = muc.UnionFind(5)
+    uf.union(4, 2)
+    uf.union(2, 3)
+    uf.union(1, 4)
+
+    assert [uf.find(i) for i in range(5)] == [0, 1, 1, 1, 1]
+
+
+def test_cluster_requires_similar_role_and_goal():
+    fingerprints = [
+        ("kế toán", "xuất hóa đơn cho khách hàng", "chọn đơn hàng in hóa đơn"),
+        ("kế toán", "xuất hóa đơn cho khách hàng", "chọn đơn hàng in hóa đơn gửi email"),
+        ("thủ kho", "xuất hóa đơn cho khách hàng", "chọn đơn hàng in hóa đơn"),
+        ("kế toán", "đối soát công nợ cuối tháng", ""),
+    ]
+    labels = muc.cluster(fingerprints, threshold=0.8)
+
+    assert labels[0] == labels[1]
+    assert len({labels[0], labels[2], labels[3]}) == 3
+
+
+def test_dedupe_threshold():
+    groups = [group("ocr", [use_case("Kế toán", "Xuất hóa đơn điện tử cho khách hàng doanh nghiệp")]),
+              group("docx", [use_case("Kế toán", "Xuất hóa đơn điện tử cho khách hàng")])]
+
+    loose = muc.merge_use_cases(groups, threshold=0.5)
+    strict = muc.merge_use_cases(groups, threshold=0.99)
+
+    assert loose["stats"] == {"input": 2, "output": 1}
+    assert strict["stats"] == {"input": 2, "output": 2}
+    assert [uc["merged_count"] for uc in strict["accepted_use_cases"]] == [1, 1]
+
+
+def test_merge_records_sources_and_builds_canonical():
+    sparse = use_case("Kế toán", "Xuất hóa đơn", ["chọn đơn"])
+    full = use_case("Kế toán", "Xuất hóa đơn", ["chọn đơn", "in"], priority="cao", inputs=["đơn hàng"])
+    result = muc.merge_use_cases([
+        group("ocr", suggested=[sparse]),
+        group("speech", accepted=[full]),
+        group("docx", suggested=[dict(sparse, rules=["phải có mã số thuế"])]),
+    ])
+
+    assert result["suggested_use_cases"] == []
+    [merged] = result["accepted_use_cases"]
+    assert merged["merged_count"] == 3
+    assert merged["sources"] == [
+        {"type": "ocr", "list": "suggested_use_cases"},
+        {"type": "speech", "list": "accepted_use_cases"},
+        {"type": "docx", "list": "suggested_use_cases"},
+    ]
+    # Use case đầy đủ nhất làm gốc, trường thiếu lấy từ các use case còn lại
+    assert merged["priority"] == "cao"
+    assert merged["tasks"] == ["chọn đơn", "in"]
+    assert merged["rules"] == ["phải có mã số thuế"]
+
+
+def test_merge_ignores_previous_merge_fields():
+    previous = use_case("Kế toán", "Xuất hóa đơn", sources=[{"type": "cũ"}], merged_count=7)
+    [merged] = muc.merge_use_cases([group("ocr", [previous])])["accepted_use_cases"]
+
+    assert merged["sources"] == [{"type": "ocr", "list": "accepted_use_cases"}]
+    assert merged["merged_count"] == 1
+
+
+def test_output_follows_first_source_order():
+    a = use_case("Khách hàng", "Đặt hàng trực tuyến", ["chọn sản phẩm", "thanh toán"])
+    b = use_case("Thủ kho", "Nhập hàng vào kho", ["kiểm đếm", "ghi phiếu nhập"])
+    c = use_case("Quản trị viên", "Phân quyền người dùng", ["tạo vai trò"])
+    groups = [group("ocr", [c]), group("speech", [b, a]), group("docx", [a, c, b])]
+
+    first = muc.merge_use_cases(groups)
+    assert [uc["role"] for uc in first["accepted_use_cases"]] == ["Quản trị viên", "Thủ kho", "Khách hàng"]
+    assert muc.merge_use_cases(groups) == first
+
+
+def test_empty_input():
+    assert muc.merge_use_cases([]) == {"accepted_use_cases": [], "suggested_use_cases": [],
+                                       "stats": {"input": 0, "output": 0}}
+
+
+def test_stdin_is_rejected_in_serve_mode(monkeypatch):
+    import worker
+    monkeypatch.setattr(worker, "_serving", True)
+
+    assert "--serve" in muc.run(["--stdin"])["error"]
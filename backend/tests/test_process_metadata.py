@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Các hàm thuần của process_metadata: chia đoạn chồng lấn, parse JSON của LLM, gộp kết quả từng đoạn,
+và cách tách tham số / văn bản."""
+import json
+
+import pytest
+
+import process_metadata as pm
+
+
+def paragraphs(count, size=90):
+    return [f"Đoạn {i:03d} " + "x" * (size - 9) for i in range(count)]
+
+
+def test_chunk_text_short_text_is_one_chunk():
+    assert pm.chunk_text("một\n\nhai\nba", max_chars=100, overlap=10) == ["một\nhai\nba"]
+
+
+def test_chunk_text_respects_max_and_overlaps():
+    paras = paragraphs(40)
+    chunks = pm.chunk_text("\n\n".join(paras), max_chars=1000, overlap=200)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    for previous, current in zip(chunks, chunks[1:]):
+        prev_lines, lines = previous.split("\n"), current.split("\n")
+        # Đoạn sau mở đầu bằng phần đuôi (≥ overlap ký tự) của đoạn trước
+        overlap = [line for line in lines if line in prev_lines]
+        assert overlap and lines[:len(overlap)] == prev_lines[-len(overlap):]
+        assert sum(len(line) + 1 for line in overlap) >= 200
+    # Không mất đoạn văn nào
+    assert set(paras) == {line for chunk in chunks for line in chunk.split("\n")}
+
+
+def test_chunk_text_splits_long_paragraph_by_sentence():
+    sentence = "Người dùng cần xuất báo cáo theo tháng."
+    text = " ".join([sentence] * 60)
+    chunks = pm.chunk_text(text, max_chars=500, overlap=0)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 500 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+
+
+def test_parse_llm_json_strips_fence_and_bom():
+    output = '﻿```json\n{"use_cases": [{"role": "Kế toán"}]}\n```'
+    assert pm.parse_llm_json(output) == {"use_cases": [{"role": "Kế toán"}]}
+
+
+def test_parse_llm_json_rejects_invalid_output():
+    with pytest.raises(ValueError):
+        pm.parse_llm_json("Xin lỗi, tôi không thể trả lời.")
+    with pytest.raises(ValueError):
+        pm.parse_llm_json(None)
+
+
+def test_reduce_merges_same_role_and_goal():
+    partials = [
+        {"use_cases": [{"role": "Kế toán", "goal": "Xuất hóa đơn", "tasks": ["chọn đơn"]}]},
+        {"use_cases": [{"role": " kế toán ", "goal": "xuất  hóa đơn", "tasks": ["chọn đơn", "in"]},
+                       {"role": "Thủ kho", "goal": "Nhập kho", "tasks": []},
+                       "không phải object"]},
+    ]
+    result = pm.reduce_use_cases(partials, ["use_cases"])
+
+    assert [uc["role"] for uc in result["use_cases"]] == ["Kế toán", "Thủ kho"]
+    assert result["use_cases"][0]["tasks"] == ["chọn đơn", "in"]
+
+
+def test_reduce_keeps_accepted_out_of_suggested():
+    accepted = {"role": "Khách hàng", "goal": "Đặt hàng"}
+    partials = [
+        {"accepted_use_cases": [accepted], "suggested_use_cases": []},
+        {"accepted_use_cases": [], "suggested_use_cases": [dict(accepted, tasks=["thanh toán"]),
+                                                           {"role": "Khách hàng", "goal": "Hủy đơn"}]},
+    ]
+    result = pm.reduce_use_cases(partials, pm.LIST_KEYS["all"])
+
+    assert result["accepted_use_cases"] == [dict(accepted, tasks=["thanh toán"])]
+    assert [uc["goal"] for uc in result["suggested_use_cases"]] == ["Hủy đơn"]
+
+
+def test_finish_reports_chunk_errors():
+    errors = [{"chunk": 1, "error": "HTTP 500"}]
+    result = json.loads(pm.finish([{"use_cases": [{"role": "A", "goal": "B"}]}], errors, "default", chunks=2))
+    assert result == {"use_cases": [{"role": "A", "goal": "B"}], "chunks": 2, "chunk_errors": errors}
+
+    result = json.loads(pm.finish([], errors, "default"))
+    assert result["error"] == "HTTP 500"
+
+
+@pytest.mark.parametrize("text", ["--timings", "- gạch đầu dòng", "--mode=all là một chuỗi"])
+def test_text_after_double_dash_is_not_parsed_as_flag(monkeypatch, text):
+    seen = {}
+
+    def fake_extract(full_text, language="vn"):
+        seen["text"] = full_text
+        return json.dumps({"use_cases": []})
+
+    monkeypatch.setattr(pm, "extract_metadata", fake_extract)
+    result = json.loads(pm.run(["--mode=default", "--", text]))
+
+    assert seen["text"] == text
+    assert "timings" not in result
+
+
+def test_stdin_is_rejected_in_serve_mode(monkeypatch):
+    import worker
+    monkeypatch.setattr(worker, "_serving", True)
+    monkeypatch.setattr(pm, "read_input_text", lambda *args: pytest.fail("không được đọc stdin"))
+
+    result = json.loads(pm.run(["--mode=all", "--stdin"]))
+    assert "--serve" in result["error"]
+
+
+@pytest.mark.parametrize("payload", ['[{"title": "A", "text": "x"', '{"title": "A"}', '[{"title": "A"}]',
+                                     '["chỉ là chuỗi"]', '[{"title": 1, "text": "x"}]'])
+def test_sections_reject_malformed_input(monkeypatch, payload):
+    monkeypatch.setattr(pm, "read_input_text", lambda *args: payload)
+    monkeypatch.setattr(pm, "extract_sections", lambda *args: pytest.fail("không được trích xuất"))
+
+    assert "error" in json.loads(pm.run(["--mode=all", "--sections", "--file=sections.json"]))
+
+
+def test_parse_sections_accepts_docx_output():
+    payload = json.dumps([{"title": "", "text": "Mở đầu"}, {"title": "1. Đăng nhập", "text": "1. Đăng nhập\nNội dung"}])
+    assert [s["text"] for s in pm.parse_sections(payload)] == ["Mở đầu", "1. Đăng nhập\nNội dung"]